@@ -0,0 +1,100 @@
+"""
+Benchmark the cross-user answer store.
+
+Fills services.answer_store.AnswerStore with answered papers, then looks up
+whole papers three ways: uploaded again as is, as OCR variants with a few
+misread letters per question, and papers that were never answered. Reports
+the time per paper, how many questions were found, and (for the unseen
+papers) how many were wrongly matched.
+
+Usage:
+    python -m benchmarks.bench_answer_store --papers 200 --questions 40 --error-rate 0.02
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+from services.answer_store import AnswerStore  # noqa: E402
+
+TERMS = ("stack queue linked list binary tree heap graph hash table trie deadlock semaphore mutex process thread "
+         "scheduler paging segmentation virtual memory cache tlb pipeline hazard interrupt compiler parser lexer "
+         "grammar automaton turing machine normal form relational algebra transaction index b tree join "
+         "protocol router switch subnet congestion window encryption signature certificate firewall").split()
+VERBS = "explain define describe compare derive illustrate discuss differentiate write analyse".split()
+FILLER = "the of a with and its in for between suitable example examples working advantages types".split()
+# Letters OCR commonly confuses
+CONFUSIONS = {"l": "i", "i": "l", "e": "c", "c": "e", "o": "a", "a": "o", "n": "m", "m": "n", "u": "v", "h": "b"}
+
+
+def make_question(rng):
+    words = [rng.choice(VERBS)]
+    for _ in range(rng.randint(5, 18)):
+        words.append(rng.choice(TERMS) if rng.random() < 0.5 else rng.choice(FILLER))
+    question = " ".join(words).capitalize()
+    return {"question": question + "?", "variant": f"assignment_{rng.choice((2, 5, 10))}mark|CO1|L2"}
+
+
+def misread(question, rate, rng):
+    return "".join(CONFUSIONS[c] if c in CONFUSIONS and rng.random() < rate else c for c in question)
+
+
+def lookup_paper(store, paper):
+    start = time.perf_counter()
+    found = [store.get(q["question"], q["variant"]) for q in paper]
+    return time.perf_counter() - start, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of confusable letters misread")
+    parser.add_argument("--samples", type=int, default=20, help="Papers looked up per scenario")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    papers = [[make_question(rng) for _ in range(args.questions)] for _ in range(args.papers)]
+    unseen = [[make_question(rng) for _ in range(args.questions)] for _ in range(args.samples)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnswerStore(os.path.join(tmp, "answers.sqlite3"), ttl=3600, max_entries=10 ** 7, max_bytes=10 ** 10)
+        start = time.perf_counter()
+        for paper in papers:
+            for q in paper:
+                store.put(q["question"], f"Answer to {q['question']}", q["variant"])
+        elapsed = time.perf_counter() - start
+        print(f"Stored {args.papers * args.questions} answers in {elapsed:.2f} s "
+              f"({elapsed * 1e6 / (args.papers * args.questions):.0f} us each)")
+
+        samples = rng.sample(papers, min(args.samples, len(papers)))
+        scenarios = (
+            ("same paper", [(paper, paper) for paper in samples]),
+            ("OCR variant", [([dict(q, question=misread(q["question"], args.error_rate, rng)) for q in paper], paper)
+                             for paper in samples]),
+            ("unseen paper", [(paper, None) for paper in unseen]),
+        )
+        for name, lookups in scenarios:
+            total_time, hits, wrong, total = 0.0, 0, 0, 0
+            for paper, original in lookups:
+                elapsed, found = lookup_paper(store, paper)
+                total_time += elapsed
+                for i, answer in enumerate(found):
+                    total += 1
+                    if answer is None:
+                        continue
+                    if original is not None and answer == f"Answer to {original[i]['question']}":
+                        hits += 1
+                    else:
+                        wrong += 1
+            print(f"{name:>13}: {total_time * 1000 / len(lookups):6.2f} ms per paper, "
+                  f"{hits}/{total} answered from the store, {wrong} wrong matches")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
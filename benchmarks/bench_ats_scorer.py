@@ -0,0 +1,123 @@
+"""
+Benchmark ATS scoring.
+
+Scores synthetic resumes with the previous calculate_ats_score (lowercasing
+the resume and scanning it once per keyword) and with services.ats_scorer
+(one lowercase, then one search per keyword for small sets or one pass over
+a compiled keyword trie for large ones), checks that both give the same
+score, and shows how each scales with the number of keywords.
+Then scores a directory of resume files through the batch API with a
+growing number of processes.
+
+Usage:
+    python -m benchmarks.bench_ats_scorer --resumes 2000 --files 5000 --workers 1 2 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from services.ats_scorer import ATSScorer, DEFAULT_ATS_PROFILE, iter_resume_paths, score_files, score_resume
+
+WORDS = ("led team built designed implemented python java sql project university bachelor degree "
+         "intern company developed managed improved reduced latency customers product data analysis "
+         "research published award volunteer club course gpa responsible collaborated").split()
+HEADINGS = ["Work Experience", "Education", "Skills", "Projects", "Certifications", "Achievements",
+            "Summary", "Objective", "Experience", "Leadership", "Technical Skills", "Professional Summary"]
+CONTACT = ["Email: student@example.com", "Phone: +1 555 0100", "Address: 12 College Road",
+           "LinkedIn: linkedin.com/in/student"]
+
+
+def legacy_calculate_ats_score(resume_text, keywords=None):
+    """
+    The previous implementation from handlers/career.py; keywords replaces its general keyword list
+    """
+    keywords = keywords or ['experience', 'skills', 'education', 'projects', 'certification',
+                            'achievement', 'leadership', 'management', 'technical', 'professional']
+    section_keywords = ['work experience', 'education', 'skills', 'projects',
+                        'certifications', 'achievements', 'summary', 'objective']
+    format_keywords = ['email', 'phone', 'address', 'linkedin']
+    keyword_score = 0
+    section_score = 0
+    format_score = 0
+    for keyword in keywords:
+        if keyword.lower() in resume_text.lower():
+            keyword_score += 1
+    keyword_score = min(int((keyword_score / len(keywords)) * 40), 40)
+    for section in section_keywords:
+        if section.lower() in resume_text.lower():
+            section_score += 1
+    section_score = min(int((section_score / len(section_keywords)) * 40), 40)
+    for format_item in format_keywords:
+        if format_item.lower() in resume_text.lower():
+            format_score += 1
+    format_score = min(int((format_score / len(format_keywords)) * 20), 20)
+    penalties = 0
+    if section_score < (len(section_keywords) * 0.6):
+        penalties += 10
+    if resume_text.count('\n') < 10:
+        penalties += 5
+    return max(0, min(keyword_score + section_score + format_score - penalties, 100))
+
+
+def make_resume(rng):
+    lines = rng.sample(CONTACT, rng.randint(0, len(CONTACT)))
+    for heading in rng.sample(HEADINGS, rng.randint(0, len(HEADINGS))):
+        lines.append(heading.upper() if rng.random() < 0.3 else heading)
+        for _ in range(rng.randint(1, 8)):
+            lines.append(" ".join(rng.choices(WORDS, k=rng.randint(6, 20))))
+    return ("\n" if rng.random() < 0.8 else " ").join(lines)
+
+
+def make_keywords(count, rng):
+    keywords = set(DEFAULT_ATS_PROFILE["keywords"])
+    while len(keywords) < count:
+        keywords.add(" ".join(rng.choices(WORDS, k=rng.randint(1, 2))) + rng.choice(("", "ing", "s", " lead")))
+    return sorted(keywords)
+
+
+def per_resume(score, resumes):
+    start = time.perf_counter()
+    for resume in resumes:
+        score(resume)
+    return (time.perf_counter() - start) / len(resumes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resumes", type=int, default=2000)
+    parser.add_argument("--keywords", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    resumes = [make_resume(rng) for _ in range(args.resumes)]
+    mismatches = sum(1 for resume in resumes if legacy_calculate_ats_score(resume) != score_resume(resume)["score"])
+    print(f"{args.resumes} resumes, average {sum(map(len, resumes)) // len(resumes)} characters, "
+          f"{mismatches} score mismatches between legacy and engine")
+
+    for count in args.keywords:
+        keywords = make_keywords(count, rng)
+        scorer = ATSScorer(dict(DEFAULT_ATS_PROFILE, keywords=keywords))
+        legacy = per_resume(lambda resume: legacy_calculate_ats_score(resume, keywords), resumes)
+        engine = per_resume(scorer.score, resumes)
+        print(f"{len(keywords) + 12:4} keywords: legacy {legacy * 1e6:7.1f} us/resume, "
+              f"engine {engine * 1e6:7.1f} us/resume ({legacy / engine:4.1f}x)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.files):
+            with open(os.path.join(tmp, f"resume_{i:05}.txt"), "w") as file:
+                file.write(resumes[i % len(resumes)])
+        paths = list(iter_resume_paths(tmp))
+        print(f"\nBatch scoring {len(paths)} files on {os.cpu_count()} CPUs:")
+        for workers in args.workers:
+            start = time.perf_counter()
+            scored = sum(1 for _, result, _ in score_files(paths, workers=workers) if result is not None)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:3} processes: {elapsed:6.2f} s, {scored / elapsed:8.0f} resumes/s")
+
+
+if __name__ == "__main__":
+    main()
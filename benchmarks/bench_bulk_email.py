@@ -0,0 +1,71 @@
+"""
+Benchmark bulk cold-email generation from a CSV.
+
+Writes a CSV of synthetic recipients to a temporary file and builds zip and
+CSV bundles from it with services.bulk_email.build_cold_email_bundle.
+Reports rows per second, the bundle size, and the peak Python memory
+allocated while building, which should stay flat as the row count grows.
+
+Usage:
+    python -m benchmarks.bench_bulk_email --rows 1000 10000 --formats zip csv
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+from services.bulk_email import REQUIRED_COLUMNS, build_cold_email_bundle  # noqa: E402
+
+COMPANIES = "Google Microsoft Infosys Zomato Swiggy Flipkart Razorpay Atlassian Adobe Nvidia".split()
+FIRST_NAMES = "Aarav Diya Ishaan Meera Kabir Ananya Rohan Sara Vivaan Nisha".split()
+POSITIONS = ["Software Engineer Intern", "Data Analyst", "ML Engineer", "Product Intern", "Backend Developer"]
+SKILLS = ["Python, SQL, Django", "Java, Spring, Kafka", "PyTorch, NLP, Docker", "React, Node.js, GraphQL"]
+
+
+def write_csv(path, rows, rng):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(list(REQUIRED_COLUMNS) + ["projects", "resume_link", "github_link", "recipient_email"])
+        for i in range(rows):
+            company = rng.choice(COMPANIES)
+            recipient = rng.choice(FIRST_NAMES)
+            writer.writerow([rng.choice(FIRST_NAMES), "third year", "ABC Institute of Technology",
+                             "AI and Data Science", rng.choice(SKILLS), company, recipient,
+                             rng.choice(POSITIONS), "Chatbot, Resume Parser, Stock Predictor",
+                             "https://example.com/resume.pdf", "https://github.com/student",
+                             f"{recipient.lower()}.{i}@{company.lower()}.com"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--formats", nargs="+", default=["zip", "csv"], choices=["zip", "csv"])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f"recipients_{rows}.csv")
+            write_csv(path, rows, rng)
+            for bundle_format in args.formats:
+                with open(path, "rb") as csv_file:
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    bundle, summary = build_cold_email_bundle(csv_file, bundle_format, max_rows=rows)
+                    elapsed = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                with bundle:
+                    size = bundle.seek(0, os.SEEK_END)
+                print(f"{rows:6} rows, {bundle_format}: {elapsed:5.2f} s, {summary['generated'] / elapsed:7.0f} rows/s, "
+                      f"bundle {size / 1e6:5.1f} MB, peak memory {peak / 1e6:5.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark assignment PDF rendering.
+
+Renders synthetic solutions with the previous implementation (stylesheet
+rebuilt on every call, output written to a file and read back) and with
+services.document_generator.generate_document (shared stylesheet, rendered
+into memory), and reports time and peak traced allocations per page.
+
+Usage:
+    python -m benchmarks.bench_document_render --questions 10 40 --runs 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+import fitz  # noqa: E402
+from reportlab.lib import colors  # noqa: E402
+from reportlab.lib.pagesizes import letter  # noqa: E402
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet  # noqa: E402
+from reportlab.lib.units import inch  # noqa: E402
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer  # noqa: E402
+
+from services.document_generator import generate_document  # noqa: E402
+
+WORDS = "the algorithm stores each node in a balanced tree so that lookups take logarithmic time".split()
+
+
+def make_solution(questions, seed=0):
+    rng = random.Random(seed)
+    solution = ""
+    for i in range(1, questions + 1):
+        solution += f"Question {i}: {' '.join(rng.choices(WORDS, k=15))}?\n"
+        solution += f"Marks: {rng.choice((2, 5, 10))}, CO: CO1, LO: L2\n\n"
+        solution += f"Answer: {' '.join(rng.choices(WORDS, k=rng.randint(60, 400)))}\n\n"
+        solution += "-" * 40 + "\n\n"
+    return solution
+
+
+def legacy_generate_document(content, output_path):
+    doc = SimpleDocTemplate(output_path, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Question', fontSize=16, fontName='Helvetica-Bold', textColor=colors.black, spaceAfter=6))
+    styles.add(ParagraphStyle(name='QuestionInfo', fontSize=10, spaceAfter=6, fontName='Helvetica-Oblique'))
+    styles.add(ParagraphStyle(name='Answer', fontSize=11, leftIndent=20, spaceAfter=12))
+    styles.add(ParagraphStyle(name='Separator', fontSize=11))
+    story = []
+    for paragraph in content.split('\n'):
+        if paragraph.startswith("Question"):
+            story.append(Paragraph(paragraph, styles['Question']))
+        elif paragraph.startswith("Marks:"):
+            story.append(Paragraph(paragraph, styles['QuestionInfo']))
+        elif paragraph.startswith("Answer:"):
+            story.append(Paragraph(paragraph, styles['Answer']))
+        elif paragraph.startswith("-"):
+            story.append(Paragraph(paragraph, styles['Separator']))
+            story.append(Spacer(1, 0.2 * inch))
+        else:
+            story.append(Paragraph(paragraph, styles['Normal']))
+    doc.build(story)
+    # The handler then opened the file again to upload it
+    with open(output_path, 'rb') as file:
+        return file.read()
+
+
+def measure(render, runs):
+    render()  # warm up fonts and caches
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(runs):
+        pdf_bytes = render()
+    elapsed = (time.perf_counter() - start) / runs
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        pages = doc.page_count
+    return pages, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "solved_assignment.pdf")
+        for questions in args.questions:
+            content = make_solution(questions)
+            for name, render in (("legacy (file)", lambda: legacy_generate_document(content, output_path)),
+                                 ("in memory", lambda: generate_document(content))):
+                pages, elapsed, peak = measure(render, args.runs)
+                print(f"{questions:3} questions, {name:>13}: {pages} pages, {elapsed * 1000:7.1f} ms "
+                      f"({elapsed * 1000 / pages:5.2f} ms/page), peak allocations {peak / 1024:6.0f} KB "
+                      f"({peak / 1024 / pages:5.1f} KB/page)")
+
+
+if __name__ == "__main__":
+    main()
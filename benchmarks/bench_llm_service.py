@@ -0,0 +1,85 @@
+"""
+End-to-end benchmark of services.llama_vision against the local mock API.
+
+Simulates concurrent users sending distinct prompts through stream_text and
+reports time to first chunk and total latency, so the scheduler, resilience
+layer and client pool can be measured without network access.
+
+Usage:
+    python -m benchmarks.bench_llm_service --users 20 --requests 5 --ttft-ms 300
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_together import MockSettings, start_mock_server
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=5, help="requests per user")
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--tokens-per-s", type=float, default=100.0)
+    parser.add_argument("--max-tokens", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = MockSettings(ttft=args.ttft_ms / 1000, tokens_per_s=args.tokens_per_s,
+                            max_tokens=args.max_tokens, error_rate=args.error_rate)
+    server, base_url = start_mock_server(settings)
+
+    # The services read their configuration at import time
+    os.environ["TOGETHER_BASE_URL"] = base_url
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+    os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+    os.environ.setdefault("RESPONSE_CACHE_PATH", "")
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "100000")
+    os.environ.setdefault("LLM_BURST", "1000")
+    from services.llama_vision import stream_text, llm_scheduler, circuit_breaker
+
+    first_chunk, total, failures = [], [], []
+    lock = threading.Lock()
+
+    def user(user_id):
+        for i in range(args.requests):
+            start = time.perf_counter()
+            first = None
+            try:
+                for _ in stream_text(f"user {user_id} question {i}", user_id=user_id):
+                    if first is None:
+                        first = time.perf_counter() - start
+            except Exception as e:
+                with lock:
+                    failures.append(type(e).__name__)
+                continue
+            with lock:
+                first_chunk.append(first)
+                total.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(user, range(args.users)))
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    if first_chunk:
+        print(f"first chunk: mean {statistics.mean(first_chunk) * 1000:.0f} ms, "
+              f"p95 {percentile(first_chunk, 95) * 1000:.0f} ms")
+        print(f"total:       mean {statistics.mean(total) * 1000:.0f} ms, "
+              f"p95 {percentile(total, 95) * 1000:.0f} ms, p99 {percentile(total, 99) * 1000:.0f} ms")
+    print(f"{len(total)} ok, {len(failures)} failed in {wall:.1f}s ({len(total) / wall:.1f} req/s)")
+    print(f"scheduler: {llm_scheduler.stats()}")
+    print(f"circuit breaker: {circuit_breaker.state}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark PDF text extraction backends.
+
+Generates a corpus of synthetic text PDFs with reportlab and measures
+pages per second for PyPDF2, PyMuPDF (fitz) on one core, and
+services.pdf_extractor.extract_pdf, which spreads large files over a
+process pool.
+
+Usage:
+    python -m benchmarks.bench_pdf_extraction --files 10 --pages 20 200
+"""
+import argparse
+import io
+import os
+import random
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+import fitz  # noqa: E402
+import PyPDF2  # noqa: E402
+from reportlab.lib.pagesizes import A4  # noqa: E402
+from reportlab.pdfgen import canvas  # noqa: E402
+
+from services.pdf_extractor import extract_pdf  # noqa: E402
+
+WORDS = ("question answer marks explain describe the process of data structure algorithm network "
+         "memory operating system compiler database theorem proof derive evaluate").split()
+
+
+def make_pdf(pages, seed):
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    for page in range(pages):
+        y = height - 50
+        pdf.drawString(50, y, f"Q{page + 1}. {' '.join(rng.choices(WORDS, k=8))}? (10 marks)")
+        while y > 60:
+            y -= 14
+            pdf.drawString(50, y, " ".join(rng.choices(WORDS, k=12)))
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def extract_pypdf2(data):
+    return "\n".join(page.extract_text() or "" for page in PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+
+def extract_fitz(data):
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return "\n".join(page.get_text("text") for page in doc)
+
+
+def extract_service(data):
+    return extract_pdf(data, max_pages=10 ** 6, max_bytes=10 ** 12).text
+
+
+def measure(extract, corpus):
+    start = time.perf_counter()
+    chars = sum(len(extract(data)) for data, _ in corpus)
+    elapsed = time.perf_counter() - start
+    pages = sum(count for _, count in corpus)
+    return pages / elapsed, elapsed, chars
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10, help="files per size")
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 200], help="page counts to generate")
+    args = parser.parse_args()
+
+    backends = (("PyPDF2", extract_pypdf2), ("fitz", extract_fitz), ("pdf_extractor", extract_service))
+    for pages in args.pages:
+        corpus = [(make_pdf(pages, seed), pages) for seed in range(args.files)]
+        size_kb = sum(len(data) for data, _ in corpus) / len(corpus) / 1024
+        print(f"{args.files} files x {pages} pages ({size_kb:.0f} KB each)")
+        # Warm up the worker pool so its start-up cost is not counted
+        extract_service(corpus[0][0])
+        for name, extract in backends:
+            rate, elapsed, chars = measure(extract, corpus)
+            print(f"{name:>16}: {rate:8.0f} pages/s  {elapsed:6.2f} s  {chars} chars")
+
+
+if __name__ == "__main__":
+    main()
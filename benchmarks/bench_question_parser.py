@@ -0,0 +1,81 @@
+"""
+Benchmark the question paper parser.
+
+Feeds random token streams of growing size (ordinary papers and
+pathological ones full of numbers with no CO cells) to the previous
+regex extractor and to services.question_extractor, and reports time per
+token; the new parser should stay flat as input grows. Accuracy on
+different paper layouts is checked by tests/test_question_parser.py.
+
+Usage:
+    python -m benchmarks.bench_question_parser --tokens 2000 8000 32000
+"""
+import argparse
+import os
+import random
+import re
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+from services.question_extractor import iter_questions  # noqa: E402
+
+WORDS = ("explain the working of a binary search tree and derive the time complexity of insertion "
+         "deletion and lookup with suitable examples compare it with hashing").split()
+
+# The regex the handler used before the layout-aware parser
+LEGACY_PATTERN = re.compile(r'(\d+)\s+(.*?)\s+(\d+)\s+(CO\d+)\s+(L\d+(?:,L\d+)*)', re.DOTALL)
+
+
+def legacy_extract_questions(text):
+    # Whitespace is normalised so line breaks inside a question are not counted as errors
+    return [{"question": " ".join(q.split()), "marks": marks, "co": co, "lo": lo}
+            for _, q, marks, co, lo in LEGACY_PATTERN.findall(text)]
+
+
+def make_tokens(count, seed, pathological=False):
+    rng = random.Random(seed)
+    tokens = []
+    number = 1
+    while len(tokens) < count:
+        if pathological:
+            # Numbers everywhere and never a CO cell: the worst case for a backtracking regex
+            tokens.extend(str(rng.randint(1, 99)) if rng.random() < 0.3 else rng.choice(WORDS) for _ in range(50))
+            continue
+        tokens.append(str(number))
+        tokens.extend(rng.choices(WORDS, k=rng.randint(8, 30)))
+        tokens.extend([str(rng.choice((2, 5, 10))), f"CO{rng.randint(1, 5)}", f"L{rng.randint(1, 4)}"])
+        number += 1
+    return " ".join(tokens[:count])
+
+
+def time_parser(parse, text, limit):
+    start = time.perf_counter()
+    parse(text)
+    elapsed = time.perf_counter() - start
+    return elapsed if elapsed < limit else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[2000, 8000, 32000])
+    parser.add_argument("--limit", type=float, default=20.0, help="Seconds before a run is reported as too slow")
+    args = parser.parse_args()
+
+    parsers = (("legacy regex", legacy_extract_questions), ("parser", lambda text: list(iter_questions([text]))))
+    for pathological in (False, True):
+        print(f"\n{'Pathological' if pathological else 'Ordinary'} token streams:")
+        for count in args.tokens:
+            text = make_tokens(count, seed=count, pathological=pathological)
+            for name, parse in parsers:
+                elapsed = time_parser(parse, text, args.limit)
+                if elapsed is None:
+                    print(f"{count:8} tokens, {name:>12}: over {args.limit:.0f} s")
+                else:
+                    print(f"{count:8} tokens, {name:>12}: {elapsed * 1000:9.2f} ms "
+                          f"({elapsed * 1e6 / count:6.2f} us/token)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark concurrent assignment rendering.
+
+Simulates several students whose solutions are ready at the same time and
+renders them once on handler threads (sharing the GIL) and once through
+services.render_pool.RenderPool with a growing number of worker processes.
+
+Usage:
+    python -m benchmarks.bench_render_pool --jobs 16 --questions 40 --workers 1 2 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+from benchmarks.bench_document_render import make_solution  # noqa: E402
+from services.document_generator import generate_document  # noqa: E402
+from services.render_pool import RenderPool  # noqa: E402
+
+
+def run(render, contents, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(render, range(len(contents)), contents))
+    assert all(results)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=16)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    contents = [make_solution(args.questions, seed) for seed in range(args.jobs)]
+    print(f"{args.jobs} concurrent renders of {args.questions} questions, {os.cpu_count()} CPUs")
+
+    elapsed = run(lambda key, content: generate_document(content), contents, args.jobs)
+    print(f"{'handler threads':>18}: {elapsed:6.2f} s, {args.jobs / elapsed:5.1f} renders/s")
+
+    for workers in args.workers:
+        pool = RenderPool(workers, max_pending=args.jobs, timeout=120)
+        pool.render("warmup", contents[0])  # start the workers outside the measurement
+        try:
+            elapsed = run(pool.render, contents, args.jobs)
+        finally:
+            pool.shutdown()
+        print(f"{f'{workers} processes':>18}: {elapsed:6.2f} s, {args.jobs / elapsed:5.1f} renders/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark streaming PDF extraction against extracting the whole file first.
+
+Builds a synthetic question paper with reportlab and measures, for the
+assignment solver's question detection and for the document chat index,
+the time until the first question (or the finished index) is available and
+the peak Python memory traced while doing it.
+
+Usage:
+    python -m benchmarks.bench_streaming_extraction --pages 150
+"""
+import argparse
+import io
+import os
+import random
+import time
+import tracemalloc
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+from reportlab.lib.pagesizes import A4  # noqa: E402
+from reportlab.pdfgen import canvas  # noqa: E402
+
+from services.document_index import DocumentIndex  # noqa: E402
+from services.pdf_extractor import extract_pdf, iter_pages  # noqa: E402
+from services.question_extractor import extract_questions, iter_questions  # noqa: E402
+
+WORDS = "explain describe compare the process of data structure algorithm network memory compiler".split()
+
+
+def make_paper(pages, seed=0):
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    number = 1
+    for _ in range(pages):
+        y = height - 50
+        while y > 60:
+            pdf.drawString(50, y, f"{number} {' '.join(rng.choices(WORDS, k=10))} {rng.choice((2, 5, 10))} "
+                                  f"CO{rng.randint(1, 5)} L{rng.randint(1, 6)}")
+            number += 1
+            y -= 14
+            for _ in range(3):
+                pdf.drawString(50, y, " ".join(rng.choices(WORDS, k=12)))
+                y -= 14
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first, total = fn(start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first, total, peak / 1024 / 1024
+
+
+def questions_whole(data):
+    def run(start):
+        questions = iter(extract_questions(extract_pdf(data).text))
+        next(questions)
+        first = time.perf_counter() - start
+        count = 1 + sum(1 for _ in questions)
+        return first, (time.perf_counter() - start, count)
+    return run
+
+
+def questions_streaming(data):
+    def run(start):
+        questions = iter_questions(iter_pages(data))
+        next(questions)
+        first = time.perf_counter() - start
+        count = 1 + sum(1 for _ in questions)
+        return first, (time.perf_counter() - start, count)
+    return run
+
+
+def index_whole(data):
+    def run(start):
+        index = DocumentIndex.from_text(extract_pdf(data).text)
+        elapsed = time.perf_counter() - start
+        return elapsed, (elapsed, len(index))
+    return run
+
+
+def index_streaming(data):
+    def run(start):
+        index = DocumentIndex.from_pages(iter_pages(data))
+        elapsed = time.perf_counter() - start
+        return elapsed, (elapsed, len(index))
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=150)
+    args = parser.parse_args()
+
+    data = make_paper(args.pages)
+    print(f"{args.pages} page paper, {len(data) // 1024} KB")
+    for name, fn in (("questions, whole file", questions_whole(data)),
+                     ("questions, streaming", questions_streaming(data)),
+                     ("doc index, whole file", index_whole(data)),
+                     ("doc index, streaming", index_streaming(data))):
+        first, (total, count), peak = measure(fn)
+        print(f"{name:>22}: first result {first * 1000:7.1f} ms, done {total * 1000:7.1f} ms, "
+              f"{count} items, peak {peak:5.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
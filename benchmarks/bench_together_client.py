@@ -0,0 +1,96 @@
+"""
+Benchmark the shared Together client against the per-module clients it replaced.
+
+Starts the local mock of the Together API and makes chat completion calls
+through the Together SDK in bursts, each burst from a fresh pool of
+threads the way generate_answers starts one per paper. "per-module client"
+is the previous setup: one Together(...) client built at import, with the
+SDK's own session per thread, so every new thread opens new connections.
+"get_client()" is services.together_client, whose single keep-alive session
+is handed to the SDK through together.requestssession. The mock sleeps on
+every new connection to stand in for the TCP + TLS handshake a real API
+call pays.
+
+Usage:
+    python -m benchmarks.bench_together_client --bursts 10 --threads 16 --calls 4
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+import together  # noqa: E402
+from together import Together  # noqa: E402
+
+from benchmarks.mock_together import MockSettings, start_mock_server  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def run(client, bursts, threads, calls):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(_):
+        for _ in range(calls):
+            start = time.perf_counter()
+            client.chat.completions.create(model="mock", messages=MESSAGES, max_tokens=1)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    for _ in range(bursts):
+        # New threads every burst, as each solved paper brings its own executor
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "calls_per_s": len(latencies) / wall,
+    }
+
+
+def report(name, result):
+    print(f"{name:>18}: mean {result['mean_ms']:.1f} ms, p50 {result['p50_ms']:.1f} ms, "
+          f"p95 {result['p95_ms']:.1f} ms, {result['calls_per_s']:.0f} calls/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=4, help="calls per thread and burst")
+    parser.add_argument("--handshake-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    settings = MockSettings(ttft=0, tokens_per_s=1e6, handshake_delay=args.handshake_ms / 1000)
+    server, base_url = start_mock_server(settings)
+    # Read by config when services.together_client is imported below
+    os.environ["TOGETHER_BASE_URL"] = base_url
+
+    try:
+        # Before services.together_client installs its session, the SDK makes one per thread
+        together.requestssession = None
+        report("per-module client", run(Together(api_key=os.environ["TOGETHER_API_KEY"], base_url=base_url),
+                                        args.bursts, args.threads, args.calls))
+
+        from services.together_client import close_session, get_client
+        try:
+            report("get_client()", run(get_client(), args.bursts, args.threads, args.calls))
+        finally:
+            close_session()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Local stand-in for the parts of the Together API this bot uses.
+
+Serves POST /v1/chat/completions (streamed and non-streamed) and
+POST /v1/images/generations with configurable latency, token rate, error
+rate and throttling, so the bot and the benchmarks can run without network
+access or API quota. Point the services at it with
+
+    TOGETHER_BASE_URL=http://127.0.0.1:8400/v1 python main.py
+
+Usage:
+    python -m benchmarks.mock_together --port 8400 --ttft-ms 300 --tokens-per-s 50
+"""
+import argparse
+import base64
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("the model answers this question with a short and plausible sentence about "
+         "study habits careers campus life and assignments").split()
+
+
+class MockSettings:
+    """
+    Behaviour of the mock server; all delays are in seconds
+    """
+
+    def __init__(self, ttft=0.3, tokens_per_s=50.0, max_tokens=200, error_rate=0.0,
+                 requests_per_s=0.0, handshake_delay=0.0):
+        """
+        Args:
+            ttft (float): Time to first token
+            tokens_per_s (float): Rate at which tokens are produced after the first
+            max_tokens (int): Upper bound on tokens per answer, on top of the request's max_tokens
+            error_rate (float): Fraction of requests answered with a 503
+            requests_per_s (float): Requests allowed per second before 429s; 0 disables throttling
+            handshake_delay (float): Delay on every new connection, standing in for TLS
+        """
+        self.ttft = ttft
+        self.tokens_per_s = tokens_per_s
+        self.max_tokens = max_tokens
+        self.error_rate = error_rate
+        self.requests_per_s = requests_per_s
+        self.handshake_delay = handshake_delay
+
+
+class _Throttle:
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._allowance = rate
+        self._updated = time.monotonic()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._allowance < 1:
+                return False
+            self._allowance -= 1
+            return True
+
+
+def make_handler(settings):
+    throttle = _Throttle(settings.requests_per_s)
+
+    class MockTogetherHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if settings.handshake_delay:
+                time.sleep(settings.handshake_delay)
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+            if not throttle.allow():
+                self._send_json(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}},
+                                {"Retry-After": "1"})
+                return
+            if random.random() < settings.error_rate:
+                self._send_json(503, {"error": {"message": "Service unavailable", "type": "server_error"}})
+                return
+
+            path = self.path.rstrip("/")
+            if path.endswith("/chat/completions"):
+                self._chat_completion(request)
+            elif path.endswith("/images/generations"):
+                self._image_generation(request)
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+
+        def _tokens(self, request):
+            count = min(settings.max_tokens, request.get("max_tokens") or settings.max_tokens)
+            return [random.choice(WORDS) + " " for _ in range(count)]
+
+        def _chat_completion(self, request):
+            tokens = self._tokens(request)
+            model = request.get("model", "mock")
+            completion_id = uuid.uuid4().hex
+            created = int(time.time())
+            time.sleep(settings.ttft)
+
+            if not request.get("stream"):
+                time.sleep(len(tokens) / settings.tokens_per_s)
+                self._send_json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "finish_reason": "length",
+                                 "message": {"role": "assistant", "content": "".join(tokens)}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            interval = 1.0 / settings.tokens_per_s
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(interval)
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token},
+                                 "finish_reason": "length" if i == len(tokens) - 1 else None}],
+                }
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _image_generation(self, request):
+            time.sleep(settings.ttft)
+            # flux_schnell decodes the payload as text, so return a text description
+            description = f"A mock image for prompt: {request.get('prompt', '')}"
+            self._send_json(200, {
+                "id": uuid.uuid4().hex, "model": request.get("model", "mock"), "object": "list",
+                "data": [{"index": i, "b64_json": base64.b64encode(description.encode()).decode()}
+                         for i in range(request.get("n") or 1)],
+            })
+
+    return MockTogetherHandler
+
+
+def start_mock_server(settings=None, host="127.0.0.1", port=0):
+    """
+    Start the mock server on a background thread
+
+    Args:
+        settings (MockSettings): Behaviour of the server, defaults to MockSettings()
+        host (str): Interface to bind
+        port (int): Port to bind, 0 picks a free one
+
+    Returns:
+        tuple: (server, base_url) where base_url can be used as TOGETHER_BASE_URL
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(settings or MockSettings()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="time to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=50.0)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument("--rps", type=float, default=0.0, help="requests per second before 429s, 0 = unlimited")
+    parser.add_argument("--handshake-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = MockSettings(ttft=args.ttft_ms / 1000, tokens_per_s=args.tokens_per_s, max_tokens=args.max_tokens,
+                            error_rate=args.error_rate, requests_per_s=args.rps,
+                            handshake_delay=args.handshake_ms / 1000)
+    server, base_url = start_mock_server(settings, args.host, args.port)
+    print(f"Mock Together API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -26,4 +26,106 @@ if not TELEGRAM_BOT_TOKEN:
 if not TOGETHER_API_KEY:
     raise ValueError("TOGETHER_API_KEY is not set in the environment variables")
 
+# Together API client settings
+# Point TOGETHER_BASE_URL at benchmarks/mock_together.py to run without the real API
+TOGETHER_BASE_URL = os.getenv('TOGETHER_BASE_URL') or None
+TOGETHER_POOL_SIZE = int(os.getenv('TOGETHER_POOL_SIZE', '32'))
+TOGETHER_TIMEOUT = float(os.getenv('TOGETHER_TIMEOUT', '120'))
+# Retries inside the SDK; services.resilience already retries model calls
+TOGETHER_MAX_RETRIES = int(os.getenv('TOGETHER_MAX_RETRIES', '0'))
+
+# Upstream model call scheduling; size these to the provider's rate limits
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '60'))
+LLM_BURST = int(os.getenv('LLM_BURST', '10'))
+LLM_MAX_CONCURRENT = int(os.getenv('LLM_MAX_CONCURRENT', '8'))
+
+# Retries, hedging and circuit breaking for model calls
+LLM_RETRIES = int(os.getenv('LLM_RETRIES', '3'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '8'))
+# Send a second request when a call runs past this latency percentile; 0 disables hedging
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '0'))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+
+# Document chat retrieval: chunk size in words and number of chunks sent per question
+DOC_CHUNK_WORDS = int(os.getenv('DOC_CHUNK_WORDS', '200'))
+DOC_CHAT_TOP_K = int(os.getenv('DOC_CHAT_TOP_K', '5'))
+
+# Document chat sessions: memory cap, idle time before spilling to disk, and disk retention
+DOC_STORE_MAX_BYTES = int(os.getenv('DOC_STORE_MAX_BYTES', str(64 * 1024 * 1024)))
+DOC_STORE_IDLE_TTL = float(os.getenv('DOC_STORE_IDLE_TTL', '1800'))
+DOC_STORE_DISK_TTL = float(os.getenv('DOC_STORE_DISK_TTL', str(7 * 24 * 3600)))
+DOC_STORE_DIR = os.getenv('DOC_STORE_DIR', os.path.join(UPLOAD_FOLDER, 'doc_sessions'))
+
+# PDF extraction: files larger than PDF_MAX_BYTES are rejected, pages past PDF_MAX_PAGES are skipped,
+# and files with at least PDF_PARALLEL_MIN_PAGES pages are split across PDF_WORKERS processes
+PDF_MAX_BYTES = int(os.getenv('PDF_MAX_BYTES', str(20 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '300'))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '48'))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Assignment PDF rendering: worker processes, renders queued or running at once, and seconds per render
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+RENDER_MAX_PENDING = int(os.getenv('RENDER_MAX_PENDING', '16'))
+RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', '60'))
+
+# OCR for scanned pages and photos: pages with fewer than OCR_MIN_TEXT_CHARS characters of text layer are
+# rasterized at OCR_DPI and OCRed on OCR_WORKERS processes; results are cached by image hash.
+# Uploaded photos are shrunk so that their longer side is at most OCR_MAX_IMAGE_SIDE pixels
+OCR_DPI = int(os.getenv('OCR_DPI', '200'))
+OCR_MIN_TEXT_CHARS = int(os.getenv('OCR_MIN_TEXT_CHARS', '20'))
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(min(4, os.cpu_count() or 1))))
+OCR_LANG = os.getenv('OCR_LANG', 'eng')
+OCR_MAX_SKEW = float(os.getenv('OCR_MAX_SKEW', '5'))
+OCR_MAX_IMAGE_SIDE = int(os.getenv('OCR_MAX_IMAGE_SIDE', '2400'))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv('OCR_CACHE_MAX_ENTRIES', '2048'))
+OCR_CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+OCR_CACHE_TTL = float(os.getenv('OCR_CACHE_TTL', str(30 * 24 * 3600)))
+OCR_CACHE_PATH = os.getenv('OCR_CACHE_PATH', os.path.join(UPLOAD_FOLDER, 'ocr_cache.json'))
+
+# Seconds between edits of a message that is being streamed into Telegram
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
+
+# Outbound Telegram messages: global and per-chat rates (messages per second), burst per chat,
+# sender threads, retries after 429s and how long a handler waits for a paced send or edit
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_GROUP_RATE = float(os.getenv('TELEGRAM_GROUP_RATE', str(20 / 60)))
+TELEGRAM_CHAT_BURST = int(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+TELEGRAM_SEND_WORKERS = int(os.getenv('TELEGRAM_SEND_WORKERS', '4'))
+TELEGRAM_SEND_RETRIES = int(os.getenv('TELEGRAM_SEND_RETRIES', '3'))
+TELEGRAM_SEND_TIMEOUT = float(os.getenv('TELEGRAM_SEND_TIMEOUT', '60'))
+
+# Response cache for fixed prompts; set RESPONSE_CACHE_PATH to '' to keep it in memory only
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join(UPLOAD_FOLDER, 'response_cache.json'))
+
+# Assignment solver: answers generated in parallel; failed model calls are retried per LLM_RETRIES
+ASSIGNMENT_CONCURRENCY = int(os.getenv('ASSIGNMENT_CONCURRENCY', '4'))
+# Pack short (low-mark) questions into one prompt per batch
+ASSIGNMENT_BATCHING = os.getenv('ASSIGNMENT_BATCHING', 'true').lower() == 'true'
+# Answers shared across users, matched by normalized question text or near-duplicate similarity;
+# set ANSWER_STORE_PATH to '' to keep them in memory only
+ANSWER_STORE_PATH = os.getenv('ANSWER_STORE_PATH', os.path.join(UPLOAD_FOLDER, 'answers.sqlite3'))
+ANSWER_STORE_TTL = float(os.getenv('ANSWER_STORE_TTL', str(30 * 24 * 3600)))
+ANSWER_STORE_MAX_ENTRIES = int(os.getenv('ANSWER_STORE_MAX_ENTRIES', '50000'))
+ANSWER_STORE_MAX_BYTES = int(os.getenv('ANSWER_STORE_MAX_BYTES', str(256 * 1024 * 1024)))
+ANSWER_STORE_MIN_SIMILARITY = float(os.getenv('ANSWER_STORE_MIN_SIMILARITY', '0.85'))
+# Assignments are solved by background jobs that survive restarts; finished jobs are kept for /status
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETENTION = float(os.getenv('JOB_RETENTION', str(7 * 24 * 3600)))
+
+# Bulk cold emails from an uploaded CSV: rows per upload, and bytes of the bundle kept in memory before spilling to disk
+BULK_EMAIL_MAX_ROWS = int(os.getenv('BULK_EMAIL_MAX_ROWS', '10000'))
+BULK_EMAIL_SPOOL_BYTES = int(os.getenv('BULK_EMAIL_SPOOL_BYTES', str(1024 * 1024)))
+
+# Multi-step conversations (menus waiting for the user's next message) survive restarts and are shared by
+# bot processes; set CONVERSATION_STORE_PATH to '' to keep them in memory. Abandoned ones expire after CONVERSATION_TTL
+CONVERSATION_STORE_PATH = os.getenv('CONVERSATION_STORE_PATH', os.path.join(UPLOAD_FOLDER, 'conversations.sqlite3'))
+CONVERSATION_TTL = float(os.getenv('CONVERSATION_TTL', '3600'))
+
 GOOGLE_SHEETS_CREDENTIALS = '/Users/samyakjain/All Codes/college_assistant_bot/credentials.json'
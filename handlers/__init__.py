@@ -4,10 +4,12 @@ from .career import register_career_handler
 from .campus import register_campus_handler
 from .social import register_social_handler
 from .assignment_solver import register_assignment_solver_handler
+from .conversation import register_conversation_handler
 
 def register_handlers(bot):
     register_start_handler(bot)
     register_assignment_solver_handler(bot)  # Register this before study handler
+    register_conversation_handler(bot)  # Ongoing conversations take messages before study's catch-all handlers
     register_study_handler(bot)
     register_career_handler(bot)
     # register_campus_handler(bot)
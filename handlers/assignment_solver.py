@@ -1,145 +1,406 @@
-import os
 import logging
-import fitz
 import re
-from io import BytesIO
-from PIL import Image
-import pytesseract
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from telebot import TeleBot
 from telebot.types import Message
-from services.llama_vision import process_text
+from telebot.apihelper import ApiTelegramException
+from services.llama_vision import process_text, complete_text, LLMError
+from services.llm_scheduler import PRIORITY_BULK
 from utils.helpers import sanitize_input, format_response
-from services.document_generator import generate_document
-from config import UPLOAD_FOLDER
+from services.render_pool import RenderPool, RenderQueueFull, RenderCancelled, RenderTimeout
+from services.generation_profiles import profile_for_marks
+from services.pdf_extractor import iter_pages, PDFTooLargeError
+from services.question_extractor import iter_questions
+from services.ocr import ocr_image
+from services.answer_store import AnswerStore
+from services.job_queue import JobQueue, JobFailed, JobCancelled, FINAL_STATES
+from services.conversation import Flow, conversations
+from config import (UPLOAD_FOLDER, ASSIGNMENT_CONCURRENCY, ASSIGNMENT_BATCHING, RENDER_WORKERS,
+                    RENDER_MAX_PENDING, RENDER_TIMEOUT, ANSWER_STORE_PATH, ANSWER_STORE_TTL, ANSWER_STORE_MAX_ENTRIES,
+                    ANSWER_STORE_MAX_BYTES, ANSWER_STORE_MIN_SIMILARITY, JOB_QUEUE_PATH, JOB_WORKERS, JOB_MAX_ATTEMPTS,
+                    JOB_RETENTION)
 
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# User state dictionary
-user_states = {}
+# Chats that opened the solver and have not uploaded their assignment yet
+assignment_flow = conversations.register(Flow("assignment_solver"))
+
+# Solved assignments are rendered to PDF off the handler threads
+render_pool = RenderPool(RENDER_WORKERS, RENDER_MAX_PENDING, RENDER_TIMEOUT)
+
+# Answers are reused when another student uploads the same (or an OCR variant of the same) question
+answer_store = AnswerStore(ANSWER_STORE_PATH, ANSWER_STORE_TTL, ANSWER_STORE_MAX_ENTRIES, ANSWER_STORE_MAX_BYTES,
+                           ANSWER_STORE_MIN_SIMILARITY)
+
+# Uploaded assignments are solved in the background and resumed after a restart; main.start_bot starts the workers
+assignment_jobs = JobQueue(JOB_QUEUE_PATH, JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_RETENTION)
+
+# Seconds between attempts to get a render slot while the pool is full
+_RENDER_SLOT_POLL = 1.0
+
+JOB_STATE_LABELS = {
+    "queued": "waiting to start",
+    "extracting": "reading questions",
+    "answering": "answering questions",
+    "rendering": "preparing your PDF",
+    "delivered": "delivered",
+    "failed": "failed",
+    "cancelled": "cancelled",
+}
 
 def register_assignment_solver_handler(bot: TeleBot):
     @bot.callback_query_handler(func=lambda call: call.data == "assignment_solver")
     def assignment_solver_callback(call):
         logger.debug(f"Assignment solver callback triggered for user {call.message.chat.id}")
-        user_states[call.message.chat.id] = "assignment_solver"
+        conversations.start(call.message.chat.id, "assignment_solver", "awaiting_upload")
         bot.answer_callback_query(call.id, "Opening Assignment Solver...")
-        bot.send_message(call.message.chat.id, "Welcome to the Assignment Solver! Please upload your assignment as a PDF or image.")
-
-    @bot.message_handler(content_types=['document', 'photo'], func=lambda message: user_states.get(message.chat.id) == "assignment_solver")
-    def handle_assignment(message: Message):
+        bot.send_message(call.message.chat.id, "Welcome to the Assignment Solver! Please upload your assignment as a PDF or image. Send /cancel to stop.")
+
+    @bot.message_handler(commands=['cancel'], func=lambda message: conversations.in_flow(message.chat.id, "assignment_solver")
+                         or assignment_jobs.active(message.chat.id))
+    def cancel_assignment(message):
+        logger.debug(f"Assignment cancel triggered for user {message.chat.id}")
+        conversations.end(message.chat.id)
+        assignment_jobs.cancel(message.chat.id)
+        render_pool.cancel(message.chat.id)
+        bot.reply_to(message, "Assignment Solver cancelled.")
+
+    @bot.message_handler(commands=['status'])
+    def assignment_status(message):
+        jobs = assignment_jobs.status(message.chat.id)
+        if not jobs:
+            bot.reply_to(message, "You have no assignments in progress.")
+            return
+        lines = []
+        for job in jobs:
+            line = f"Assignment #{job['id']}: {JOB_STATE_LABELS.get(job['state'], job['state'])}"
+            if job['progress'] and job['state'] not in FINAL_STATES:
+                line += f" ({job['progress']})"
+            lines.append(line)
+        bot.reply_to(message, "\n".join(lines))
+
+    @assignment_flow.on("awaiting_upload", content_types=['document', 'photo'])
+    def handle_assignment(message: Message, data):
         logger.debug(f"Assignment handler triggered for user {message.chat.id}")
         try:
             if message.document:
-                file_info = bot.get_file(message.document.file_id)
-                downloaded_file = bot.download_file(file_info.file_path)
-                file_name = message.document.file_name
-                assignment_text = extract_text_from_pdf(downloaded_file)
+                payload = {"file_id": message.document.file_id, "kind": "pdf"}
             elif message.photo:
-                file_info = bot.get_file(message.photo[-1].file_id)
-                downloaded_file = bot.download_file(file_info.file_path)
-                file_name = f"assignment_{message.photo[-1].file_id}.jpg"
-                assignment_text = extract_text_from_image(downloaded_file)
+                payload = {"file_id": message.photo[-1].file_id, "kind": "image"}
             else:
                 bot.reply_to(message, "Please upload a valid document or photo.")
-                return
-
-            logger.debug(f"Extracted text: {assignment_text[:500]}...")  # Log the first 500 characters
-
-            bot.reply_to(message, "Assignment received! Processing...")
-
-            # Process the assignment
-            questions = extract_questions(assignment_text)
-            logger.debug(f"Extracted questions: {questions}")
-
-            if not questions:
-                logger.warning("No questions extracted. Using fallback method.")
-                questions = [{"question": "Please provide a summary of the main points in the assignment.", "marks": "N/A", "co": "N/A", "lo": "N/A"}]
-
-            answers = generate_answers(questions)
-            logger.debug(f"Generated answers: {answers[:2]}")  # Log the first two answers
+                return "awaiting_upload"
 
-            # Format the response
-            formatted_response = format_assignment_solution(questions, answers)
-            logger.debug(f"Formatted response: {formatted_response[:500]}...")  # Log the first 500 characters
-
-            # Generate document with answers
-            output_path = generate_document(formatted_response)
-            logger.debug(f"Document generated at: {output_path}")
-
-            # Check if the file exists and is not empty
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                # Send the document back to the user
-                with open(output_path, 'rb') as doc:
-                    bot.send_document(message.chat.id, doc, caption="Here's your solved assignment!")
-            else:
-                logger.error(f"Generated PDF is empty or does not exist: {output_path}")
-                bot.reply_to(message, "An error occurred while generating the document. Please try again.")
+            bot.reply_to(message, "Assignment received! I'll send you the solved assignment when it's ready. "
+                                  "Send /status to check on it or /cancel to stop.")
+            progress_message = bot.send_message(message.chat.id, "Reading questions...")
+            payload["message_id"] = message.message_id
+            payload["progress_message_id"] = progress_message.message_id
 
-            # Cleanup
-            if os.path.exists(output_path):
-                os.remove(output_path)
-
-            # Reset user state
-            user_states.pop(message.chat.id, None)
+            # The job is solved by a worker; this handler returns right away
+            job_id = assignment_jobs.submit("assignment", message.chat.id, payload)
+            logger.info(f"Queued assignment job {job_id} for user {message.chat.id}")
+            return None
 
         except Exception as e:
             logger.error(f"Error in handle_assignment: {str(e)}", exc_info=True)
             bot.reply_to(message, f"An error occurred while processing your assignment: {str(e)}")
+            return "awaiting_upload"
 
-    @bot.message_handler(func=lambda message: message.text and message.text.lower().startswith('assignment:') and user_states.get(message.chat.id) == "assignment_solver")
-    def handle_assignment_query(message):
+    def report_progress(job, done, total):
+        job.set_progress(f"{done}/{total} answered")
+        try:
+            bot.edit_message_text(f"{done}/{total} answered", job.owner, job.payload["progress_message_id"])
+        except ApiTelegramException as e:
+            logger.warning(f"Could not update progress message: {str(e)}")
+
+    def extract_stage(job):
+        downloaded_file = job.get("file")
+        if downloaded_file is None:
+            file_info = bot.get_file(job.payload["file_id"])
+            downloaded_file = bot.download_file(file_info.file_path)
+            job.put("file", downloaded_file)
+
+        if job.payload["kind"] == "pdf":
+            try:
+                pages = iter_pages(downloaded_file, words=True)
+            except PDFTooLargeError as e:
+                raise JobFailed(str(e))
+        else:
+            pages = [extract_text_from_image(downloaded_file)]
+
+        questions = []
+
+        def extracted():
+            for q in iter_questions(pages):
+                questions.append(q)
+                yield q
+            logger.debug(f"Extracted questions: {questions}")
+            if not questions:
+                logger.warning("No questions extracted. Using fallback method.")
+                questions.append({"question": "Please provide a summary of the main points in the assignment.", "marks": "N/A", "co": "N/A", "lo": "N/A"})
+                yield questions[0]
+            # The paper is read; the answers still being generated belong to the answering stage
+            job.put("questions", questions)
+            job.set_progress(f"{len(questions)} questions found")
+            job.advance("answering")
+
+        # Questions are answered while later pages are still being read
+        answers = generate_answers(extracted(), progress_callback=lambda done, total: report_progress(job, done, total),
+                                   user_id=job.owner, cancelled=lambda: job.cancelled)
+        job.put("answers", answers)
+
+    def answer_stage(job):
+        if job.get("answers") is not None:
+            # Generated by extract_stage along with the questions
+            return
+        # Resumed after a restart; answers generated before it are taken from the answer store
+        answers = generate_answers(job.get("questions"), progress_callback=lambda done, total: report_progress(job, done, total),
+                                   user_id=job.owner, cancelled=lambda: job.cancelled)
+        job.put("answers", answers)
+
+    def render_stage(job):
+        pdf_bytes = job.get("pdf")
+        if pdf_bytes is None:
+            formatted_response = format_assignment_solution(job.get("questions"), job.get("answers"))
+            logger.debug(f"Formatted response: {formatted_response[:500]}...")  # Log the first 500 characters
+            pdf_bytes = render_when_free(job, formatted_response)
+            job.put("pdf", pdf_bytes)
+
+        # Send the document back to the user
+        bot.send_document(job.owner, pdf_bytes, visible_file_name="solved_assignment.pdf",
+                          caption="Here's your solved assignment!", reply_to_message_id=job.payload["message_id"],
+                          allow_sending_without_reply=True)
+
+    def report_failure(job, error):
+        message = str(error) if isinstance(error, JobFailed) else f"An error occurred while processing your assignment: {str(error)}"
+        bot.send_message(job.owner, message, reply_to_message_id=job.payload["message_id"], allow_sending_without_reply=True)
+
+    assignment_jobs.register("assignment", [
+        ("extracting", extract_stage),
+        ("answering", answer_stage),
+        ("rendering", render_stage),
+    ], on_failure=report_failure)
+
+    @assignment_flow.on("awaiting_upload", content_types=['text'],
+                        func=lambda message: message.text.lower().startswith('assignment:'))
+    def handle_assignment_query(message, data):
         logger.debug(f"Assignment query handler triggered for user {message.chat.id}")
         query = sanitize_input(message.text[11:].strip())  # Remove 'assignment:' prefix
-        response = process_text(f"Answer this assignment question: {query}")
-        bot.reply_to(message, format_response(response))
-
-        # Reset user state
-        user_states.pop(message.chat.id, None)
-
-# Function to extract text from PDF using PyMuPDF
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = fitz.open(stream=BytesIO(pdf_file), filetype="pdf")
-    text = ""
-    for page_num in range(len(pdf_reader)):
-        page = pdf_reader.load_page(page_num)
-        text += page.get_text("text")  # Extract text from page
-    pdf_reader.close()
-    logger.debug(f"Extracted text from PDF: {text[:500]}...")  # Log the first 500 characters
-    return text
+        try:
+            response = process_text(f"Answer this assignment question: {query}", user_id=message.chat.id)
+            bot.reply_to(message, format_response(response))
+        except LLMError as e:
+            logger.error(f"Error in handle_assignment_query: {str(e)}")
+            bot.reply_to(message, "Sorry, I couldn't answer that right now. Please try again in a moment.")
+
+        # End the conversation
+        return None
+
+def render_when_free(job, content):
+    """
+    Render a solution on render_pool, waiting up to RENDER_TIMEOUT for a slot while the pool is full
+
+    A full pool means other papers are being rendered, not that this job
+    failed, so waiting does not use up one of the job's attempts.
+
+    Returns:
+        bytes: The PDF file
+
+    Raises:
+        JobCancelled: If the job was cancelled
+        JobFailed: If no slot became free in time or the render timed out
+    """
+    deadline = time.monotonic() + RENDER_TIMEOUT
+    while True:
+        try:
+            return render_pool.render(job.owner, content)
+        except RenderQueueFull:
+            if job.cancelled:
+                raise JobCancelled()
+            if time.monotonic() >= deadline:
+                logger.error(f"No render slot for user {job.owner} within {RENDER_TIMEOUT}s")
+                raise JobFailed("Too many assignments are being prepared right now. Please try again in a few minutes.")
+            time.sleep(_RENDER_SLOT_POLL)
+        except RenderCancelled:
+            raise JobCancelled()
+        except RenderTimeout:
+            logger.error(f"Rendering timed out for user {job.owner}")
+            raise JobFailed("An error occurred while generating the document. Please try again.")
 
 # Function to extract text from image using pytesseract
 def extract_text_from_image(image_file):
-    image = Image.open(BytesIO(image_file))
-    text = pytesseract.image_to_string(image)
+    # Preprocessed, run on the OCR worker pool and cached by image hash
+    text = ocr_image(image_file)
     logger.debug(f"Extracted text from image: {text[:500]}...")  # Log the first 500 characters
     return text
 
-def extract_questions(text):
-    # Use regex to find questions in the text
-    question_pattern = r'(\d+)\s+(.*?)\s+(\d+)\s+(CO\d+)\s+(L\d+(?:,L\d+)*)'
-    questions = re.findall(question_pattern, text, re.DOTALL)
-    
-    formatted_questions = []
-    for q in questions:
-        formatted_questions.append({
-            "question": q[1].strip(),
-            "marks": q[2],
-            "co": q[3],
-            "lo": q[4]
-        })
-    
-    logger.debug(f"Extracted questions: {formatted_questions}")
-    return formatted_questions
-
-def generate_answers(questions):
-    answers = []
-    for q in questions:
-        prompt = f"Provide a concise, accurate, and straightforward answer to this question: {q['question']} (CO: {q['co']}, LO: {q['lo']})"
-        answer = process_text(prompt)
-        answers.append(answer)
+# Short questions are answered several per model call: (max marks, batch size) pairs
+BATCH_SIZES_BY_MARKS = ((2, 5), (3, 3))
+ANSWER_HEADER_PATTERN = re.compile(r'^[ \t]*#{1,4}[ \t]*Answer[ \t]+(\d+)[ \t]*:?[ \t]*$', re.MULTILINE | re.IGNORECASE)
+FAILED_ANSWER = "Sorry, I couldn't generate an answer for this question. Please try asking it again."
+
+def complete_answer(prompt, profile, user_id, description):
+    # complete_text already retries transient errors with backoff, so failures here are final
+    try:
+        answer = complete_text(prompt, profile=profile, priority=PRIORITY_BULK, user_id=user_id)
+    except LLMError as e:
+        logger.warning(f"Error answering {description}: {str(e)}")
+        return None
+    if not answer:
+        logger.warning(f"Empty answer for {description}")
+    return answer or None
+
+def answer_question(q, user_id=None):
+    prompt = f"Provide a concise, accurate, and straightforward answer to this question: {q['question']} (CO: {q['co']}, LO: {q['lo']})"
+    return complete_answer(prompt, profile_for_marks(q['marks']), user_id, f"question {q['question'][:50]!r}") or FAILED_ANSWER
+
+def batch_size_for(q):
+    try:
+        marks = int(q['marks'])
+    except (TypeError, ValueError):
+        return 1
+    for max_marks, size in BATCH_SIZES_BY_MARKS:
+        if marks <= max_marks:
+            return size
+    return 1
+
+def iter_batches(indexed_questions):
+    """
+    Group questions into batches whose size depends on the marks
+
+    Each batch is yielded as soon as it is full, so answering can start while
+    later questions are still being read; partly filled batches come last.
+
+    Args:
+        indexed_questions (Iterable[tuple]): (index, question) pairs
+
+    Yields:
+        list: (index, question) pairs
+    """
+    open_batches = {}
+    for i, q in indexed_questions:
+        size = batch_size_for(q) if ASSIGNMENT_BATCHING else 1
+        batch = open_batches.setdefault(size, [])
+        batch.append((i, q))
+        if len(batch) == size:
+            del open_batches[size]
+            yield batch
+    yield from open_batches.values()
+
+def parse_batch_answers(response, count):
+    """
+    Split a batched response into answers, or return None if it is malformed
+    """
+    parts = ANSWER_HEADER_PATTERN.split(response)
+    answers = {}
+    # parts is [preamble, number, answer, number, answer, ...]
+    for number, answer in zip(parts[1::2], parts[2::2]):
+        answers[int(number)] = answer.strip()
+    if sorted(answers) != list(range(1, count + 1)) or not all(answers.values()):
+        return None
+    return [answers[n] for n in range(1, count + 1)]
+
+def answer_batch(batch, user_id=None):
+    """
+    Answer several questions with one model call, falling back to one call per question
+    """
+    if len(batch) == 1:
+        return [answer_question(batch[0], user_id)]
+
+    sections = "\n\n".join(
+        f"### Question {n}\n{q['question']} (CO: {q['co']}, LO: {q['lo']})" for n, q in enumerate(batch, 1))
+    prompt = (
+        "Provide a concise, accurate, and straightforward answer to each of the following questions. "
+        f"Reply with exactly {len(batch)} sections in order. Start each section with a line of the form "
+        "'### Answer <number>' and write nothing before the first section.\n\n"
+        f"{sections}"
+    )
+    # The long-answer budget covers a full batch of short answers
+    response = complete_answer(prompt, "assignment_10mark", user_id, f"batch of {len(batch)} questions")
+    answers = parse_batch_answers(response, len(batch)) if response else None
+    if answers is None:
+        logger.warning(f"Could not parse batched answers for {len(batch)} questions, answering them one by one")
+        answers = [answer_question(q, user_id) for q in batch]
+    return answers
+
+def answer_variant(q):
+    """
+    Return what besides the question text goes into its prompt, for the answer store
+    """
+    return f"{profile_for_marks(q['marks'])}|{q['co']}|{q['lo']}"
+
+def generate_answers(questions, progress_callback=None, user_id=None, cancelled=None):
+    """
+    Answer all questions in parallel, keeping the original order
+
+    Questions that were answered before, for this or another user, are taken
+    from answer_store. The rest are packed into batches (see
+    BATCH_SIZES_BY_MARKS) so that a paper needs fewer model calls. questions
+    may be a generator, in which case each batch is submitted as soon as its
+    questions have arrived.
+
+    Args:
+        questions (Iterable[dict]): Questions as returned by extract_questions
+        progress_callback (Callable[[int, int], None]): Called with
+            (answered, total) each time answers finish
+        user_id (Hashable): User the paper belongs to, for fair scheduling
+        cancelled (Callable[[], bool]): Checked between batches; once it
+            returns True no more batches are sent
+
+    Returns:
+        list: One answer per question, in the same order
+
+    Raises:
+        JobCancelled: If cancelled returned True
+    """
+    answers = {}
+
+    def unanswered():
+        for i, q in enumerate(questions):
+            stored = answer_store.get(q['question'], answer_variant(q))
+            if stored is None:
+                yield i, q
+            else:
+                answers[i] = stored
+
+    def check_cancelled():
+        if cancelled is not None and cancelled():
+            raise JobCancelled()
+
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max(1, ASSIGNMENT_CONCURRENCY)) as executor:
+        try:
+            for batch in iter_batches(unanswered()):
+                check_cancelled()
+                futures[executor.submit(answer_batch, [q for _, q in batch], user_id)] = batch
+
+            total = len(answers) + sum(len(batch) for batch in futures.values())
+            done = len(answers)
+            if done:
+                logger.debug(f"{done} of {total} answers taken from the answer store")
+                if progress_callback:
+                    progress_callback(done, total)
+            for future in as_completed(futures):
+                batch = futures[future]
+                for (i, q), answer in zip(batch, future.result()):
+                    answers[i] = answer
+                    if answer != FAILED_ANSWER:
+                        answer_store.put(q['question'], answer, answer_variant(q))
+                done += len(batch)
+                if progress_callback:
+                    progress_callback(done, total)
+                check_cancelled()
+        except BaseException:
+            # Batches that have not started are dropped instead of waited for
+            for future in futures:
+                future.cancel()
+            raise
+    answers = [answers[i] for i in range(total)]
     logger.debug(f"Generated answers: {answers[:2]}")  # Log the first two answers
     return answers
 
@@ -6,6 +6,10 @@ import json
 import io
 import requests
 from datetime import datetime
+from services.conversation import Flow, conversations
+
+# Waits for the details of a lost and found request
+campus_flow = conversations.register(Flow("campus"))
 
 def register_campus_handler(bot):
     @bot.callback_query_handler(func=lambda call: call.data == "campus")
@@ -60,7 +64,7 @@ def register_campus_handler(bot):
         elif call.data == "lost_and_found":
             response = "*Lost and Found Service*\n\nTo report a lost item or check for found items, please provide the following information:\n1. Lost or Found?\n2. Item description\n3. Date lost/found\n4. Location lost/found\n\nSeparate each piece of information with a comma."
             bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
-            bot.register_next_step_handler(call.message, lost_and_found_handler)
+            conversations.start(call.message.chat.id, "campus", "lost_and_found")
             return
         else:
             response = "*I'm sorry, I couldn't process that request.*"
@@ -68,7 +72,8 @@ def register_campus_handler(bot):
         bot.answer_callback_query(call.id)
         bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
 
-    def lost_and_found_handler(message):
+    @campus_flow.on("lost_and_found")
+    def lost_and_found_handler(message, data):
         try:
             status, description, date, location = [item.strip() for item in message.text.split(',', 3)]
             report_id = submit_lost_and_found_report(status, description, date, location)
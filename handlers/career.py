@@ -1,14 +1,17 @@
 import logging
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from services.llama_vision import process_text, process_image_and_text
-from services.flux_schnell import process_image
-from services.document_generator import generate_cover_letter
+from services.document_generator import generate_cover_letter, generate_cold_email
+from services.pdf_extractor import extract_pdf
+from services.ocr import ocr_image
+from config import BULK_EMAIL_MAX_ROWS
+from services.conversation import Flow, conversations
+from services.ats_scorer import score_resume, match_role
+from services.bulk_email import build_cold_email_bundle, REQUIRED_COLUMNS, OPTIONAL_COLUMNS
 from telebot.apihelper import ApiTelegramException
 from utils.google_sheets_logger import GoogleSheetsLogger
 import json
-from random import choice
 import io
-import PyPDF2
 import re
 import traceback
 import os
@@ -20,6 +23,21 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 GOOGLE_SHEETS_CREDENTIALS = os.getenv("GOOGLE_SHEETS_CREDENTIALS")
 GOOGLE_SHEETS_SPREADSHEET_ID = '1CC0MvsG65IGV1rhRK6q2ORi0iiX93TX1Fk91V4ImO7Q'
+
+# Tips and insights menus send the same prompt every time, so their answers are cached
+FIXED_PROMPT_CACHE_TTL = 6 * 60 * 60
+
+# Menus that wait for the user's next message: cover letter, cold emails, mock interview and resume review
+career_flow = conversations.register(Flow("career"))
+
+
+def is_resume_photo(message):
+    """
+    Return whether a photo is captioned for resume analysis; study's photo handler leaves these to career
+    """
+    return bool(message.caption) and message.caption.lower().startswith('analyze resume:')
+
+
 # Initialize Google Sheets Logger
 try:
     sheets_logger = GoogleSheetsLogger(GOOGLE_SHEETS_CREDENTIALS, GOOGLE_SHEETS_SPREADSHEET_ID)
@@ -29,69 +47,6 @@ except Exception as e:
     sheets_logger = None
 
 
-def generate_cold_email(name, year, college, branch, skills, company, recipient_name, position, projects, resume_link,
-                        github_link, custom_note=""):
-    """
-    Generate a personalized cold email with randomized sections for variety.
-    """
-    # Randomized components
-    opening_lines = [
-        f"I hope you are doing well. My name is {name}, a {year} student at {college}, specializing in {branch}.",
-        f"I’m {name}, currently in my {year} at {college}, pursuing {branch}.",
-        f"My name is {name}, and I’m a {year} student at {college}, majoring in {branch}."
-    ]
-
-    skills_lines = [
-        f"I have experience in {skills} and have worked on several projects to apply these skills in real-world scenarios.",
-        f"My expertise includes {skills}, which I have honed through academic projects and freelance work.",
-        f"I bring strong skills in {skills}, gained through coursework, hackathons, and personal projects."
-    ]
-
-    position_lines = [
-        f"I recently came across the {position} role at {company}, and I’m eager to apply.",
-        f"The {position} opportunity at {company} caught my attention, and I believe I’m a great fit for the role.",
-        f"I’m excited about the {position} role at {company} and would love the opportunity to contribute to your team."
-    ]
-
-    projects_lines = [
-        "Here are a couple of my recent projects:",
-        "I’ve highlighted a few of my projects below:",
-        "Here are some examples of my work:"
-    ]
-
-    closing_lines = [
-        "I’d be delighted to contribute to your team. Please let me know if there’s anything else you’d like me to share.",
-        "I look forward to discussing how I can contribute to your team’s success.",
-        "Please feel free to reach out if you’d like more details about my background or projects."
-    ]
-
-    # Assemble the email
-    email_parts = [
-        f"Hi {recipient_name},\n\n",
-        f"{choice(opening_lines)}\n\n",
-        f"{choice(skills_lines)}\n\n",
-        f"{choice(position_lines)}\n\n"
-    ]
-
-    # Add projects section
-    if projects:
-        email_parts.append(f"{choice(projects_lines)}\n\n")
-        for project in projects.split(','):
-            email_parts.append(f"- {project.strip()} : Demo Link\n")
-        email_parts.append("\n")
-
-    # Add resume and GitHub links
-    if resume_link:
-        email_parts.append(f"Here’s my resume: {resume_link}\n\n")
-    if github_link:
-        email_parts.append(f"GitHub Profile: {github_link}\n\n")
-
-    # Add closing
-    email_parts.append(f"{choice(closing_lines)}\n\n")
-    email_parts.append(f"Best regards,\n{name}\n")
-
-    return "".join(email_parts)
-
 def register_career_handler(bot):
     @bot.callback_query_handler(func=lambda call: call.data == "career")
     def career_callback(call):
@@ -137,6 +92,7 @@ def register_career_handler(bot):
             InlineKeyboardButton("Salary Negotiation", callback_data="salary_negotiation"),
             InlineKeyboardButton("Cover Letter Generator", callback_data="cover_letter_generator"),
             InlineKeyboardButton("Cold Email Generator", callback_data="cold_email_generator"),  # Added this line
+            InlineKeyboardButton("Bulk Cold Emails (CSV)", callback_data="bulk_cold_email"),
             InlineKeyboardButton("Industry Insights", callback_data="industry_insights"),
             InlineKeyboardButton("Mock Interview", callback_data="mock_interview")
         )
@@ -146,7 +102,7 @@ def register_career_handler(bot):
     @bot.callback_query_handler(
         func=lambda call: call.data in ["resume_review", "job_search", "interview_tips", "career_path",
                                         "salary_negotiation", "cover_letter_generator", "industry_insights",
-                                        "mock_interview","cold_email_generator"])
+                                        "mock_interview","cold_email_generator", "bulk_cold_email"])
     def career_option_callback(call):
         try:
             response = ""
@@ -158,7 +114,7 @@ def register_career_handler(bot):
                 bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
             elif call.data == "interview_tips":
                 bot.answer_callback_query(call.id, "Providing Interview Tips...")
-                tips = process_text("Provide 5 key interview tips for college students.")
+                tips = process_text("Provide 5 key interview tips for college students.", cache_ttl=FIXED_PROMPT_CACHE_TTL, profile="short_tip")
                 response = f"*Here are some interview tips:*\n\n{tips}"
                 bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
             elif call.data == "career_path":
@@ -167,14 +123,14 @@ def register_career_handler(bot):
                 bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
             elif call.data == "salary_negotiation":
                 bot.answer_callback_query(call.id, "Opening Salary Negotiation Guide...")
-                tips = process_text("Provide 5 key salary negotiation tips for new graduates.")
+                tips = process_text("Provide 5 key salary negotiation tips for new graduates.", cache_ttl=FIXED_PROMPT_CACHE_TTL, profile="short_tip")
                 response = f"*Salary Negotiation Tips:*\n\n{tips}"
                 bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
             elif call.data == "cover_letter_generator":
                 bot.answer_callback_query(call.id, "Opening Cover Letter Generator...")
                 response = "*Please provide the following information for your cover letter:*\n1. Your name\n2. The company name\n3. The position you're applying for\n4. Your top 3 skills\n\nSeparate each piece of information with a comma."
                 bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
-                bot.register_next_step_handler(call.message, generate_cover_letter_handler)
+                conversations.start(call.message.chat.id, "career", "cover_letter")
             elif call.data == "cold_email_generator":
                 bot.answer_callback_query(call.id, "Opening Cold Email Generator...")
                 response = ("*Please provide the following information for your cold email:*\n\n"
@@ -192,7 +148,16 @@ def register_career_handler(bot):
                             "Separate each piece of information with a comma.")
 
                 bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
-                bot.register_next_step_handler(call.message, generate_cold_email_handler)
+                conversations.start(call.message.chat.id, "career", "cold_email")
+            elif call.data == "bulk_cold_email":
+                bot.answer_callback_query(call.id, "Opening Bulk Cold Emails...")
+                response = ("*Upload a CSV file with one row per email.*\n\n"
+                            f"Required columns: `{', '.join(REQUIRED_COLUMNS)}`\n"
+                            f"Optional columns: `{', '.join(OPTIONAL_COLUMNS)}`\n\n"
+                            "You'll get a zipped CSV with one row per email. "
+                            "Add the caption \"csv\" to get it uncompressed.")
+                bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
+                conversations.start(call.message.chat.id, "career", "bulk_cold_email")
 
             elif call.data == "industry_insights":
                 bot.answer_callback_query(call.id, "Fetching Industry Insights...")
@@ -207,7 +172,7 @@ def register_career_handler(bot):
                 bot.answer_callback_query(call.id, "Starting Mock Interview...")
                 response = "*What position or field would you like to practice interviewing for?*"
                 bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
-                bot.register_next_step_handler(call.message, start_mock_interview)
+                conversations.start(call.message.chat.id, "career", "interview_position")
 
             if sheets_logger:
                 sheets_logger.log_interaction(
@@ -222,7 +187,8 @@ def register_career_handler(bot):
             logger.error(f"Error in career option callback: {str(e)}")
             bot.reply_to(call.message, "An error occurred while processing your request. Please try again.")
 
-    def generate_cold_email_handler(message):
+    @career_flow.on("cold_email")
+    def generate_cold_email_handler(message, data):
         try:
             # Split the input and handle optional fields
             parts = [part.strip() for part in message.text.split(',')]
@@ -284,11 +250,53 @@ def register_career_handler(bot):
             logger.error(f"Error generating cold email: {str(e)}")
             bot.reply_to(message, "An error occurred while generating your cold email. Please try again.")
 
+    @career_flow.on("bulk_cold_email")
+    def handle_bulk_cold_email_upload(message, data):
+        try:
+            if not message.document or not (message.document.file_name or '').lower().endswith('.csv'):
+                bot.reply_to(message, "Please upload a .csv file. Choose Bulk Cold Emails again to retry.")
+                return
+
+            bundle_format = 'csv' if (message.caption or '').strip().lower() == 'csv' else 'zip'
+            bot.send_chat_action(message.chat.id, 'upload_document')
+            file_info = bot.get_file(message.document.file_id)
+            downloaded_file = bot.download_file(file_info.file_path)
+
+            bundle, summary = build_cold_email_bundle(io.BytesIO(downloaded_file), bundle_format)
+            del downloaded_file
+            with bundle:
+                if not summary["generated"]:
+                    bot.reply_to(message, "No emails could be generated. Please check that every row has the "
+                                          "required columns filled in.\n\n" + "\n".join(summary["errors"]))
+                    return
+                caption = f"{summary['generated']} cold emails generated"
+                if summary["skipped"]:
+                    caption += f", {summary['skipped']} rows skipped for missing details"
+                if summary["truncated"]:
+                    caption += f". Only the first {BULK_EMAIL_MAX_ROWS} rows were used"
+                bot.send_document(message.chat.id, bundle, visible_file_name=f"cold_emails.{bundle_format}",
+                                  caption=caption, reply_to_message_id=message.message_id)
+
+            if sheets_logger:
+                sheets_logger.log_interaction(
+                    user_id=message.from_user.id,
+                    username=message.from_user.username,
+                    query_type="bulk_cold_email_generated",
+                    user_query=f"Uploaded {message.document.file_name}",
+                    ai_response=caption
+                )
+
+        except ValueError as e:
+            bot.reply_to(message, str(e))
+        except Exception as e:
+            logger.error(f"Error generating bulk cold emails: {str(e)}")
+            bot.reply_to(message, "An error occurred while generating your cold emails. Please try again.")
+
     @bot.callback_query_handler(func=lambda call: call.data.startswith("insight_"))
     def industry_insight_callback(call):
         try:
             industry = call.data.split("_")[1]
-            insights = process_text(f"Provide 3 key insights about the current job market in the {industry} industry.")
+            insights = process_text(f"Provide 3 key insights about the current job market in the {industry} industry.", cache_ttl=FIXED_PROMPT_CACHE_TTL, profile="short_tip")
             response = f"*Industry Insights for {industry.capitalize()}:*\n\n{insights}"
             bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
 
@@ -302,8 +310,10 @@ def register_career_handler(bot):
                 )
         except Exception as e:
             logger.error(f"Error in industry insight callback: {str(e)}")
+            bot.send_message(call.message.chat.id, "An error occurred while fetching industry insights. Please try again.")
 
-    def generate_cover_letter_handler(message):
+    @career_flow.on("cover_letter")
+    def generate_cover_letter_handler(message, data):
         try:
             name, company, position, skills = [item.strip() for item in message.text.split(',', 3)]
             cover_letter = generate_cover_letter(name, company, position, skills)
@@ -322,16 +332,17 @@ def register_career_handler(bot):
             error_msg = "I'm sorry, I couldn't process that information. Please make sure you've provided all the required details separated by commas."
             bot.send_message(message.chat.id, error_msg)
 
-    @bot.message_handler(content_types=['photo'],
-                         func=lambda message: message.caption and message.caption.lower().startswith('analyze resume:'))
+    @bot.message_handler(content_types=['photo'], func=is_resume_photo)
     def analyze_resume_image(message):
         try:
             file_info = bot.get_file(message.photo[-1].file_id)
             downloaded_file = bot.download_file(file_info.file_path)
-            image_stream = io.BytesIO(downloaded_file)
 
-            extracted_text = process_image(image_stream)
-            analysis = process_image_and_text("Analyze this resume and provide feedback", extracted_text)
+            extracted_text = ocr_image(downloaded_file)
+            if not extracted_text.strip():
+                bot.reply_to(message, "I couldn't read any text in that image. Please send a clearer photo of your resume.")
+                return
+            analysis = process_image_and_text("Analyze this resume and provide feedback", extracted_text, profile="resume_review")
             response = f"*Resume Analysis:*\n\n{analysis}"
 
             bot.reply_to(message, response, parse_mode="Markdown")
@@ -348,14 +359,15 @@ def register_career_handler(bot):
             logger.error(f"Error analyzing resume image: {str(e)}")
             bot.reply_to(message, "There was an error analyzing your resume image. Please try again.")
 
-    def start_mock_interview(message):
+    @career_flow.on("interview_position")
+    def start_mock_interview(message, data):
         try:
             position = message.text.strip()
-            interview_questions = process_text(f"Generate 3 challenging interview questions for a {position} position")
+            interview_questions = process_text(f"Generate 3 challenging interview questions for a {position} position", profile="short_tip")
             response = f"*Mock Interview for {position} position:*\n\n{interview_questions}\n\nPlease answer these questions, and I'll provide feedback on your responses."
 
             bot.send_message(message.chat.id, response, parse_mode="Markdown")
-            bot.register_next_step_handler(message, mock_interview_feedback)
+            data["position"] = position
 
             if sheets_logger:
                 sheets_logger.log_interaction(
@@ -365,14 +377,17 @@ def register_career_handler(bot):
                     user_query=f"Started mock interview for {position}",
                     ai_response=response
                 )
+            return "interview_answer"
         except Exception as e:
             logger.error(f"Error starting mock interview: {str(e)}")
             bot.reply_to(message, "An error occurred while starting the mock interview. Please try again.")
 
-    def mock_interview_feedback(message):
+    @career_flow.on("interview_answer")
+    def mock_interview_feedback(message, data):
         try:
             feedback = process_text(
-                f"Evaluate this interview response and provide constructive feedback: {message.text}")
+                f"Evaluate this interview response for a {data.get('position', 'job')} position and provide "
+                f"constructive feedback: {message.text}")
             response = f"*Interview Response Feedback:*\n\n{feedback}"
             bot.reply_to(message, response, parse_mode="Markdown")
 
@@ -414,13 +429,14 @@ def register_career_handler(bot):
             bot.answer_callback_query(call.id, "Opening Resume Review...")
             response = "*Please upload your resume as a PDF file, image, or document for review.*"
             bot.send_message(call.message.chat.id, response, parse_mode="Markdown")
-            bot.register_next_step_handler(call.message, handle_resume_upload)
+            conversations.start(call.message.chat.id, "career", "resume_upload")
             return response
         except Exception as e:
             logger.error(f"Error in resume review callback: {str(e)}")
             raise
 
-    def handle_resume_upload(message):
+    @career_flow.on("resume_upload")
+    def handle_resume_upload(message, data):
         try:
             logger.info(f"Starting resume processing for user {message.from_user.id}")
             extracted_text = ""
@@ -431,29 +447,35 @@ def register_career_handler(bot):
                 downloaded_file = bot.download_file(file_info.file_path)
 
                 if message.document.mime_type == "application/pdf":
-                    pdf_stream = io.BytesIO(downloaded_file)
-                    pdf_reader = PyPDF2.PdfReader(pdf_stream)
-                    extracted_text = "\n".join(page.extract_text() for page in pdf_reader.pages if page.extract_text())
+                    extracted_text = extract_text_from_pdf(downloaded_file)
+                elif (message.document.mime_type or "").startswith("image/"):
+                    extracted_text = ocr_image(downloaded_file)
                 else:
-                    extracted_text = process_image(io.BytesIO(downloaded_file))
+                    bot.reply_to(message, "Please upload your resume as a PDF or an image.")
+                    return
 
             elif message.photo:
                 logger.info(f"Processing photo for user {message.from_user.id}")
                 file_info = bot.get_file(message.photo[-1].file_id)
                 downloaded_file = bot.download_file(file_info.file_path)
-                extracted_text = process_image(io.BytesIO(downloaded_file))
+                extracted_text = ocr_image(downloaded_file)
 
             else:
                 response = "Please upload a PDF, image, or document."
                 bot.reply_to(message, response)
                 return
 
+            if not extracted_text.strip():
+                bot.reply_to(message, "I couldn't read any text in your resume. Please send a clearer copy.")
+                return
+
             bot.reply_to(message, "Resume received! Reviewing...")
 
             logger.info(f"Extracted text from resume for user {message.from_user.id}")
 
-            analysis = process_image_and_text("Analyze this resume and provide feedback", extracted_text)
-            ats_score = calculate_ats_score(extracted_text)
+            analysis = process_image_and_text("Analyze this resume and provide feedback", extracted_text, profile="resume_review")
+            # A caption such as "data scientist" scores the resume for that role
+            ats_score = calculate_ats_score(extracted_text, match_role(message.caption))
 
             response = f"*Resume Analysis:*\n\n{analysis}\n\nATS Score: *{ats_score}/100*"
             bot.reply_to(message, response, parse_mode="Markdown")
@@ -472,64 +494,12 @@ def register_career_handler(bot):
             bot.reply_to(message, "There was an error processing your resume. Please try again.")
 
 
-    def calculate_ats_score(resume_text):
+    def calculate_ats_score(resume_text, role="default"):
         """
-        Calculate ATS score based on resume content
+        Calculate ATS score based on resume content, see services.ats_scorer
         """
         try:
-            # Keywords for job-relevant skills, experience, etc.
-            keywords = ['experience', 'skills', 'education', 'projects', 'certification',
-                        'achievement', 'leadership', 'management', 'technical', 'professional']
-
-            section_keywords = ['work experience', 'education', 'skills', 'projects',
-                                'certifications', 'achievements', 'summary', 'objective']
-
-            format_keywords = ['email', 'phone', 'address', 'linkedin']
-
-            total_keywords = len(keywords)
-            total_sections = len(section_keywords)
-            total_format = len(format_keywords)
-
-            # Initialize score components
-            keyword_score = 0
-            section_score = 0
-            format_score = 0
-
-            # Calculate keyword score (40%)
-            for keyword in keywords:
-                if keyword.lower() in resume_text.lower():
-                    keyword_score += 1
-            keyword_score = min(int((keyword_score / total_keywords) * 40), 40)
-
-            # Calculate section score (40%)
-            for section in section_keywords:
-                if section.lower() in resume_text.lower():
-                    section_score += 1
-            section_score = min(int((section_score / total_sections) * 40), 40)
-
-            # Calculate format score (20%)
-            for format_item in format_keywords:
-                if format_item.lower() in resume_text.lower():
-                    format_score += 1
-            format_score = min(int((format_score / total_format) * 20), 20)
-
-            # Apply penalties
-            penalties = 0
-
-            # Penalty for missing key sections
-            if section_score < (total_sections * 0.6):  # Less than 60% of key sections
-                penalties += 10
-
-            # Penalty for poor formatting (based on newlines and spacing)
-            if resume_text.count('\n') < 10:  # Too few line breaks
-                penalties += 5
-
-            # Calculate final score
-            final_score = keyword_score + section_score + format_score - penalties
-
-            # Ensure score is within 0-100 range
-            return max(0, min(final_score, 100))
-
+            return score_resume(resume_text, role)["score"]
         except Exception as e:
             logger.error(f"Error calculating ATS score: {str(e)}")
             return 0
@@ -558,13 +528,7 @@ def register_career_handler(bot):
         Extract text content from a PDF file
         """
         try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_stream))
-            text = ""
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            return text
+            return "\n".join(page for page in extract_pdf(file_stream).pages if page.strip())
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
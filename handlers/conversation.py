@@ -0,0 +1,18 @@
+import logging
+from services.conversation import conversations, ALL_CONTENT_TYPES
+
+logger = logging.getLogger(__name__)
+
+
+def register_conversation_handler(bot):
+    # Registered after handlers with their own /cancel (e.g. the assignment solver's), which take precedence
+    @bot.message_handler(commands=['cancel'], func=lambda message: conversations.get(message.chat.id) is not None)
+    def cancel_conversation(message):
+        conversations.end(message.chat.id)
+        bot.reply_to(message, "Cancelled.")
+
+    # Messages that continue a conversation go to its flow before any other handler sees them
+    @bot.message_handler(content_types=ALL_CONTENT_TYPES, func=conversations.matches)
+    def continue_conversation(message):
+        logger.debug(f"Continuing conversation for chat {message.chat.id}")
+        conversations.dispatch(message)
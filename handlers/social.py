@@ -1,11 +1,14 @@
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from services.llama_vision import process_text, process_image_and_text
-from services.flux_schnell import process_image
-import io
+from services.ocr import ocr_image
 import random
 import json
 import logging
 import time
+from services.conversation import Flow, conversations
+
+# Waits for the details of a peer mentorship request
+social_flow = conversations.register(Flow("social"))
 
 def register_social_handler(bot):
     @bot.callback_query_handler(func=lambda call: call.data == "social")
@@ -71,7 +74,7 @@ def register_social_handler(bot):
         elif call.data == "peer_mentorship":
             bot.answer_callback_query(call.id, "Accessing Peer Mentorship Program...")
             bot.send_message(call.message.chat.id, "*Peer Mentorship Program*\n\nAre you interested in being a mentor or finding a mentor? Please provide the following information:\n1. Mentor or Mentee?\n2. Your major/field of study\n3. Specific areas you can help with / need help in\n4. Preferred meeting frequency (e.g., weekly, bi-weekly)\n\nSeparate each piece of information with a comma.", parse_mode="Markdown")
-            bot.register_next_step_handler(call.message, peer_mentorship_handler)
+            conversations.start(call.message.chat.id, "social", "peer_mentorship")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith("hangout_"))
     def hangout_activity_callback(call):
@@ -79,7 +82,8 @@ def register_social_handler(bot):
         response = f"Great choice! I've set up a virtual {activity} for tomorrow at 7 PM. Here's the link to join: [Virtual Hangout Link]"
         bot.send_message(call.message.chat.id, response)
 
-    def peer_mentorship_handler(message):
+    @social_flow.on("peer_mentorship")
+    def peer_mentorship_handler(message, data):
         try:
             role, major, areas, frequency = [item.strip() for item in message.text.split(',', 3)]
             # Here you would typically save this information to a database and match mentors/mentees
@@ -92,10 +96,12 @@ def register_social_handler(bot):
     def analyze_event_poster(message):
         file_info = bot.get_file(message.photo[-1].file_id)
         downloaded_file = bot.download_file(file_info.file_path)
-        image_stream = io.BytesIO(downloaded_file)
-        
-        # Use Flux Schnell to extract information from the event poster
-        poster_info = process_image(image_stream)
+
+        # Read the poster's text locally
+        poster_info = ocr_image(downloaded_file)
+        if not poster_info.strip():
+            bot.reply_to(message, "I couldn't read any text on that poster. Please send a clearer photo.")
+            return
         
         # Use Llama Vision to analyze the poster information and provide details
         event_details = process_image_and_text("Analyze this event poster and provide key details", poster_info)
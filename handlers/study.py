@@ -1,10 +1,16 @@
 import os
-import PyPDF2
 import logging
-from io import BytesIO
-from services.llama_vision import process_text
+from services.llama_vision import stream_text
 from services.flux_schnell import process_image
 import time
+from telebot.apihelper import ApiTelegramException
+from config import (STREAM_EDIT_INTERVAL, DOC_CHUNK_WORDS, DOC_CHAT_TOP_K, DOC_STORE_MAX_BYTES, DOC_STORE_IDLE_TTL,
+                    DOC_STORE_DISK_TTL, DOC_STORE_DIR)
+from services.document_index import DocumentIndex
+from services.document_store import DocumentSessionStore
+from services.pdf_extractor import iter_pages, PDFTooLargeError
+from services.telegram_outbox import outbox, split_point, MAX_MESSAGE_LENGTH
+from handlers.career import is_resume_photo
 from utils.google_sheets_logger import GoogleSheetsLogger
 from dotenv import load_dotenv
 # from config import GOOGLE_SHEETS_CREDENTIALS, GOOGLE_SHEETS_SPREADSHEET_ID
@@ -18,8 +24,9 @@ GOOGLE_SHEETS_CREDENTIALS= os.getenv("GOOGLE_SHEETS_CREDENTIALS")
 # Initialize sheets logger
 sheets_logger = GoogleSheetsLogger(GOOGLE_SHEETS_CREDENTIALS, GOOGLE_SHEETS_SPREADSHEET_ID)
 
-# Store user's document content
-user_documents = {}
+# Store a retrieval index over each user's document
+user_documents = DocumentSessionStore(DOC_STORE_MAX_BYTES, DOC_STORE_IDLE_TTL, spill_dir=DOC_STORE_DIR,
+                                      disk_ttl=DOC_STORE_DISK_TTL)
 
 
 def register_study_handler(bot):
@@ -45,9 +52,14 @@ def register_study_handler(bot):
         logging.debug(f"Document chat handler triggered for user {message.chat.id}")
         bot.send_chat_action(message.chat.id, 'typing')
         try:
-            response = process_text(
-                f"Based on the following document: {user_documents[message.chat.id]}\n\nUser question: {message.text}")
-            send_long_message(bot, message.chat.id, response)
+            document = user_documents.get(message.chat.id)
+            if document is None:
+                bot.reply_to(message, "Your document session has expired. Please upload the document again.")
+                return
+            excerpts = document.context_for(message.text, k=DOC_CHAT_TOP_K)
+            response = send_streaming_message(bot, message.chat.id, stream_text(
+                f"Based on the following excerpts from the user's document:\n{excerpts}\n\nUser question: {message.text}",
+                profile="doc_qa", user_id=message.chat.id))
 
             # Log interaction
             sheets_logger.log_interaction(
@@ -77,8 +89,7 @@ def register_study_handler(bot):
         logging.debug(f"Text handler triggered for user {message.chat.id}")
         bot.send_chat_action(message.chat.id, 'typing')
         try:
-            response = process_text(message.text)
-            send_long_message(bot, message.chat.id, response)
+            response = send_streaming_message(bot, message.chat.id, stream_text(message.text, user_id=message.chat.id))
 
             # Log interaction
             sheets_logger.log_interaction(
@@ -102,7 +113,8 @@ def register_study_handler(bot):
                 error_message
             )
 
-    @bot.message_handler(content_types=['photo'])
+    # Registered before career's handlers, so photos captioned for them are skipped here
+    @bot.message_handler(content_types=['photo'], func=lambda message: not is_resume_photo(message))
     def handle_photo(message):
         logging.debug(f"Photo handler triggered for user {message.chat.id}")
         bot.send_chat_action(message.chat.id, 'typing')
@@ -142,11 +154,14 @@ def register_study_handler(bot):
             if message.document.mime_type == 'application/pdf':
                 file_info = bot.get_file(message.document.file_id)
                 downloaded_file = bot.download_file(file_info.file_path)
-                pdf_text = extract_text_from_pdf(downloaded_file)
+                pdf = iter_pages(downloaded_file)
 
-                user_documents[message.chat.id] = pdf_text
+                # Chunks are indexed while later pages are still being parsed
+                user_documents.put(message.chat.id, DocumentIndex.from_pages(pdf, chunk_words=DOC_CHUNK_WORDS))
 
                 response = "*I've read your document. You can now ask me questions about it. To exit document chat mode, type '/exit_doc_chat'.*"
+                if pdf.truncated:
+                    response += f"\n_Only the first {pdf.page_count} of {pdf.total_pages} pages were read._"
                 bot.reply_to(message, response, parse_mode="Markdown")
 
                 # Log interaction
@@ -169,6 +184,9 @@ def register_study_handler(bot):
                     "Non-PDF document uploaded",
                     response
                 )
+        except PDFTooLargeError as e:
+            logging.info(f"Rejected PDF from user {message.chat.id}: {str(e)}")
+            bot.reply_to(message, "*Sorry, this PDF is too large for me to read.*", parse_mode="Markdown")
         except Exception as e:
             logging.error(f"Error in handle_document: {str(e)}")
             error_message = f"*An error occurred while processing the PDF: {str(e)}*"
@@ -185,24 +203,115 @@ def register_study_handler(bot):
     @bot.message_handler(commands=['exit_doc_chat'])
     def exit_doc_chat(message):
         logging.debug(f"Exit document chat triggered for user {message.chat.id}")
-        if message.chat.id in user_documents:
-            del user_documents[message.chat.id]
+        if user_documents.pop(message.chat.id):
             bot.reply_to(message, "Exited document chat mode. You can now ask general questions or upload a new document.")
         else:
             bot.reply_to(message, "You're not in document chat mode.")
 
-def extract_text_from_pdf(pdf_file):
-    pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_file))
+EMPTY_STREAM_RESPONSE = "I apologize, but I couldn't generate a response. Could you please try rephrasing your question?"
+
+
+def _edit_message(bot, message, text):
+    try:
+        bot.edit_message_text(text, message.chat.id, message.message_id)
+        return True
+    except ApiTelegramException as e:
+        # Intermediate edits are best effort, e.g. when Telegram throttles us
+        logging.warning(f"Could not update streamed message {message.message_id}: {str(e)}")
+        return False
+
+
+def _finish_message(bot, message, text):
+    """
+    Put the final text into a streamed message, replacing the message if it cannot be edited
+
+    Returns:
+        Message: The message now holding text
+    """
+    if _edit_message(bot, message, text):
+        return message
+    # Don't leave the stale partial text above the real one
+    try:
+        bot.delete_message(message.chat.id, message.message_id)
+    except ApiTelegramException as e:
+        logging.warning(f"Could not delete stale streamed message {message.message_id}: {str(e)}")
+    return bot.send_message(message.chat.id, text)
+
+
+def send_streaming_message(bot, chat_id, chunks, placeholder="…"):
+    """
+    Show a streamed answer in Telegram while it is being generated
+
+    A placeholder message is posted straight away and edited at most every
+    STREAM_EDIT_INTERVAL seconds as chunks arrive. Once a message reaches
+    Telegram's 4096 character limit the rest rolls over into a new message,
+    cut at a paragraph or sentence boundary where possible; that message is
+    only sent once there is text for it.
+
+    Args:
+        bot (TeleBot): Bot used to send and edit the messages
+        chat_id (int): Chat to answer in
+        chunks (Iterator[str]): Text deltas, e.g. from stream_text
+        placeholder (str): Text shown until the first chunk arrives
+
+    Returns:
+        str: The full text that was sent
+    """
+    message = bot.send_message(chat_id, placeholder)
+    finished_parts = []
     text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+    shown = placeholder
+    last_edit = time.monotonic()
+
+    try:
+        for chunk in chunks:
+            text += chunk
+            while len(text) > MAX_MESSAGE_LENGTH:
+                cut = split_point(text)
+                part, text = text[:cut].rstrip(), text[cut:].lstrip()
+                if message is None:
+                    bot.send_message(chat_id, part)
+                elif part != shown:
+                    _finish_message(bot, message, part)
+                finished_parts.append(part)
+                # The next message is sent with the first text that goes into it
+                message, shown = None, ""
+                last_edit = 0
+
+            if text and text != shown and time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+                if message is None:
+                    message = bot.send_message(chat_id, text)
+                    shown = text
+                elif _edit_message(bot, message, text):
+                    shown = text
+                last_edit = time.monotonic()
+    except Exception:
+        # Keep what was generated so far, but don't leave a bare placeholder behind
+        try:
+            if message is None:
+                if text:
+                    bot.send_message(chat_id, text)
+            elif text and text != shown:
+                _finish_message(bot, message, text)
+            elif not text:
+                bot.delete_message(chat_id, message.message_id)
+        except (ApiTelegramException, TimeoutError) as e:
+            # Best effort: callers need the error that stopped the stream, not this one
+            logging.warning(f"Could not clean up streamed message in chat {chat_id}: {str(e)}")
+        raise
+
+    if not text and not finished_parts:
+        text = EMPTY_STREAM_RESPONSE
+    if text:
+        if message is None:
+            bot.send_message(chat_id, text)
+        elif text != shown:
+            _finish_message(bot, message, text)
+
+    finished_parts.append(text)
+    return "".join(finished_parts)
+
 
 def send_long_message(bot, chat_id, text):
-    if len(text) <= 4096:
-        bot.send_message(chat_id, text)
-    else:
-        parts = [text[i:i+4096] for i in range(0, len(text), 4096)]
-        for part in parts:
-            bot.send_message(chat_id, part)
-            time.sleep(0.5)  # Add a small delay between messages
\ No newline at end of file
+    # Split on paragraph and sentence boundaries and paced by the outbox, so this returns immediately
+    return outbox.send_text(chat_id, text)
\ No newline at end of file
@@ -4,7 +4,12 @@ import requests
 from telebot import TeleBot
 from handlers import register_handlers
 from config import TELEGRAM_BOT_TOKEN, UPLOAD_FOLDER
-from flask import Flask
+from services.llama_vision import llm_scheduler, response_cache, inflight_requests
+from handlers.study import user_documents
+from handlers.assignment_solver import render_pool, answer_store, assignment_jobs
+from services.telegram_outbox import outbox
+from services.conversation import conversations
+from flask import Flask, jsonify
 from threading import Thread
 
 app = Flask(__name__)
@@ -13,11 +18,27 @@ app = Flask(__name__)
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-# Initialize bot
-bot = TeleBot(TELEGRAM_BOT_TOKEN)
 
-# Register all handlers
-register_handlers(bot)
+def start_bot():
+    """
+    Create the bot, register its handlers and start the background workers
+
+    Kept out of module scope: render and OCR worker processes import this
+    module as __mp_main__, and must not start threads or resume jobs of their own.
+
+    Returns:
+        TeleBot: The bot, ready for polling
+    """
+    bot = TeleBot(TELEGRAM_BOT_TOKEN)
+    # Pace everything the bot sends before any handler can use it
+    outbox.attach(bot)
+
+    # Register all handlers
+    register_handlers(bot)
+
+    # Resume assignments left unfinished by the previous run
+    assignment_jobs.start()
+    return bot
 
 
 @app.route('/')
@@ -25,6 +46,24 @@ def index():
     return "Telegram Bot is Running"
 
 
+@app.route('/stats')
+def stats():
+    """
+    Expose LLM queue, cache, coalescing and outbound message metrics for monitoring
+    """
+    return jsonify({
+        "llm_scheduler": llm_scheduler.stats(),
+        "response_cache": response_cache.stats(),
+        "coalescing": inflight_requests.stats(),
+        "document_sessions": user_documents.stats(),
+        "telegram_outbox": outbox.stats(),
+        "render_pool": render_pool.stats(),
+        "answer_store": answer_store.stats(),
+        "assignment_jobs": assignment_jobs.stats(),
+        "conversations": conversations.stats(),
+    })
+
+
 def keep_alive():
     """
     Send periodic requests to prevent the service from sleeping
@@ -41,7 +80,7 @@ def keep_alive():
         time.sleep(600)
 
 
-def run_bot():
+def run_bot(bot):
     while True:
         try:
             print("Bot is starting...")
@@ -54,7 +93,7 @@ def run_bot():
 
 if __name__ == "__main__":
     # Start the bot in a new thread
-    bot_thread = Thread(target=run_bot)
+    bot_thread = Thread(target=run_bot, args=(start_bot(),))
     bot_thread.start()
 
     # Start the keep-alive thread
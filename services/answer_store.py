@@ -0,0 +1,336 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# MinHash signature of NUM_BANDS * BAND_ROWS values; questions whose signatures agree on all rows of any band
+# are compared, which finds nearly all pairs above ~0.85 similarity and few below ~0.5
+NUM_BANDS = 16
+BAND_ROWS = 8
+_NUM_PERM = NUM_BANDS * BAND_ROWS
+_SHINGLE = 3
+_PRIME = (1 << 32) + 15
+_rng = np.random.default_rng(20240601)
+# a < 2**31 and shingle hashes < 2**32 keep a * x + b inside uint64
+_PERM_A = _rng.integers(1, 1 << 31, _NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, _NUM_PERM, dtype=np.uint64)
+
+# How often expired entries are deleted, in seconds
+_PURGE_INTERVAL = 600
+# Least recently used answers looked at per round when the store is over its size limit
+_EVICT_BATCH = 32
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    fingerprint TEXT PRIMARY KEY,
+    variant TEXT NOT NULL,
+    numbers TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS answers_accessed_at ON answers (accessed_at);
+CREATE INDEX IF NOT EXISTS answers_created_at ON answers (created_at);
+CREATE TABLE IF NOT EXISTS answer_bands (
+    band INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL REFERENCES answers (fingerprint) ON DELETE CASCADE,
+    PRIMARY KEY (band, hash, fingerprint)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS answer_bands_fingerprint ON answer_bands (fingerprint);
+"""
+
+
+def normalize_question(text):
+    """
+    Reduce a question to lowercase words and numbers separated by single spaces
+
+    Case, punctuation, spacing and Unicode variants (e.g. ligatures from PDF
+    text layers) do not change the meaning, so they do not change the key.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return " ".join(re.findall(r"[^\W_]+", text))
+
+
+def _numbers(normalized):
+    # Questions that differ only in their numbers ("sum of 2 and 3") are different questions
+    return " ".join(re.findall(r"\d+", normalized))
+
+
+def minhash(normalized):
+    """
+    Return the MinHash signature of the character shingles of a normalized question
+
+    Character shingles, rather than words, keep OCR variants that differ in a
+    few letters close to each other.
+
+    Returns:
+        np.ndarray: _NUM_PERM uint64 values
+    """
+    padded = f" {normalized} "
+    shingles = {padded[i:i + _SHINGLE] for i in range(max(1, len(padded) - _SHINGLE + 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def similarity(signature, other):
+    """
+    Estimate the Jaccard similarity of two questions from their signatures
+    """
+    return float(np.count_nonzero(signature == other)) / len(signature)
+
+
+def _band_hashes(signature):
+    rows = signature.reshape(NUM_BANDS, BAND_ROWS)
+    return [int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), "big", signed=True)
+            for row in rows]
+
+
+class AnswerStore:
+    """
+    Persistent answers to assignment questions, shared by all users
+
+    Answers are keyed by a fingerprint of the normalized question and its
+    variant (whatever else went into the prompt, e.g. marks profile, CO and
+    LO), so the same question uploaded by another student is answered from
+    SQLite instead of the model. Questions that are not identical after
+    normalization, typically OCR variants of the same paper, are matched with
+    MinHash signatures and locality-sensitive hashing: only questions that
+    share a band are compared, and a match needs the same variant, the same
+    numbers and an estimated similarity of at least min_similarity.
+
+    Entries expire ttl seconds after they were stored. When there are more
+    than max_entries or they take more than max_bytes, the least recently
+    used are removed.
+    """
+
+    def __init__(self, path, ttl, max_entries, max_bytes, min_similarity=0.85):
+        """
+        Args:
+            path (str): SQLite database file; '' keeps the store in memory
+            ttl (float): Seconds an answer is reused after it was generated
+            max_entries (int): Maximum number of stored answers
+            max_bytes (int): Maximum size of all stored questions and answers
+            min_similarity (float): Estimated Jaccard similarity needed for a near-duplicate match
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.min_similarity = min_similarity
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        if path:
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(_SCHEMA)
+        # Kept up to date on every change so that size checks do not scan the table
+        self._entries, self._bytes = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        self._last_purge = 0.0
+        self._stats = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def fingerprint(question, variant=""):
+        """
+        Return the key of a question: a hash of its normalized text and variant
+        """
+        return hashlib.sha256(f"{normalize_question(question)}\0{variant}".encode()).hexdigest()
+
+    def get(self, question, variant=""):
+        """
+        Return the stored answer for question, or for a near-duplicate of it
+
+        Returns:
+            str: The answer, or None if there is no fresh one
+        """
+        normalized = normalize_question(question)
+        fingerprint = self.fingerprint(question, variant)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT answer FROM answers WHERE fingerprint = ? AND created_at > ?",
+                (fingerprint, now - self.ttl)).fetchone()
+            if row is not None:
+                self._touch(fingerprint, now)
+                self._stats["hits"] += 1
+                return row[0]
+
+            match = self._find_similar(normalized, variant, now)
+            if match is None:
+                self._stats["misses"] += 1
+                return None
+            self._touch(match[0], now)
+            self._stats["near_hits"] += 1
+            return match[1]
+
+    def put(self, question, answer, variant=""):
+        """
+        Store the answer to question, replacing any previous one
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        fingerprint = self.fingerprint(question, variant)
+        signature = minhash(normalized)
+        size = len(question.encode("utf-8")) + len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            logger.debug(f"Not storing answer of {size} bytes, larger than the store")
+            return
+
+        now = time.time()
+        with self._lock:
+            with self._transaction():
+                self._delete([fingerprint])
+                self._connection.execute(
+                    "INSERT INTO answers (fingerprint, variant, numbers, question, answer, signature, size, "
+                    "created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (fingerprint, variant, _numbers(normalized), question, answer, signature.tobytes(), size,
+                     now, now))
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO answer_bands (band, hash, fingerprint) VALUES (?, ?, ?)",
+                    [(band, band_hash, fingerprint) for band, band_hash in enumerate(_band_hashes(signature))])
+                self._entries += 1
+                self._bytes += size
+                self._evict(now)
+            self._stats["stores"] += 1
+
+    def invalidate(self, question, variant=None):
+        """
+        Remove the stored answers for question and its near-duplicates, e.g. after a wrong answer was reported
+
+        Args:
+            question (str): The question as it was asked
+            variant (str): Only remove answers for this variant; None removes all variants
+
+        Returns:
+            int: Number of answers removed
+        """
+        normalized = normalize_question(question)
+        signature = minhash(normalized)
+        with self._lock:
+            fingerprints = [fingerprint for _, fingerprint, stored_variant, _, _ in self._candidates(normalized, signature)
+                            if variant is None or stored_variant == variant]
+            removed = self._delete(fingerprints)
+            self._stats["invalidations"] += removed
+        return removed
+
+    def invalidate_fingerprint(self, fingerprint):
+        """
+        Remove one stored answer by its fingerprint
+
+        Returns:
+            bool: True if there was an answer
+        """
+        with self._lock:
+            removed = self._delete([fingerprint])
+            self._stats["invalidations"] += removed
+        return bool(removed)
+
+    def stats(self):
+        """
+        Return hit, miss and eviction counters, number of answers and their size
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._entries
+            stats["bytes"] = self._bytes
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        # The counters are changed along with the rows, so a rollback has to undo both
+        counters = self._entries, self._bytes
+        self._connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            self._entries, self._bytes = counters
+            raise
+        self._connection.execute("COMMIT")
+
+    def _touch(self, fingerprint, now):
+        self._connection.execute("UPDATE answers SET accessed_at = ?, hits = hits + 1 WHERE fingerprint = ?",
+                                 (now, fingerprint))
+
+    def _candidates(self, normalized, signature):
+        """
+        Return stored questions similar to the normalized question
+
+        Returns:
+            list: (similarity, fingerprint, variant, answer, created_at) tuples
+        """
+        placeholders = " OR ".join("(band = ? AND hash = ?)" for _ in range(NUM_BANDS))
+        parameters = [value for pair in enumerate(_band_hashes(signature)) for value in pair]
+        rows = self._connection.execute(
+            "SELECT fingerprint, variant, numbers, signature, answer, created_at FROM answers WHERE fingerprint IN "
+            f"(SELECT fingerprint FROM answer_bands WHERE {placeholders})", parameters).fetchall()
+        numbers = _numbers(normalized)
+        candidates = []
+        for fingerprint, variant, stored_numbers, stored_signature, answer, created_at in rows:
+            if stored_numbers != numbers:
+                continue
+            score = similarity(signature, np.frombuffer(stored_signature, dtype=np.uint64))
+            if score >= self.min_similarity:
+                candidates.append((score, fingerprint, variant, answer, created_at))
+        return candidates
+
+    def _find_similar(self, normalized, variant, now):
+        if not normalized:
+            return None
+        matches = [(score, fingerprint, answer)
+                   for score, fingerprint, stored_variant, answer, created_at
+                   in self._candidates(normalized, minhash(normalized))
+                   if stored_variant == variant and created_at > now - self.ttl]
+        if not matches:
+            return None
+        _, fingerprint, answer = max(matches)
+        return fingerprint, answer
+
+    def _delete(self, fingerprints):
+        removed = 0
+        for fingerprint in fingerprints:
+            row = self._connection.execute("DELETE FROM answers WHERE fingerprint = ? RETURNING size",
+                                           (fingerprint,)).fetchone()
+            if row is not None:
+                removed += 1
+                self._entries -= 1
+                self._bytes -= row[0]
+        return removed
+
+    def _evict(self, now):
+        if now - self._last_purge >= _PURGE_INTERVAL:
+            self._last_purge = now
+            expired = [row[0] for row in self._connection.execute(
+                "SELECT fingerprint FROM answers WHERE created_at <= ?", (now - self.ttl,))]
+            self._stats["evictions"] += self._delete(expired)
+
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            # Least recently used first, enough of them to get back under both limits
+            rows = self._connection.execute(
+                "SELECT fingerprint FROM answers ORDER BY accessed_at LIMIT ?",
+                (max(_EVICT_BATCH, self._entries - self.max_entries),)).fetchall()
+            for (fingerprint,) in rows:
+                self._stats["evictions"] += self._delete([fingerprint])
+                if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+                    break
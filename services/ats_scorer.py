@@ -0,0 +1,300 @@
+"""
+ATS (applicant tracking system) scoring of resume text.
+
+Run as a module to score a directory of resumes (.txt, .md and .pdf, searched
+recursively) on all CPUs and write one CSV row per resume to stdout.
+
+Usage:
+    python -m services.ats_scorer RESUME_DIR --role software_engineer --workers 4 > scores.csv
+"""
+import argparse
+import csv
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Keyword sets of the default profile; role profiles override some of them
+GENERAL_KEYWORDS = ['experience', 'skills', 'education', 'projects', 'certification',
+                    'achievement', 'leadership', 'management', 'technical', 'professional']
+SECTION_KEYWORDS = ['work experience', 'education', 'skills', 'projects',
+                    'certifications', 'achievements', 'summary', 'objective']
+FORMAT_KEYWORDS = ['email', 'phone', 'address', 'linkedin']
+
+DEFAULT_ATS_PROFILE = {
+    "keywords": GENERAL_KEYWORDS,
+    "sections": SECTION_KEYWORDS,
+    "format": FORMAT_KEYWORDS,
+}
+
+# Per-role overrides; keywords are matched case-insensitively anywhere in the text
+ATS_PROFILES = {
+    "default": {},
+    "software_engineer": {"keywords": GENERAL_KEYWORDS + [
+        'python', 'java', 'javascript', 'github', 'sql', 'rest api', 'algorithms', 'data structures', 'testing',
+        'docker', 'cloud', 'linux', 'debugging', 'agile']},
+    "data_scientist": {"keywords": GENERAL_KEYWORDS + [
+        'python', 'sql', 'statistics', 'machine learning', 'deep learning', 'pandas', 'numpy',
+        'visualization', 'regression', 'classification', 'tensorflow', 'pytorch', 'experiment']},
+    "product_manager": {"keywords": GENERAL_KEYWORDS + [
+        'roadmap', 'stakeholder', 'user research', 'metrics', 'prioritization', 'strategy', 'launch',
+        'requirements', 'analytics', 'cross-functional']},
+    "designer": {"keywords": GENERAL_KEYWORDS + [
+        'figma', 'prototype', 'wireframe', 'user experience', 'user interface', 'usability', 'design system',
+        'portfolio', 'typography', 'accessibility'],
+        "sections": SECTION_KEYWORDS + ['portfolio']},
+}
+
+# Share of the score from each keyword set, and penalties
+KEYWORD_POINTS = 40
+SECTION_POINTS = 40
+FORMAT_POINTS = 20
+MISSING_SECTIONS_PENALTY = 10
+FEW_LINES_PENALTY = 5
+MIN_LINE_BREAKS = 10
+
+# Resume files the batch CLI reads
+RESUME_EXTENSIONS = ('.txt', '.md', '.pdf')
+
+
+def _trie_pattern(node):
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # Greedy, so the longest keyword starting at a position wins
+    return f"(?:{body})?" if "" in node else body
+
+
+class KeywordMatcher:
+    """
+    Finds which of a set of keywords occur in a text
+
+    Small sets are checked with one substring search per keyword, which is
+    the fastest in CPython. Sets of at least REGEX_MIN_KEYWORDS are compiled
+    into a single regular expression shaped like their trie and tried at
+    every position of the text, so the text is scanned once however many
+    keywords there are. At each position only the longest keyword is
+    reported; the keywords that are prefixes of it (e.g. "certification" in
+    "certifications") are implied, so overlapping keywords are all found, as
+    with separate substring checks.
+    """
+
+    REGEX_MIN_KEYWORDS = 64
+
+    def __init__(self, keywords):
+        """
+        Args:
+            keywords (Iterable[str]): Keywords, matched case-insensitively
+        """
+        self.keywords = sorted({keyword.lower() for keyword in keywords if keyword})
+        self._pattern = None
+        if len(self.keywords) < self.REGEX_MIN_KEYWORDS:
+            return
+        trie = {}
+        for keyword in self.keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        self._pattern = re.compile(f"(?=({_trie_pattern(trie)}))", re.DOTALL)
+        self._implied = {keyword: [other for other in self.keywords if keyword.startswith(other)]
+                         for keyword in self.keywords}
+
+    def find(self, text):
+        """
+        Return the keywords that occur in text
+
+        Args:
+            text (str): Already lowercased text
+
+        Returns:
+            set: Matched keywords
+        """
+        if self._pattern is None:
+            return {keyword for keyword in self.keywords if keyword in text}
+        found = set()
+        for match in self._pattern.finditer(text):
+            found.update(self._implied[match.group(1)])
+            if len(found) == len(self.keywords):
+                break
+        return found
+
+
+class ATSScorer:
+    """
+    Scores resume text against one role's keyword sets
+
+    The score is the share of general keywords (KEYWORD_POINTS), section
+    headings (SECTION_POINTS) and contact details (FORMAT_POINTS) found,
+    minus penalties for missing sections and too few line breaks.
+    """
+
+    def __init__(self, profile):
+        """
+        Args:
+            profile (dict): keywords, sections and format lists, see DEFAULT_ATS_PROFILE
+        """
+        self.keywords = [keyword.lower() for keyword in profile["keywords"]]
+        self.sections = [keyword.lower() for keyword in profile["sections"]]
+        self.format = [keyword.lower() for keyword in profile["format"]]
+        self._matcher = KeywordMatcher(self.keywords + self.sections + self.format)
+
+    def score(self, text):
+        """
+        Score resume text
+
+        Returns:
+            dict: score (0-100), keyword_score, section_score, format_score,
+            penalties and the missing keywords of each set
+        """
+        found = self._matcher.find(text.lower())
+        keyword_score = _points(self.keywords, found, KEYWORD_POINTS)
+        section_score = _points(self.sections, found, SECTION_POINTS)
+        format_score = _points(self.format, found, FORMAT_POINTS)
+
+        penalties = 0
+        # Compared on points, not on the number of sections found, as the scores users have seen so far were
+        if section_score < len(self.sections) * 0.6:
+            penalties += MISSING_SECTIONS_PENALTY
+        if text.count('\n') < MIN_LINE_BREAKS:
+            penalties += FEW_LINES_PENALTY
+
+        return {
+            "score": max(0, min(keyword_score + section_score + format_score - penalties, 100)),
+            "keyword_score": keyword_score,
+            "section_score": section_score,
+            "format_score": format_score,
+            "penalties": penalties,
+            "missing_keywords": [keyword for keyword in self.keywords if keyword not in found],
+            "missing_sections": [keyword for keyword in self.sections if keyword not in found],
+            "missing_format": [keyword for keyword in self.format if keyword not in found],
+        }
+
+
+def _points(keywords, found, weight):
+    if not keywords:
+        return 0
+    return min(int(sum(1 for keyword in keywords if keyword in found) / len(keywords) * weight), weight)
+
+
+_scorers = {}
+
+
+def get_scorer(role="default"):
+    """
+    Return the (cached) scorer for a role in ATS_PROFILES
+    """
+    scorer = _scorers.get(role)
+    if scorer is None:
+        if role not in ATS_PROFILES:
+            raise ValueError(f"Unknown ATS role: {role}")
+        profile = dict(DEFAULT_ATS_PROFILE)
+        profile.update(ATS_PROFILES[role])
+        scorer = _scorers[role] = ATSScorer(profile)
+    return scorer
+
+
+def match_role(text):
+    """
+    Return the role named in free text such as "Data Scientist", or "default"
+    """
+    if text:
+        name = "_".join(re.findall(r"[a-z]+", text.lower()))
+        for role in ATS_PROFILES:
+            if role in name:
+                return role
+    return "default"
+
+
+def score_resume(text, role="default"):
+    """
+    Score one resume's text for a role
+
+    Returns:
+        dict: See ATSScorer.score
+    """
+    return get_scorer(role).score(text)
+
+
+def read_resume(path):
+    """
+    Return the text of a resume file (.txt, .md or .pdf)
+    """
+    if path.lower().endswith('.pdf'):
+        # Imported here so that scoring text does not need the bot configuration
+        from services.pdf_extractor import extract_pdf
+        with open(path, 'rb') as file:
+            return extract_pdf(file.read()).text
+    with open(path, encoding='utf-8', errors='replace') as file:
+        return file.read()
+
+
+def _score_file(path, role):
+    try:
+        return path, score_resume(read_resume(path), role), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def score_files(paths, role="default", workers=None, chunksize=64):
+    """
+    Score many resume files across processes
+
+    Args:
+        paths (Iterable[str]): Resume files
+        role (str): Role in ATS_PROFILES
+        workers (int): Processes; defaults to the number of CPUs
+        chunksize (int): Files sent to a process at a time
+
+    Yields:
+        tuple: (path, result dict or None, error message or None), in input order
+    """
+    get_scorer(role)  # fail fast on an unknown role
+    paths = list(paths)
+    if workers == 1 or len(paths) < chunksize:
+        for path in paths:
+            yield _score_file(path, role)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_score_file, paths, [role] * len(paths), chunksize=chunksize)
+
+
+def iter_resume_paths(directory):
+    """
+    Yield the resume files under directory, recursively, in sorted order
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(RESUME_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--role", default="default", choices=sorted(ATS_PROFILES))
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["path", "score", "keyword_score", "section_score", "format_score", "penalties",
+                     "missing_sections", "error"])
+    failed = 0
+    for path, result, error in score_files(iter_resume_paths(args.directory), args.role, args.workers):
+        if result is None:
+            failed += 1
+            writer.writerow([path, "", "", "", "", "", "", error])
+            continue
+        writer.writerow([path, result["score"], result["keyword_score"], result["section_score"],
+                         result["format_score"], result["penalties"], ";".join(result["missing_sections"]), ""])
+    if failed:
+        logger.warning(f"{failed} resumes could not be scored")
+
+
+if __name__ == "__main__":
+    main()
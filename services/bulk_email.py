@@ -0,0 +1,169 @@
+import csv
+import io
+import itertools
+import logging
+import re
+import zipfile
+from tempfile import SpooledTemporaryFile
+
+from config import BULK_EMAIL_MAX_ROWS, BULK_EMAIL_SPOOL_BYTES
+from services.document_generator import generate_cold_email
+
+logger = logging.getLogger(__name__)
+
+# CSV columns, after normalize_column; every row needs the required ones filled in
+REQUIRED_COLUMNS = ('name', 'year', 'college', 'branch', 'skills', 'company', 'recipient_name', 'position')
+OPTIONAL_COLUMNS = ('projects', 'resume_link', 'github_link', 'custom_note', 'recipient_email')
+COLUMN_ALIASES = {
+    'recipient': 'recipient_name',
+    'role': 'position',
+    'resume': 'resume_link',
+    'github': 'github_link',
+    'email': 'recipient_email',
+}
+# Columns passed on to generate_cold_email
+EMAIL_FIELDS = REQUIRED_COLUMNS + ('projects', 'resume_link', 'github_link', 'custom_note')
+
+BUNDLE_FORMATS = ('zip', 'csv')
+CSV_BUNDLE_COLUMNS = ['line', 'company', 'recipient_name', 'recipient_email', 'position', 'email', 'error']
+ZIP_BUNDLE_MEMBER = 'cold_emails.csv'
+
+# Skipped rows listed in the summary; the rest are only counted, so memory stays constant
+MAX_REPORTED_ERRORS = 20
+
+
+def normalize_column(name):
+    """
+    Map a CSV header such as "Recipient Name" to its column, e.g. "recipient_name"
+    """
+    column = re.sub(r"[^a-z0-9]+", "_", name.strip().lower()).strip("_")
+    return COLUMN_ALIASES.get(column, column)
+
+
+def iter_rows(csv_file):
+    """
+    Yield the rows of an uploaded CSV of recipients, one at a time
+
+    Args:
+        csv_file (BinaryIO): UTF-8 CSV file with a header row
+
+    Yields:
+        tuple: (line number, dict of column to stripped value); blank rows are skipped
+
+    Raises:
+        ValueError: If the file is empty or a required column is missing
+    """
+    text = io.TextIOWrapper(csv_file, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if not header:
+            raise ValueError("The CSV file is empty.")
+        columns = [normalize_column(name) for name in header]
+        missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+        if missing:
+            raise ValueError(f"The CSV file is missing these columns: {', '.join(missing)}")
+
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            yield reader.line_num, {column: value.strip() for column, value in zip(columns, row)}
+    finally:
+        # The upload belongs to the caller
+        text.detach()
+
+
+def iter_cold_emails(rows):
+    """
+    Generate a cold email per row, see generate_cold_email
+
+    Args:
+        rows (Iterable[tuple]): (line number, fields) pairs, see iter_rows
+
+    Yields:
+        tuple: (line number, fields, email text or None, error or None)
+    """
+    for line, fields in rows:
+        missing = [column for column in REQUIRED_COLUMNS if not fields.get(column)]
+        if missing:
+            yield line, fields, None, f"missing {', '.join(missing)}"
+            continue
+        yield line, fields, generate_cold_email(**{field: fields.get(field, "") for field in EMAIL_FIELDS}), None
+
+
+def _limited(rows, max_rows, summary):
+    # Exactly max_rows rows are passed on; one more is read, but not validated or
+    # turned into an email, only to tell whether the CSV was truncated
+    yield from itertools.islice(rows, max_rows)
+    summary["truncated"] = next(rows, None) is not None
+    rows.close()
+
+
+def _counted(emails, summary):
+    for item in emails:
+        line, _, email, error = item
+        if email is None:
+            summary["skipped"] += 1
+            if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                summary["errors"].append(f"Line {line}: {error}")
+        else:
+            summary["generated"] += 1
+        yield item
+
+
+def _write_csv(binary, emails):
+    text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(CSV_BUNDLE_COLUMNS)
+    for line, fields, email, error in emails:
+        writer.writerow([line, fields.get('company', ''), fields.get('recipient_name', ''),
+                         fields.get('recipient_email', ''), fields.get('position', ''), email or '', error or ''])
+    # Leave binary open for the caller
+    text.detach()
+
+
+def build_cold_email_bundle(csv_file, bundle_format='zip', max_rows=BULK_EMAIL_MAX_ROWS,
+                            spool_bytes=BULK_EMAIL_SPOOL_BYTES):
+    """
+    Generate a cold email for every row of a CSV of recipients into one file
+
+    Rows are read, turned into emails and written one at a time into a file
+    that stays in memory up to spool_bytes and then moves to disk, so memory
+    does not grow with the number of rows. Both formats hold the same CSV,
+    one row per email (skipped rows carry an error instead); the zip holds
+    it compressed as a single member, since an archive of one file per
+    email has to keep every entry in memory for its directory.
+
+    Args:
+        csv_file (BinaryIO): UTF-8 CSV with the REQUIRED_COLUMNS (and any OPTIONAL_COLUMNS)
+        bundle_format (str): "zip" or "csv"
+        max_rows (int): Rows generated at most; the rest are left out
+        spool_bytes (int): Bundle size kept in memory
+
+    Returns:
+        tuple: (bundle file positioned at its start, summary dict with generated,
+        skipped, truncated and errors (the first MAX_REPORTED_ERRORS skipped rows))
+
+    Raises:
+        ValueError: If the format is unknown, or the CSV is empty or lacks a required column
+    """
+    if bundle_format not in BUNDLE_FORMATS:
+        raise ValueError(f"Unknown bundle format: {bundle_format}")
+
+    summary = {"generated": 0, "skipped": 0, "truncated": False, "errors": []}
+    emails = _counted(iter_cold_emails(_limited(iter_rows(csv_file), max_rows, summary)), summary)
+    bundle = SpooledTemporaryFile(max_size=spool_bytes)
+    try:
+        if bundle_format == 'zip':
+            with zipfile.ZipFile(bundle, 'w', zipfile.ZIP_DEFLATED) as archive:
+                with archive.open(ZIP_BUNDLE_MEMBER, 'w') as member:
+                    _write_csv(member, emails)
+        else:
+            _write_csv(bundle, emails)
+    except Exception:
+        bundle.close()
+        raise
+    bundle.seek(0)
+    logger.info(f"Built {bundle_format} bundle of {summary['generated']} cold emails, {summary['skipped']} rows "
+                f"skipped{', truncated' if summary['truncated'] else ''}")
+    return bundle, summary
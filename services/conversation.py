@@ -0,0 +1,384 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from config import CONVERSATION_STORE_PATH, CONVERSATION_TTL
+
+logger = logging.getLogger(__name__)
+
+# How often expired conversations are deleted, in seconds
+_PURGE_INTERVAL = 600
+
+# Every message type Telegram sends; states that name no content types accept all of them
+ALL_CONTENT_TYPES = ['text', 'audio', 'document', 'photo', 'sticker', 'video', 'video_note', 'voice', 'location',
+                     'contact', 'animation', 'venue', 'dice', 'poll']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    chat_id INTEGER PRIMARY KEY,
+    flow TEXT NOT NULL,
+    state TEXT NOT NULL,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_expires_at ON conversations (expires_at);
+"""
+
+ConversationState = namedtuple("ConversationState", "flow state data expires_at")
+
+
+class MemoryConversationStore:
+    """
+    Conversation states of one process in a dict, for tests and local runs
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, chat_id, now):
+        """
+        Return the ConversationState of a chat, or None if it has none or it expired
+        """
+        current = self._states.get(chat_id)
+        if current is None or current.expires_at > now:
+            return current
+        with self._lock:
+            if self._states.get(chat_id) is current:
+                del self._states[chat_id]
+        return None
+
+    def set(self, chat_id, current):
+        with self._lock:
+            self._states[chat_id] = current
+
+    def delete(self, chat_id):
+        """
+        Remove the state of a chat
+
+        Returns:
+            bool: Whether it had one
+        """
+        with self._lock:
+            return self._states.pop(chat_id, None) is not None
+
+    def purge(self, now):
+        """
+        Remove expired states
+
+        Returns:
+            int: Number removed
+        """
+        with self._lock:
+            expired = [chat_id for chat_id, current in self._states.items() if current.expires_at <= now]
+            for chat_id in expired:
+                del self._states[chat_id]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._states)
+
+    def close(self):
+        pass
+
+
+class SQLiteConversationStore:
+    """
+    Conversation states in SQLite, shared by every bot process on the host and kept across restarts
+
+    Each chat has one row keyed by its id, so a lookup is a single primary
+    key read. Data must be JSON-serializable.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def get(self, chat_id, now):
+        """
+        Return the ConversationState of a chat, or None if it has none or it expired
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT flow, state, data, expires_at FROM conversations WHERE chat_id = ? AND expires_at > ?",
+                (chat_id, now)).fetchone()
+        if row is None:
+            return None
+        return ConversationState(row[0], row[1], json.loads(row[2]), row[3])
+
+    def set(self, chat_id, current):
+        data = json.dumps(current.data)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO conversations (chat_id, flow, state, data, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (chat_id, current.flow, current.state, data, current.expires_at))
+
+    def delete(self, chat_id):
+        """
+        Remove the state of a chat
+
+        Returns:
+            bool: Whether it had one
+        """
+        with self._lock:
+            return self._connection.execute("DELETE FROM conversations WHERE chat_id = ?", (chat_id,)).rowcount > 0
+
+    def purge(self, now):
+        """
+        Remove expired states
+
+        Returns:
+            int: Number removed
+        """
+        with self._lock:
+            return self._connection.execute("DELETE FROM conversations WHERE expires_at <= ?", (now,)).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class _StateHandler:
+    def __init__(self, handler, content_types, func):
+        self.handler = handler
+        self.content_types = frozenset(content_types) if content_types else None
+        self.func = func
+
+    def accepts(self, message):
+        if self.content_types is not None and message.content_type not in self.content_types:
+            return False
+        return self.func is None or bool(self.func(message))
+
+
+class Flow:
+    """
+    A conversation declared as named states and the handlers for the messages received in them
+
+    A handler is called as handler(message, data), where data is the
+    conversation's dict; it may change data, and returns the name of the
+    next state, or None to end the conversation. A state can have several
+    handlers, tried in order; a message none of them accepts is left to the
+    bot's other handlers and the conversation stays where it is.
+
+    Example:
+        interview = Flow("mock_interview")
+
+        @interview.on("position")
+        def ask_questions(message, data):
+            data["position"] = message.text
+            return "answers"
+    """
+
+    def __init__(self, name, ttl=None):
+        """
+        Args:
+            name (str): Unique name, stored with each conversation
+            ttl (float): Seconds of inactivity before a conversation is abandoned;
+                defaults to the manager's
+        """
+        self.name = name
+        self.ttl = ttl
+        self.states = {}
+
+    def on(self, state, content_types=None, func=None):
+        """
+        Decorator declaring a handler for messages received in state
+
+        Args:
+            state (str): State name
+            content_types (list): Message types handled, e.g. ['document', 'photo']; None for all
+            func (Callable[[Message], bool]): Further filter on the message
+        """
+        def decorator(handler):
+            self.states.setdefault(state, []).append(_StateHandler(handler, content_types, func))
+            return handler
+        return decorator
+
+    def handler_for(self, state, message):
+        """
+        Return the first handler of state that accepts message, or None
+        """
+        for state_handler in self.states.get(state, ()):
+            if state_handler.accepts(message):
+                return state_handler.handler
+        return None
+
+
+class ConversationManager:
+    """
+    Tracks which state of which Flow each chat is in and routes its messages there
+
+    Replaces per-process next-step handlers: the state lives in a store
+    (MemoryConversationStore or SQLiteConversationStore), so it survives
+    restarts and is seen by every bot process, and each incoming message
+    costs one lookup by chat id. Conversations that see no message for
+    their ttl expire. Commands are never routed to a conversation, so
+    /start or /cancel always reach their own handlers.
+    """
+
+    def __init__(self, store, ttl):
+        """
+        Args:
+            store: MemoryConversationStore or SQLiteConversationStore
+            ttl (float): Default seconds of inactivity before a conversation is abandoned
+        """
+        self.store = store
+        self.ttl = ttl
+        self._flows = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._stats = {"started": 0, "messages": 0, "finished": 0, "ended": 0, "expired": 0, "errors": 0}
+
+    def register(self, flow):
+        """
+        Make a Flow's handlers available; every process has to register the same flows
+        """
+        self._flows[flow.name] = flow
+        return flow
+
+    def start(self, chat_id, flow, state, data=None):
+        """
+        Put a chat in a state of a flow, replacing any conversation it was in
+
+        Args:
+            chat_id (int): Chat
+            flow (str): Registered flow name
+            state (str): State the chat's next message is handled in
+            data (dict): Initial conversation data
+        """
+        now = time.time()
+        self.store.set(chat_id, ConversationState(flow, state, data or {}, now + self._ttl(flow)))
+        self._count("started")
+        self._purge(now)
+
+    def get(self, chat_id):
+        """
+        Return the chat's ConversationState (flow, state, data, expires_at), or None
+        """
+        return self.store.get(chat_id, time.time())
+
+    def in_flow(self, chat_id, flow):
+        """
+        Return whether a chat is in a conversation of the given flow
+        """
+        current = self.get(chat_id)
+        return current is not None and current.flow == flow
+
+    def end(self, chat_id):
+        """
+        End the chat's conversation, if any
+
+        Returns:
+            bool: Whether there was one
+        """
+        ended = self.store.delete(chat_id)
+        if ended:
+            self._count("ended")
+        return ended
+
+    def matches(self, message):
+        """
+        Return whether message continues a conversation; used as the dispatcher's message filter
+        """
+        match = self._match(message)
+        # Saves dispatch a second lookup
+        message._conversation = match
+        return match is not None
+
+    def dispatch(self, message):
+        """
+        Hand a message to its conversation's handler and move the conversation to the returned state
+
+        Returns:
+            bool: Whether the message belonged to a conversation
+        """
+        match = getattr(message, "_conversation", None) or self._match(message)
+        if match is None:
+            return False
+        current, handler = match
+        chat_id = message.chat.id
+        data = dict(current.data)
+        self._count("messages")
+        try:
+            next_state = handler(message, data)
+        except Exception as e:
+            logger.error(f"Error in {current.flow}/{current.state} conversation handler: {str(e)}", exc_info=True)
+            self._count("errors")
+            next_state = None
+
+        now = time.time()
+        # The handler may have started another conversation, or the chat cancelled this one meanwhile
+        if self.store.get(chat_id, now) != current:
+            return True
+        if next_state is None:
+            self.store.delete(chat_id)
+            self._count("finished")
+        else:
+            self.store.set(chat_id, ConversationState(current.flow, next_state, data, now + self._ttl(current.flow)))
+        return True
+
+    def stats(self):
+        """
+        Return counters of started, continued, finished, ended and expired conversations, and how many are open
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["open"] = len(self.store)
+        return stats
+
+    def close(self):
+        self.store.close()
+
+    def _match(self, message):
+        if message.content_type == 'text' and (message.text or '').startswith('/'):
+            return None
+        current = self.store.get(message.chat.id, time.time())
+        if current is None:
+            return None
+        flow = self._flows.get(current.flow)
+        if flow is None or current.state not in flow.states:
+            # Left over from a flow that has since been changed
+            logger.warning(f"Dropping conversation in unknown state {current.flow}/{current.state}")
+            self.store.delete(message.chat.id)
+            return None
+        handler = flow.handler_for(current.state, message)
+        return None if handler is None else (current, handler)
+
+    def _ttl(self, flow):
+        flow = self._flows.get(flow)
+        return flow.ttl if flow is not None and flow.ttl is not None else self.ttl
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _purge(self, now):
+        if now - self._last_purge < _PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        expired = self.store.purge(now)
+        if expired:
+            self._count("expired", expired)
+            logger.debug(f"Removed {expired} abandoned conversations")
+
+
+# Shared by all handlers; set CONVERSATION_STORE_PATH to '' to keep conversations in this process only
+conversations = ConversationManager(
+    SQLiteConversationStore(CONVERSATION_STORE_PATH) if CONVERSATION_STORE_PATH else MemoryConversationStore(),
+    CONVERSATION_TTL
+)
@@ -1,54 +1,83 @@
 import logging
+from io import BytesIO
+from random import choice
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.units import inch
 from reportlab.lib import colors
-from config import UPLOAD_FOLDER
-import os
 
 logger = logging.getLogger(__name__)
 
+
+def _build_styles():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Question', fontSize=16, fontName='Helvetica-Bold', textColor=colors.black, spaceAfter=6))
+    styles.add(ParagraphStyle(name='QuestionInfo', fontSize=10, spaceAfter=6, fontName='Helvetica-Oblique'))
+    styles.add(ParagraphStyle(name='Answer', fontSize=11, leftIndent=20, spaceAfter=12))
+    styles.add(ParagraphStyle(name='Separator', fontSize=11))
+    return styles
+
+
+# Styles are only read while rendering, so one stylesheet serves every document
+STYLES = _build_styles()
+
+
+def render_document(content, on_page=None):
+    """
+    Render an assignment solution as a PDF in memory
+
+    Args:
+        content (str): Solution text as produced by format_assignment_solution
+        on_page (Callable): Called by ReportLab with (canvas, doc) as each page
+            is drawn; may raise to abort rendering
+
+    Returns:
+        bytes: The PDF file
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+
+    story = []
+
+    for paragraph in content.split('\n'):
+        if paragraph.startswith("Question"):
+            # This will make the question dark black, bold, and a larger font size
+            story.append(Paragraph(paragraph, STYLES['Question']))
+        elif paragraph.startswith("Marks:"):
+            story.append(Paragraph(paragraph, STYLES['QuestionInfo']))
+        elif paragraph.startswith("Answer:"):
+            story.append(Paragraph(paragraph, STYLES['Answer']))
+        elif paragraph.startswith("-"):
+            story.append(Paragraph(paragraph, STYLES['Separator']))
+            story.append(Spacer(1, 0.2 * inch))
+        else:
+            story.append(Paragraph(paragraph, STYLES['Normal']))
+
+    logger.debug(f"Number of elements in story: {len(story)}")
+
+    if on_page:
+        doc.build(story, onFirstPage=on_page, onLaterPages=on_page)
+    else:
+        doc.build(story)
+    pdf_bytes = buffer.getvalue()
+    logger.debug(f"Document built successfully. {doc.page} pages, {len(pdf_bytes)} bytes")
+    return pdf_bytes
+
+
 def generate_document(content):
-    output_path = os.path.join(UPLOAD_FOLDER, "solved_assignment.pdf")
-    logger.debug(f"Generating document at: {output_path}")
-    
+    """
+    Render an assignment solution as a PDF in memory, see render_document
+
+    Returns:
+        bytes: The PDF file, or None if content is empty or rendering failed
+    """
     if not content:
         logger.error("Content is empty. Cannot generate document.")
         return None
 
     try:
-        doc = SimpleDocTemplate(output_path, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-
-        # Stylesheet and custom styles
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='Question', fontSize=16, fontName='Helvetica-Bold', textColor=colors.black, spaceAfter=6))
-        styles.add(ParagraphStyle(name='QuestionInfo', fontSize=10, spaceAfter=6, fontName='Helvetica-Oblique'))
-        styles.add(ParagraphStyle(name='Answer', fontSize=11, leftIndent=20, spaceAfter=12))
-        styles.add(ParagraphStyle(name='Separator', fontSize=11))
-
-        story = []
-
-        for paragraph in content.split('\n'):
-            if paragraph.startswith("Question"):
-                # This will make the question dark black, bold, and a larger font size
-                story.append(Paragraph(paragraph, styles['Question']))
-            elif paragraph.startswith("Marks:"):
-                story.append(Paragraph(paragraph, styles['QuestionInfo']))
-            elif paragraph.startswith("Answer:"):
-                story.append(Paragraph(paragraph, styles['Answer']))
-            elif paragraph.startswith("-"):
-                story.append(Paragraph(paragraph, styles['Separator']))
-                story.append(Spacer(1, 0.2 * inch))
-            else:
-                story.append(Paragraph(paragraph, styles['Normal']))
-
-        logger.debug(f"Number of elements in story: {len(story)}")
-
-        doc.build(story)
-        logger.debug(f"Document built successfully. File size: {os.path.getsize(output_path)} bytes")
-
-        return output_path
+        return render_document(content)
     except Exception as e:
         logger.error(f"Error generating document: {str(e)}", exc_info=True)
         return None
@@ -99,3 +128,67 @@ Best regards,
     except Exception as e:
         logger.error(f"Error generating cover letter: {str(e)}", exc_info=True)
         return "Error generating cover letter. Please try again."
+
+
+def generate_cold_email(name, year, college, branch, skills, company, recipient_name, position, projects, resume_link,
+                        github_link, custom_note=""):
+    """
+    Generate a personalized cold email with randomized sections for variety.
+    """
+    # Randomized components
+    opening_lines = [
+        f"I hope you are doing well. My name is {name}, a {year} student at {college}, specializing in {branch}.",
+        f"I’m {name}, currently in my {year} at {college}, pursuing {branch}.",
+        f"My name is {name}, and I’m a {year} student at {college}, majoring in {branch}."
+    ]
+
+    skills_lines = [
+        f"I have experience in {skills} and have worked on several projects to apply these skills in real-world scenarios.",
+        f"My expertise includes {skills}, which I have honed through academic projects and freelance work.",
+        f"I bring strong skills in {skills}, gained through coursework, hackathons, and personal projects."
+    ]
+
+    position_lines = [
+        f"I recently came across the {position} role at {company}, and I’m eager to apply.",
+        f"The {position} opportunity at {company} caught my attention, and I believe I’m a great fit for the role.",
+        f"I’m excited about the {position} role at {company} and would love the opportunity to contribute to your team."
+    ]
+
+    projects_lines = [
+        "Here are a couple of my recent projects:",
+        "I’ve highlighted a few of my projects below:",
+        "Here are some examples of my work:"
+    ]
+
+    closing_lines = [
+        "I’d be delighted to contribute to your team. Please let me know if there’s anything else you’d like me to share.",
+        "I look forward to discussing how I can contribute to your team’s success.",
+        "Please feel free to reach out if you’d like more details about my background or projects."
+    ]
+
+    # Assemble the email
+    email_parts = [
+        f"Hi {recipient_name},\n\n",
+        f"{choice(opening_lines)}\n\n",
+        f"{choice(skills_lines)}\n\n",
+        f"{choice(position_lines)}\n\n"
+    ]
+
+    # Add projects section
+    if projects:
+        email_parts.append(f"{choice(projects_lines)}\n\n")
+        for project in projects.split(','):
+            email_parts.append(f"- {project.strip()} : Demo Link\n")
+        email_parts.append("\n")
+
+    # Add resume and GitHub links
+    if resume_link:
+        email_parts.append(f"Here’s my resume: {resume_link}\n\n")
+    if github_link:
+        email_parts.append(f"GitHub Profile: {github_link}\n\n")
+
+    # Add closing
+    email_parts.append(f"{choice(closing_lines)}\n\n")
+    email_parts.append(f"Best regards,\n{name}\n")
+
+    return "".join(email_parts)
@@ -0,0 +1,173 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def chunk_text(text, chunk_words=200, overlap=40):
+    """
+    Split text into overlapping chunks of roughly chunk_words words
+
+    Args:
+        text (str): Text to split
+        chunk_words (int): Words per chunk
+        overlap (int): Words shared by consecutive chunks
+
+    Returns:
+        list: Chunk strings in document order
+    """
+    words = text.split()
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+class DocumentIndexBuilder:
+    """
+    Build a DocumentIndex from text that arrives in pieces, e.g. page by page
+
+    Chunks are cut and tokenized as soon as enough words have arrived, so
+    indexing overlaps with extraction and the full text is never held in
+    memory. The chunks are the same as chunk_text() on the joined text.
+    """
+
+    def __init__(self, chunk_words=200, overlap=40):
+        """
+        Args:
+            chunk_words (int): Words per chunk
+            overlap (int): Words shared by consecutive chunks
+        """
+        self.chunk_words = chunk_words
+        self.step = max(1, chunk_words - overlap)
+        self.chunks = []
+        self._counts = []
+        self._pending = []
+
+    def add_text(self, text):
+        """
+        Append text and index every chunk that is now complete
+        """
+        self._pending.extend(text.split())
+        # A chunk is only final once at least one word after it has arrived
+        while len(self._pending) > self.chunk_words:
+            self._add_chunk(self._pending[:self.chunk_words])
+            del self._pending[:self.step]
+
+    def build(self, k1=1.5, b=0.75):
+        """
+        Index the remaining words and return the finished DocumentIndex
+        """
+        if self._pending:
+            self._add_chunk(self._pending)
+            self._pending = []
+        return DocumentIndex(self.chunks, k1, b, counts=self._counts)
+
+    def _add_chunk(self, words):
+        chunk = " ".join(words)
+        self.chunks.append(chunk)
+        self._counts.append(Counter(tokenize(chunk)))
+
+
+class DocumentIndex:
+    """
+    In-memory BM25 index over the chunks of one document
+
+    Postings are kept per term as NumPy arrays of chunk ids and term
+    frequencies, so a query only touches the chunks that contain its terms.
+    """
+
+    def __init__(self, chunks, k1=1.5, b=0.75, counts=None):
+        """
+        Args:
+            chunks (list): Chunk strings in document order
+            k1 (float): BM25 term frequency saturation
+            b (float): BM25 length normalization
+            counts (list): Term counts per chunk if they are already known
+        """
+        self.chunks = list(chunks)
+        self.k1 = k1
+        self.b = b
+        if counts is None:
+            counts = [Counter(tokenize(chunk)) for chunk in self.chunks]
+
+        postings = {}
+        lengths = np.zeros(len(self.chunks), dtype=np.float32)
+        for chunk_id, chunk_counts in enumerate(counts):
+            lengths[chunk_id] = sum(chunk_counts.values())
+            for term, tf in chunk_counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(chunk_id)
+                postings[term][1].append(tf)
+
+        self._postings = {
+            term: (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.float32))
+            for term, (ids, tfs) in postings.items()
+        }
+        self._lengths = lengths
+        self._avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    @classmethod
+    def from_text(cls, text, chunk_words=200, overlap=40):
+        return cls(chunk_text(text, chunk_words, overlap))
+
+    @classmethod
+    def from_pages(cls, pages, chunk_words=200, overlap=40):
+        """
+        Index an iterable of page texts while it is being produced
+        """
+        builder = DocumentIndexBuilder(chunk_words, overlap)
+        for page in pages:
+            builder.add_text(page)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query, k=5):
+        """
+        Return the k best matching chunks for query
+
+        Args:
+            query (str): Free-text question
+            k (int): Number of chunks to return
+
+        Returns:
+            list: (chunk_id, score) pairs, best first; only chunks with a positive score
+        """
+        if not self.chunks:
+            return []
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self._lengths / (self._avg_length or 1.0))
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            idf = np.log(1 + (len(self.chunks) - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm[ids])
+
+        k = min(k, len(self.chunks))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best if scores[i] > 0]
+
+    def context_for(self, query, k=5):
+        """
+        Return the text of the chunks most relevant to query, in document order
+
+        Falls back to the start of the document when nothing matches.
+        """
+        ids = sorted(chunk_id for chunk_id, _ in self.search(query, k))
+        if not ids:
+            ids = range(min(k, len(self.chunks)))
+        return "\n...\n".join(self.chunks[i] for i in ids)
@@ -0,0 +1,195 @@
+import logging
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# How often spilled sessions are checked for expiry, in seconds
+_DISK_SWEEP_INTERVAL = 600
+
+
+class DocumentSessionStore:
+    """
+    Bounded store for per-chat document sessions
+
+    Sessions are pickled and zlib-compressed in memory. When resident sessions
+    take more than max_bytes, or a session has been idle for idle_ttl seconds,
+    it is spilled to spill_dir (or dropped if there is none) and loaded again
+    the next time the user asks about it. Spilled sessions are deleted after
+    disk_ttl seconds without use. Which chats have a spilled session is kept
+    in memory, so checking for a session never touches the disk.
+    """
+
+    def __init__(self, max_bytes, idle_ttl, spill_dir=None, disk_ttl=7 * 24 * 3600):
+        """
+        Args:
+            max_bytes (int): Maximum compressed size of all resident sessions
+            idle_ttl (float): Seconds a session stays in memory without being used
+            spill_dir (str): Directory for cold sessions; None drops them instead
+            disk_ttl (float): Seconds a spilled session is kept without being used
+        """
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.spill_dir = spill_dir
+        self.disk_ttl = disk_ttl
+
+        self._resident = OrderedDict()  # chat_id -> (blob, last_access), least recent first
+        self._resident_bytes = 0
+        self._spilled_at = {}  # chat_id -> time its session was spilled
+        self._lock = threading.RLock()
+        self._last_disk_sweep = 0.0
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "spills": 0, "expirations": 0}
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._index_spilled()
+
+    def _spill_path(self, chat_id):
+        return os.path.join(self.spill_dir, f"{chat_id}.pkl.z")
+
+    def _index_spilled(self):
+        # Sessions spilled before a restart
+        for entry in os.scandir(self.spill_dir):
+            if not entry.name.endswith(".pkl.z"):
+                continue
+            try:
+                self._spilled_at[int(entry.name[:-len(".pkl.z")])] = entry.stat().st_mtime
+            except (ValueError, OSError):
+                pass
+
+    def _spilled(self, chat_id):
+        spilled_at = self._spilled_at.get(chat_id)
+        return spilled_at is not None and time.time() - spilled_at < self.disk_ttl
+
+    def __contains__(self, chat_id):
+        with self._lock:
+            return chat_id in self._resident or self._spilled(chat_id)
+
+    def put(self, chat_id, session):
+        """
+        Store session for chat_id, replacing any previous one
+        """
+        blob = zlib.compress(pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._discard(chat_id)
+            self._resident[chat_id] = (blob, time.monotonic())
+            self._resident_bytes += len(blob)
+            self._evict()
+
+    def get(self, chat_id):
+        """
+        Return the session for chat_id, loading it from disk if it was spilled
+
+        Returns:
+            Any: The stored session, or None if there is none
+        """
+        with self._lock:
+            entry = self._resident.pop(chat_id, None)
+            if entry is not None:
+                self._stats["hits"] += 1
+                blob = entry[0]
+            else:
+                blob = self._load_spilled(chat_id)
+                if blob is None:
+                    self._stats["misses"] += 1
+                    return None
+                self._stats["disk_hits"] += 1
+                self._resident_bytes += len(blob)
+            self._resident[chat_id] = (blob, time.monotonic())
+            self._evict()
+        return pickle.loads(zlib.decompress(blob))
+
+    def pop(self, chat_id):
+        """
+        Remove the session for chat_id from memory and disk
+
+        Returns:
+            bool: True if there was a session
+        """
+        with self._lock:
+            return self._discard(chat_id)
+
+    def stats(self):
+        """
+        Return hit, miss and eviction counters and resident size
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["resident_sessions"] = len(self._resident)
+            stats["resident_bytes"] = self._resident_bytes
+            stats["spilled_sessions"] = len(self._spilled_at)
+        return stats
+
+    def _discard(self, chat_id):
+        existed = False
+        entry = self._resident.pop(chat_id, None)
+        if entry is not None:
+            self._resident_bytes -= len(entry[0])
+            existed = True
+        if self._spilled_at.pop(chat_id, None) is not None:
+            try:
+                os.remove(self._spill_path(chat_id))
+                existed = True
+            except FileNotFoundError:
+                pass
+        return existed
+
+    def _load_spilled(self, chat_id):
+        if not self._spilled(chat_id):
+            return None
+        del self._spilled_at[chat_id]
+        path = self._spill_path(chat_id)
+        try:
+            with open(path, 'rb') as file:
+                blob = file.read()
+            os.remove(path)
+            return blob
+        except OSError as e:
+            logger.warning(f"Could not load spilled document session {path}: {str(e)}")
+            return None
+
+    def _spill(self, chat_id):
+        blob, _ = self._resident.pop(chat_id)
+        self._resident_bytes -= len(blob)
+        if not self.spill_dir:
+            self._stats["expirations"] += 1
+            return
+        path = self._spill_path(chat_id)
+        try:
+            with open(f"{path}.tmp", 'wb') as file:
+                file.write(blob)
+            os.replace(f"{path}.tmp", path)
+            self._spilled_at[chat_id] = time.time()
+            self._stats["spills"] += 1
+        except OSError as e:
+            logger.warning(f"Could not spill document session for {chat_id}: {str(e)}")
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._resident:
+            chat_id, (blob, last_access) = next(iter(self._resident.items()))
+            # Keep the most recently used session even if it is over budget on its own
+            over_budget = self._resident_bytes > self.max_bytes and len(self._resident) > 1
+            if not over_budget and now - last_access < self.idle_ttl:
+                break
+            self._spill(chat_id)
+
+        if self.spill_dir and time.time() - self._last_disk_sweep > _DISK_SWEEP_INTERVAL:
+            self._last_disk_sweep = time.time()
+            self._sweep_disk()
+
+    def _sweep_disk(self):
+        cutoff = time.time() - self.disk_ttl
+        for chat_id, spilled_at in list(self._spilled_at.items()):
+            if spilled_at >= cutoff:
+                continue
+            del self._spilled_at[chat_id]
+            try:
+                os.remove(self._spill_path(chat_id))
+                self._stats["expirations"] += 1
+            except OSError:
+                pass
@@ -1,16 +1,13 @@
 import os
 import base64
-from together import Together
-from config import TOGETHER_API_KEY
-
-client = Together(api_key=TOGETHER_API_KEY)
+from services.together_client import get_client
 
 def process_image(image_data):
     try:
         # Convert image_data to base64
         image_base64 = base64.b64encode(image_data).decode('utf-8')
         
-        response = client.images.generate(
+        response = get_client().images.generate(
             prompt="Analyze and describe this image",
             model="black-forest-labs/FLUX.1-schnell-Free",
             width=1024,
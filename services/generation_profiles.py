@@ -0,0 +1,63 @@
+# End-of-turn tokens every profile stops at
+DEFAULT_STOP = ["<|eot_id|>", "<|eom_id|>"]
+
+# Sampling settings shared by every profile unless it overrides them
+DEFAULT_PROFILE = {
+    "max_tokens": 10000,
+    "temperature": 0.7,
+    "top_p": 0.7,
+    "top_k": 50,
+    "repetition_penalty": 1,
+    "stop": DEFAULT_STOP,
+}
+
+# Per-feature overrides; a smaller token budget bounds both latency and cost, and
+# stop sequences end an answer where the model would start making up the next one
+GENERATION_PROFILES = {
+    "default": {"stop": DEFAULT_STOP},
+    "short_tip": {"max_tokens": 700, "stop": DEFAULT_STOP},
+    "assignment_2mark": {"max_tokens": 400, "temperature": 0.3,
+                         "stop": DEFAULT_STOP + ["\n### Answer", "\n### Question"]},
+    # Also answers batches of short questions, split on their "### Answer N:" headers, so it must not stop there
+    "assignment_10mark": {"max_tokens": 2000, "temperature": 0.3, "stop": DEFAULT_STOP},
+    "resume_review": {"max_tokens": 1500, "stop": DEFAULT_STOP},
+    "doc_qa": {"max_tokens": 1200, "temperature": 0.3, "stop": DEFAULT_STOP + ["\nUser question:"]},
+}
+
+# Questions worth at most this many marks get the short assignment profile
+SHORT_ANSWER_MAX_MARKS = 3
+
+
+def get_profile(name):
+    """
+    Return the sampling parameters for a named generation profile
+
+    Args:
+        name (str): One of the keys of GENERATION_PROFILES
+
+    Returns:
+        dict: Keyword arguments for chat.completions.create
+    """
+    if name not in GENERATION_PROFILES:
+        raise ValueError(f"Unknown generation profile: {name}")
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(GENERATION_PROFILES[name])
+    # A copy, so a caller extending it cannot change the stops of other requests
+    profile["stop"] = list(profile["stop"])
+    return profile
+
+
+def profile_for_marks(marks):
+    """
+    Pick the assignment profile for a question's marks value
+
+    Args:
+        marks (str): Marks as extracted from the question paper, may be 'N/A'
+
+    Returns:
+        str: Profile name
+    """
+    try:
+        return "assignment_2mark" if int(marks) <= SHORT_ANSWER_MAX_MARKS else "assignment_10mark"
+    except (TypeError, ValueError):
+        return "assignment_10mark"
@@ -0,0 +1,388 @@
+import logging
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+DELIVERED = "delivered"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINAL_STATES = (DELIVERED, FAILED, CANCELLED)
+
+# Longest wait before a failed stage is tried again, in seconds
+_MAX_RETRY_DELAY = 60
+# How often finished jobs older than the retention period are deleted, in seconds
+_PRUNE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    owner INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, id);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+CREATE TABLE IF NOT EXISTS job_artifacts (
+    job_id INTEGER NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (job_id, name)
+) WITHOUT ROWID;
+"""
+
+
+class JobFailed(Exception):
+    """A stage failed in a way that retrying will not fix; the message is shown to the user"""
+
+
+class JobCancelled(Exception):
+    """The job was cancelled while it was running"""
+
+
+class Job:
+    """
+    A job as seen by its stage functions
+
+    Stages hand their results to later stages with put() and get(). These
+    artifacts are stored with the job, so a stage that runs again after a
+    restart finds the results of the stages that finished before it.
+    """
+
+    def __init__(self, jobs, job_id, kind, owner, state, payload):
+        self._jobs = jobs
+        self.id = job_id
+        self.kind = kind
+        self.owner = owner
+        self.state = state
+        self.payload = payload
+
+    def get(self, name, default=None):
+        """
+        Return an artifact stored by an earlier stage, or default
+        """
+        return self._jobs._get_artifact(self.id, name, default)
+
+    def put(self, name, value):
+        """
+        Store an artifact for later stages
+        """
+        self._jobs._put_artifact(self.id, name, value)
+
+    def set_progress(self, progress):
+        """
+        Record a short progress note, e.g. "12/40 answered", shown by status()
+        """
+        self._jobs._update(self.id, progress=progress)
+
+    def advance(self, state):
+        """
+        Move on to a later stage's state while this stage is still running
+
+        For stages whose remaining work belongs to the next stage, e.g. answers
+        still being generated once every question has been read. If the job is
+        resumed after this, it starts at the stage of the new state.
+
+        Raises:
+            JobCancelled: If the job was cancelled
+        """
+        self._jobs._enter(self, state)
+
+    @property
+    def cancelled(self):
+        return self._jobs._state(self.id) == CANCELLED
+
+
+class JobQueue:
+    """
+    Durable queue of multi-stage background jobs, kept in SQLite
+
+    Each kind of job is a list of named stages. A job's state is the stage it
+    is in (or QUEUED before the first and DELIVERED after the last), and it is
+    saved before the stage starts, so after a crash or restart start() resumes
+    every unfinished job at the stage that had not finished yet. A stage that
+    raises is tried again with exponential backoff up to max_attempts times;
+    JobFailed ends the job at once. Stages run on a pool of worker threads, so
+    they should hand CPU-heavy work to process pools.
+    """
+
+    def __init__(self, path, workers, max_attempts, retention):
+        """
+        Args:
+            path (str): SQLite database file; '' keeps the queue in memory
+            workers (int): Worker threads
+            max_attempts (int): Times a stage is tried before the job fails
+            retention (float): Seconds finished jobs are kept for status()
+        """
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retention = retention
+
+        self._kinds = {}  # kind -> (stages, on_failure)
+        self._ready = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        if path:
+            self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.executescript(_SCHEMA)
+        self._last_prune = 0.0
+        self._stats = {"submitted": 0, "delivered": 0, "failed": 0, "cancelled": 0, "retries": 0, "resumed": 0}
+
+    def register(self, kind, stages, on_failure=None):
+        """
+        Define a kind of job
+
+        Args:
+            kind (str): Name of the kind, stored with each job
+            stages (list): (state name, function(job)) pairs, run in order
+            on_failure (Callable[[Job, Exception], None]): Called when a job
+                of this kind fails for good, e.g. to tell the user
+        """
+        self._kinds[kind] = (stages, on_failure)
+
+    def start(self):
+        """
+        Resume unfinished jobs and start the workers
+
+        Call after all kinds have been registered.
+        """
+        if self._threads:
+            return
+        with self._lock:
+            self._prune(time.time())
+            unfinished = [row[0] for row in self._connection.execute(
+                f"SELECT id FROM jobs WHERE state NOT IN ({', '.join('?' * len(FINAL_STATES))}) ORDER BY id",
+                FINAL_STATES)]
+        for job_id in unfinished:
+            self._ready.put(job_id)
+        if unfinished:
+            self._stats["resumed"] += len(unfinished)
+            logger.info(f"Resuming {len(unfinished)} unfinished jobs")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop the workers after their current stage; unfinished jobs resume on the next start()
+        """
+        for _ in self._threads:
+            self._ready.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, kind, owner, payload):
+        """
+        Queue a job
+
+        Args:
+            kind (str): A kind passed to register()
+            owner (int): Who the job is for, e.g. a chat id
+            payload (Any): Picklable input for the first stage
+
+        Returns:
+            int: The job id
+        """
+        if kind not in self._kinds:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        now = time.time()
+        with self._lock:
+            job_id = self._connection.execute(
+                "INSERT INTO jobs (kind, owner, state, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, owner, QUEUED, pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), now, now)).lastrowid
+            self._stats["submitted"] += 1
+            if now - self._last_prune >= _PRUNE_INTERVAL:
+                self._prune(now)
+        self._ready.put(job_id)
+        return job_id
+
+    def cancel(self, owner):
+        """
+        Cancel the owner's unfinished jobs; running stages stop at the next stage boundary
+
+        Returns:
+            int: Number of jobs cancelled
+        """
+        with self._lock:
+            cancelled = self._connection.execute(
+                f"UPDATE jobs SET state = ?, updated_at = ? WHERE owner = ? "
+                f"AND state NOT IN ({', '.join('?' * len(FINAL_STATES))})",
+                (CANCELLED, time.time(), owner, *FINAL_STATES)).rowcount
+            self._stats["cancelled"] += cancelled
+        return cancelled
+
+    def active(self, owner):
+        """
+        Return True if the owner has jobs that are not finished
+        """
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT 1 FROM jobs WHERE owner = ? AND state NOT IN ({', '.join('?' * len(FINAL_STATES))}) LIMIT 1",
+                (owner, *FINAL_STATES)).fetchone()
+        return row is not None
+
+    def status(self, owner, limit=5):
+        """
+        Return the owner's most recent jobs, newest first
+
+        Returns:
+            list: Dicts with id, kind, state, progress, error, created_at and updated_at
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, kind, state, progress, error, created_at, updated_at FROM jobs "
+                "WHERE owner = ? ORDER BY id DESC LIMIT ?", (owner, limit)).fetchall()
+        keys = ("id", "kind", "state", "progress", "error", "created_at", "updated_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def stats(self):
+        """
+        Return counters and the number of jobs in each state
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["states"] = dict(self._connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+        stats["ready"] = self._ready.qsize()
+        return stats
+
+    def _work(self):
+        while True:
+            job_id = self._ready.get()
+            if job_id is None:
+                return
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} could not be run: {str(e)}", exc_info=True)
+
+    def _run(self, job_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT kind, owner, state, payload, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return
+        if row[2] in FINAL_STATES:
+            # Cancelled while it was waiting to run or to be retried
+            with self._lock:
+                self._connection.execute("DELETE FROM job_artifacts WHERE job_id = ?", (job_id,))
+            return
+        kind, owner, state, payload, attempts = row
+        stages, on_failure = self._kinds[kind]
+        job = Job(self, job_id, kind, owner, state, pickle.loads(payload))
+
+        names = [name for name, _ in stages]
+        first = names.index(state) if state in names else 0
+        try:
+            for name, stage in stages[first:]:
+                self._enter(job, name)
+                stage(job)
+            self._finish(job, DELIVERED)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+            logger.info(f"Job {job_id} was cancelled in state {job.state}")
+        except JobFailed as e:
+            self._fail(job, e, on_failure)
+        except Exception as e:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Job {job_id} failed in state {job.state}: {str(e)}", exc_info=True)
+                self._fail(job, e, on_failure)
+                return
+            delay = min(_MAX_RETRY_DELAY, 2 ** attempts)
+            logger.warning(f"Job {job_id} failed in state {job.state} (attempt {attempts}), "
+                           f"retrying in {delay} s: {str(e)}")
+            self._update(job_id, attempts=attempts, error=str(e))
+            self._stats["retries"] += 1
+            timer = threading.Timer(delay, self._ready.put, (job_id,))
+            timer.daemon = True
+            timer.start()
+
+    def _enter(self, job, state):
+        # The state is only advanced if nobody cancelled the job in the meantime
+        with self._lock:
+            updated = self._connection.execute(
+                f"UPDATE jobs SET state = ?, updated_at = ? WHERE id = ? "
+                f"AND state NOT IN ({', '.join('?' * len(FINAL_STATES))})",
+                (state, time.time(), job.id, *FINAL_STATES)).rowcount
+        if not updated:
+            raise JobCancelled()
+        job.state = state
+
+    def _finish(self, job, state, error=None):
+        with self._transaction():
+            # A job cancelled while its last stage ran stays cancelled
+            updated = self._connection.execute(
+                f"UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ? "
+                f"AND state NOT IN ({', '.join('?' * len(FINAL_STATES))})",
+                (state, error, time.time(), job.id, *FINAL_STATES)).rowcount
+            if updated:
+                self._stats[state] += 1
+            # Artifacts are only needed to resume
+            self._connection.execute("DELETE FROM job_artifacts WHERE job_id = ?", (job.id,))
+
+    def _fail(self, job, error, on_failure):
+        self._finish(job, FAILED, str(error))
+        if on_failure:
+            try:
+                on_failure(job, error)
+            except Exception as e:
+                logger.error(f"Failure handler for job {job.id} failed: {str(e)}")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                yield
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def _state(self, job_id):
+        with self._lock:
+            row = self._connection.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def _update(self, job_id, **columns):
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self._lock:
+            self._connection.execute(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                                     (*columns.values(), time.time(), job_id))
+
+    def _get_artifact(self, job_id, name, default):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM job_artifacts WHERE job_id = ? AND name = ?", (job_id, name)).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def _put_artifact(self, job_id, name, value):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO job_artifacts (job_id, name, value) VALUES (?, ?, ?)",
+                (job_id, name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def _prune(self, now):
+        self._last_prune = now
+        deleted = self._connection.execute(
+            f"DELETE FROM jobs WHERE state IN ({', '.join('?' * len(FINAL_STATES))}) AND updated_at < ?",
+            (*FINAL_STATES, now - self.retention)).rowcount
+        if deleted:
+            logger.debug(f"Pruned {deleted} finished jobs")
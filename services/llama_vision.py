@@ -1,93 +1,254 @@
-import os
-from together import Together
-from config import TOGETHER_API_KEY
+import hashlib
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services.together_client import get_client
+from services.response_cache import ResponseCache
+from services.single_flight import SingleFlight
+from services.generation_profiles import get_profile
+from services.llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE
+from services.resilience import (CircuitBreaker, LatencyTracker, TRANSIENT_ERRORS, backoff_delay,
+                                 call_with_retries, classify_error, hedged_call)
+from services.resilience import (LLMError, LLMRequestError, LLMTimeoutError, LLMRateLimitError,  # noqa: F401
+                                 LLMUnavailableError, LLMCircuitOpenError)
+from config import (RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_PATH,
+                    LLM_REQUESTS_PER_MINUTE, LLM_BURST, LLM_MAX_CONCURRENT, LLM_RETRIES, LLM_RETRY_BASE_DELAY,
+                    LLM_RETRY_MAX_DELAY, LLM_HEDGE_PERCENTILE, LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET)
 
-client = Together(api_key=TOGETHER_API_KEY)
+logger = logging.getLogger(__name__)
 
-import os
-from together import Together
-from config import TOGETHER_API_KEY
+MODEL = "meta-llama/Llama-Vision-Free"
 
-client = Together(api_key=TOGETHER_API_KEY)
+# Shared cache for prompts that always produce an equally good answer
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    path=RESPONSE_CACHE_PATH or None
+)
 
-def process_text(text):
+# Identical prompts that are in flight at the same time share one upstream request
+inflight_requests = SingleFlight()
+
+# Every upstream call waits here for its turn under the provider's rate limits
+llm_scheduler = LLMScheduler(LLM_REQUESTS_PER_MINUTE, LLM_BURST, LLM_MAX_CONCURRENT)
+
+# Fails calls fast while the provider is down
+circuit_breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET)
+
+# Completion latencies per generation profile, used to decide when to hedge
+_latencies = {}
+_hedge_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENT * 2, thread_name_prefix="llm-hedge")
+
+
+def _request_key(content, profile):
     """
-    Process text input using the Llama Vision model
-    
-    Args:
-        text (str): The text to process
-    
-    Returns:
-        str: Processed response from the model
+    Key identifying a completion request by model, profile and whitespace-normalized prompt
+    """
+    normalized = re.sub(r'\s+', ' ', content).strip()
+    return hashlib.sha256(f"{MODEL}\n{profile}\n{normalized}".encode('utf-8')).hexdigest()
+
+
+def _fetch_completion(content, profile, priority, user_id):
+    start = time.monotonic()
+    full_response = "".join(_stream_completion(content, profile, priority, user_id))
+    _latencies.setdefault(profile, LatencyTracker()).record(time.monotonic() - start)
+    return full_response
+
+
+def _resilient_completion(content, profile, priority, user_id):
+    """
+    Fetch a completion with retries, optional hedging and the circuit breaker
+    """
+    def attempt():
+        hedge_after = None
+        if LLM_HEDGE_PERCENTILE:
+            hedge_after = _latencies.setdefault(profile, LatencyTracker()).percentile(LLM_HEDGE_PERCENTILE)
+        return hedged_call(_hedge_executor, lambda: _fetch_completion(content, profile, priority, user_id), hedge_after)
+
+    return call_with_retries(attempt, circuit_breaker, LLM_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY)
+
+
+def _resilient_stream(content, profile, priority, user_id):
+    """
+    Stream a completion, retrying transient errors that happen before the first chunk
+    """
+    for attempt in range(LLM_RETRIES + 1):
+        circuit_breaker.before_call()
+        started = False
+        recorded = False
+        try:
+            for delta in _stream_completion(content, profile, priority, user_id):
+                started = True
+                yield delta
+        except Exception as e:
+            error = classify_error(e)
+            recorded = True
+            if not isinstance(error, TRANSIENT_ERRORS):
+                circuit_breaker.record_neutral()
+                raise error
+            circuit_breaker.record_failure()
+            # Text already shown to the user cannot be taken back, so only retry before the first chunk
+            if started or attempt == LLM_RETRIES:
+                raise error
+            delay = backoff_delay(attempt, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY)
+            logger.warning(f"Transient LLM error ({type(error).__name__}: {error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            recorded = True
+            circuit_breaker.record_success()
+            return
+        finally:
+            # The consumer stopped reading (GeneratorExit); release a half-open trial so later calls are let through
+            if not recorded:
+                circuit_breaker.record_neutral()
+
+
+def _complete(content, profile, priority, user_id):
     """
-    try:
-        response = client.chat.completions.create(
-            model="meta-llama/Llama-Vision-Free",
-            messages=[{"role": "user", "content": text}],
-            max_tokens=10000,  # Increased max_tokens for longer responses
-            temperature=0.7,
-            top_p=0.7,
-            top_k=50,
-            repetition_penalty=1,
-            stop=["<|eot_id|>", "<|eom_id|>"],
-            stream=True
+    Return the full completion for content, sharing it with identical concurrent calls
+    """
+    full_response, coalesced = inflight_requests.do(
+        _request_key(content, profile),
+        lambda: _resilient_completion(content, profile, priority, user_id))
+    if coalesced:
+        logger.debug(f"Coalesced request for prompt {content[:50]!r} with an in-flight call")
+    return full_response
+
+
+def _stream_completion(content, profile, priority, user_id):
+    """
+    Yield the text deltas of a streamed chat completion as they arrive
+    """
+    with llm_scheduler.slot(priority, user_id):
+        response = get_client().chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": content}],
+            stream=True,
+            **get_profile(profile)
         )
-        
-        # Collect the streamed response
-        full_response = ""
+
         for chunk in response:
             if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
                 if hasattr(chunk.choices[0], 'delta') and hasattr(chunk.choices[0].delta, 'content'):
                     if chunk.choices[0].delta.content is not None:
-                        full_response += chunk.choices[0].delta.content
-        
-        if full_response:
-            return full_response
-        else:
-            return "I apologize, but I couldn't generate a response. Could you please try rephrasing your question?"
-            
-    except Exception as e:
-        return f"An error occurred while processing your request: {str(e)}"
+                        yield chunk.choices[0].delta.content
+
+
+def stream_text(text, profile="default", priority=PRIORITY_INTERACTIVE, user_id=None):
+    """
+    Stream the model's answer to a text input piece by piece
+
+    Args:
+        text (str): The text to process
+        profile (str): Generation profile, see services.generation_profiles
+        priority (int): Scheduling priority, see services.llm_scheduler
+        user_id (Hashable): User the call is made for, for fair scheduling
+
+    Returns:
+        Iterator[str]: Text deltas in the order the model produces them
+
+    Raises:
+        LLMError: If the model call fails
+    """
+    return _resilient_stream(text, profile, priority, user_id)
+
+
+def stream_image_and_text(prompt, text, profile="default", priority=PRIORITY_INTERACTIVE, user_id=None):
+    """
+    Stream the model's analysis of extracted text piece by piece
+
+    Args:
+        prompt (str): The instruction or prompt for analyzing the text
+        text (str): The extracted text to analyze
+        profile (str): Generation profile, see services.generation_profiles
+        priority (int): Scheduling priority, see services.llm_scheduler
+        user_id (Hashable): User the call is made for, for fair scheduling
+
+    Returns:
+        Iterator[str]: Text deltas in the order the model produces them
+
+    Raises:
+        LLMError: If the model call fails
+    """
+    return _resilient_stream(f"{prompt}\n\nText to analyze:\n{text}", profile, priority, user_id)
+
+
+def complete_text(text, profile="default", priority=PRIORITY_INTERACTIVE, user_id=None):
+    """
+    Return the model's full answer to a text input
+
+    Args:
+        text (str): The text to process
+        profile (str): Generation profile, see services.generation_profiles
+        priority (int): Scheduling priority, see services.llm_scheduler
+        user_id (Hashable): User the call is made for, for fair scheduling
+
+    Returns:
+        str: The answer, or an empty string if the model returned nothing
+
+    Raises:
+        LLMError: If the model call fails
+    """
+    return _complete(text, profile, priority, user_id)
+
+
+def process_text(text, cache_ttl=None, profile="default", priority=PRIORITY_INTERACTIVE, user_id=None):
+    """
+    Process text input using the Llama Vision model
+
+    Args:
+        text (str): The text to process
+        cache_ttl (float): If set, answers are served from and stored in the
+            response cache for this many seconds. Only use this for prompts
+            that do not depend on the user.
+        profile (str): Generation profile, see services.generation_profiles
+        priority (int): Scheduling priority, see services.llm_scheduler
+        user_id (Hashable): User the call is made for, for fair scheduling
+
+    Returns:
+        str: Processed response from the model
+
+    Raises:
+        LLMError: If the model call fails
+    """
+    if cache_ttl is not None:
+        key = _request_key(text, profile)
+        cached = response_cache.get(key)
+        if cached is not None:
+            logger.debug(f"Response cache hit for prompt {text[:50]!r}")
+            return cached
+
+    full_response = complete_text(text, profile, priority, user_id)
+
+    if full_response:
+        if cache_ttl is not None:
+            response_cache.set(key, full_response, ttl=cache_ttl)
+        return full_response
+    else:
+        return "I apologize, but I couldn't generate a response. Could you please try rephrasing your question?"
 
-def process_image_and_text(prompt, text):
+def process_image_and_text(prompt, text, profile="default", priority=PRIORITY_INTERACTIVE, user_id=None):
     """
     Process both image content and text using the Llama Vision model
-    
+
     Args:
         prompt (str): The instruction or prompt for analyzing the text
         text (str): The extracted text to analyze
-    
+        profile (str): Generation profile, see services.generation_profiles
+        priority (int): Scheduling priority, see services.llm_scheduler
+        user_id (Hashable): User the call is made for, for fair scheduling
+
     Returns:
         str: Analysis result from the model
+
+    Raises:
+        LLMError: If the model call fails
     """
-    try:
-        # Combine prompt and text for analysis
-        combined_input = f"{prompt}\n\nText to analyze:\n{text}"
-        
-        response = client.chat.completions.create(
-            model="meta-llama/Llama-Vision-Free",
-            messages=[{"role": "user", "content": combined_input}],
-            max_tokens=10000,
-            temperature=0.7,
-            top_p=0.7,
-            top_k=50,
-            repetition_penalty=1,
-            stop=["<|eot_id|>", "<|eom_id|>"],
-            stream=True
-        )
-        
-        # Collect the streamed response
-        full_response = ""
-        for chunk in response:
-            if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
-                if hasattr(chunk.choices[0], 'delta') and hasattr(chunk.choices[0].delta, 'content'):
-                    if chunk.choices[0].delta.content is not None:
-                        full_response += chunk.choices[0].delta.content
-        
-        if full_response:
-            return full_response
-        else:
-            return "I apologize, but I couldn't analyze the content. Please try again."
-            
-    except Exception as e:
-        return f"An error occurred while analyzing the content: {str(e)}"
\ No newline at end of file
+    full_response = _complete(f"{prompt}\n\nText to analyze:\n{text}", profile, priority, user_id)
+
+    if full_response:
+        return full_response
+    else:
+        return "I apologize, but I couldn't analyze the content. Please try again."
+
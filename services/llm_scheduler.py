@@ -0,0 +1,174 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# How many users' last grant times are remembered for round-robin ordering
+_MAX_TRACKED_USERS = 1024
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at a constant rate up to a fixed capacity
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens (the allowed burst)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self):
+        """
+        Return seconds until a token is available, 0 if one is now; takes nothing
+        """
+        self._refill()
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def try_take(self):
+        """
+        Take one token if available
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one is available
+        """
+        wait = self.wait_time()
+        if not wait:
+            self._tokens -= 1
+        return wait
+
+
+class _Ticket:
+    def __init__(self, seq, priority, user_id):
+        self.seq = seq
+        self.priority = priority
+        self.user_id = user_id
+        self.enqueued = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Admission control for upstream model calls
+
+    Callers wait in slot() until the request bucket has a token and fewer than
+    max_concurrent calls are running. Waiting calls are served by priority,
+    then by how many calls their user already has running, then round-robin
+    between users (so one user's bulk job cannot starve others), then first
+    come first served.
+    """
+
+    def __init__(self, requests_per_minute, burst, max_concurrent):
+        """
+        Args:
+            requests_per_minute (float): Sustained request rate allowed upstream
+            burst (int): Number of requests that may be sent back to back
+            max_concurrent (int): Maximum number of calls running at once
+        """
+        self.max_concurrent = max_concurrent
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._running = 0
+        self._running_by_user = defaultdict(int)
+        self._last_grant = OrderedDict()  # user_id -> grant number, least recent first
+        self._granted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _next_ticket(self):
+        return min(self._waiting,
+                   key=lambda t: (t.priority, self._running_by_user.get(t.user_id, 0),
+                                  self._last_grant.get(t.user_id, -1), t.seq))
+
+    def _acquire(self, ticket):
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    timeout = None
+                    if self._running < self.max_concurrent and self._next_ticket() is ticket:
+                        timeout = self._bucket.try_take()
+                        if timeout == 0:
+                            break
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting.remove(ticket)
+
+            waited = time.monotonic() - ticket.enqueued
+            self._running += 1
+            self._running_by_user[ticket.user_id] += 1
+            self._last_grant[ticket.user_id] = self._granted
+            self._last_grant.move_to_end(ticket.user_id)
+            if len(self._last_grant) > _MAX_TRACKED_USERS:
+                self._last_grant.popitem(last=False)
+            self._granted += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            # Let the next ticket in line check whether it can go too
+            self._cond.notify_all()
+        if waited > 1:
+            logger.debug(f"LLM call for user {ticket.user_id} waited {waited:.1f}s (priority {ticket.priority})")
+
+    def _release(self, ticket):
+        with self._cond:
+            self._running -= 1
+            self._running_by_user[ticket.user_id] -= 1
+            if not self._running_by_user[ticket.user_id]:
+                del self._running_by_user[ticket.user_id]
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_INTERACTIVE, user_id=None):
+        """
+        Block until the caller may send a request upstream, and hold the slot for the with-block
+
+        Args:
+            priority (int): PRIORITY_INTERACTIVE or PRIORITY_BULK
+            user_id (Hashable): Used to share capacity fairly between users
+        """
+        ticket = _Ticket(next(self._seq), priority, user_id)
+        self._acquire(ticket)
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def stats(self):
+        """
+        Return queue depth, running calls and wait times for monitoring
+        """
+        with self._cond:
+            now = time.monotonic()
+            queued_by_priority = defaultdict(int)
+            for ticket in self._waiting:
+                queued_by_priority[ticket.priority] += 1
+            return {
+                "queue_depth": len(self._waiting),
+                "queued_by_priority": dict(queued_by_priority),
+                "oldest_wait_s": max((now - t.enqueued for t in self._waiting), default=0.0),
+                "running": self._running,
+                "granted": self._granted,
+                "avg_wait_s": self._total_wait / self._granted if self._granted else 0.0,
+                "max_wait_s": self._max_wait,
+            }
@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+
+from config import (OCR_WORKERS, OCR_LANG, OCR_MAX_SKEW, OCR_MAX_IMAGE_SIDE, OCR_CACHE_MAX_ENTRIES, OCR_CACHE_MAX_BYTES,
+                    OCR_CACHE_TTL, OCR_CACHE_PATH)
+from services.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Ink pixels sampled when estimating skew; more adds time without changing the estimate
+_SKEW_SAMPLE_PIXELS = 200_000
+_SKEW_STEP = 0.25
+
+ocr_cache = ResponseCache(
+    max_entries=OCR_CACHE_MAX_ENTRIES,
+    max_bytes=OCR_CACHE_MAX_BYTES,
+    default_ttl=OCR_CACHE_TTL,
+    path=OCR_CACHE_PATH or None,
+    # A scanned document caches a result per page; its file is written once they are all done
+    autosave=False
+)
+# Longest time cached results wait to be written while OCR never goes idle
+_FLUSH_INTERVAL = 60
+
+_pool = None
+_pool_lock = threading.Lock()
+_outstanding = 0
+_last_flush = time.monotonic()
+
+
+def otsu_threshold(gray):
+    """
+    Return the grey level that best separates ink from paper (Otsu's method)
+
+    Args:
+        gray (np.ndarray): 2-D uint8 image
+
+    Returns:
+        int: Pixels at or below this level are ink
+    """
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(histogram * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    between_class = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return int(np.argmax(between_class))
+
+
+def estimate_skew(ink, max_angle=OCR_MAX_SKEW, step=_SKEW_STEP):
+    """
+    Estimate how far text lines are rotated from horizontal
+
+    Ink pixel coordinates are projected onto the vertical axis at each
+    candidate angle; the angle that gives the sharpest row profile (text
+    lines falling into as few rows as possible) wins.
+
+    Args:
+        ink (np.ndarray): 2-D boolean array, True where there is ink
+        max_angle (float): Largest skew considered, in degrees either way
+        step (float): Resolution of the search in degrees
+
+    Returns:
+        float: Angle in degrees; rotating the image by it straightens the text
+    """
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > _SKEW_SAMPLE_PIXELS:
+        keep = np.random.default_rng(0).choice(len(ys), _SKEW_SAMPLE_PIXELS, replace=False)
+        ys, xs = ys[keep], xs[keep]
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        theta = np.deg2rad(angle)
+        rows = np.round(ys * np.cos(theta) + xs * np.sin(theta)).astype(np.int64)
+        profile = np.bincount(rows - rows.min())
+        score = float(np.dot(profile, profile))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return -best_angle
+
+
+def downscale(image, max_side=OCR_MAX_IMAGE_SIDE):
+    """
+    Shrink an image so that its longer side is at most max_side pixels
+
+    Phone photos are often 4000 pixels or more across. Text stays legible to
+    Tesseract well below that, and deskewing and OCR take time in proportion
+    to the number of pixels.
+
+    Args:
+        image (PIL.Image.Image): Image; a JPEG not yet loaded is decoded at a reduced scale
+        max_side (int): Largest width or height kept
+
+    Returns:
+        PIL.Image.Image: The image itself if it is small enough, else a smaller copy
+    """
+    if max(image.size) <= max_side:
+        return image
+    # JPEGs can be decoded straight to a power-of-two fraction of their size, far faster than full decoding
+    image.draft("L", (max_side, max_side))
+    scale = max_side / max(image.size)
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.convert("L").resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+
+def preprocess(image):
+    """
+    Prepare a page image for OCR: grayscale, deskew, binarize
+
+    Returns:
+        PIL.Image.Image: Black text on a white background, mode "L"
+    """
+    gray = image.convert("L")
+    pixels = np.asarray(gray)
+    threshold = otsu_threshold(pixels)
+
+    angle = estimate_skew(pixels <= threshold)
+    if abs(angle) >= _SKEW_STEP:
+        gray = gray.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+        pixels = np.asarray(gray)
+
+    binary = np.where(pixels <= threshold, 0, 255).astype(np.uint8)
+    return Image.fromarray(binary, mode="L")
+
+
+def ocr_image_bytes(image_bytes, lang=OCR_LANG):
+    """
+    Downscale, preprocess and OCR one encoded image; runs in the OCR worker processes
+
+    Args:
+        image_bytes (bytes): PNG, JPEG or any format Pillow can read
+
+    Returns:
+        str: Recognised text
+
+    Raises:
+        RuntimeError: If Tesseract is missing or fails
+    """
+    with Image.open(BytesIO(image_bytes)) as image:
+        # Photos are stored sideways with an EXIF orientation tag more often than not
+        image = ImageOps.exif_transpose(downscale(image))
+        try:
+            return pytesseract.image_to_string(preprocess(image), lang=lang)
+        except (pytesseract.TesseractNotFoundError, pytesseract.TesseractError) as e:
+            # pytesseract's exceptions cannot be unpickled, which would break the whole pool
+            raise RuntimeError(f"Tesseract failed: {e}") from None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Not fork: the bot process runs outbox, job and scheduler threads whose locks a forked child could inherit held
+                _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+
+def image_key(image_bytes, *parts):
+    """
+    Return the cache key for an image and anything else its text depends on
+    """
+    digest = hashlib.sha256(image_bytes)
+    for part in parts:
+        digest.update(str(part).encode())
+    return f"ocr:{digest.hexdigest()}"
+
+
+def submit_ocr(key, load_image):
+    """
+    OCR an image on the worker pool, reusing cached results
+
+    Args:
+        key (str): Cache key for the image content, see image_key
+        load_image (Callable[[], bytes]): Returns the encoded image; only
+            called on a cache miss, so expensive rasterizing can be skipped
+
+    Returns:
+        Future: Resolves to the recognised text
+    """
+    cached = ocr_cache.get(key)
+    if cached is not None:
+        future = Future()
+        future.set_result(cached)
+        return future
+
+    global _outstanding
+    future = _get_pool().submit(ocr_image_bytes, load_image())
+    with _pool_lock:
+        _outstanding += 1
+
+    def store(done):
+        global _outstanding, _last_flush
+        if not done.cancelled() and done.exception() is None:
+            ocr_cache.set(key, done.result())
+        with _pool_lock:
+            _outstanding -= 1
+            flush = _outstanding == 0 or time.monotonic() - _last_flush >= _FLUSH_INTERVAL
+            if flush:
+                _last_flush = time.monotonic()
+        if flush:
+            ocr_cache.flush()
+
+    future.add_done_callback(store)
+    return future
+
+
+def ocr_image(image_bytes):
+    """
+    OCR an uploaded image, e.g. a photo of a question paper, resume or poster
+
+    Args:
+        image_bytes (bytes): PNG, JPEG or any format Pillow can read
+
+    Returns:
+        str: Recognised text
+    """
+    return submit_ocr(image_key(image_bytes, OCR_LANG, OCR_MAX_IMAGE_SIDE), lambda: image_bytes).result()
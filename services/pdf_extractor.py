@@ -0,0 +1,240 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+from config import (PDF_MAX_BYTES, PDF_MAX_PAGES, PDF_PARALLEL_MIN_PAGES, PDF_WORKERS, OCR_DPI, OCR_MIN_TEXT_CHARS,
+                    OCR_WORKERS, OCR_LANG)
+from services.ocr import image_key, submit_ocr
+
+logger = logging.getLogger(__name__)
+
+# Pages per task when a large file is split across the process pool
+_RANGE_PAGES = 16
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PDFTooLargeError(ValueError):
+    """The uploaded PDF is larger than PDF_MAX_BYTES"""
+
+
+class ExtractedPDF:
+    """
+    Text of a PDF, one string per page
+    """
+
+    def __init__(self, pages, total_pages):
+        """
+        Args:
+            pages (list): Extracted text of each page, in page order
+            total_pages (int): Number of pages in the file, including any not extracted
+        """
+        self.pages = pages
+        self.total_pages = total_pages
+
+    @property
+    def truncated(self):
+        """True if pages were skipped because of PDF_MAX_PAGES"""
+        return len(self.pages) < self.total_pages
+
+    @property
+    def text(self):
+        return "\n".join(self.pages)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Not fork: the bot process runs outbox, job and scheduler threads whose locks a forked child could inherit held
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+
+def _page_content(page, words):
+    if words:
+        return [word[:5] for word in page.get_text("words")]
+    return page.get_text("text")
+
+
+def _content_length(content):
+    if isinstance(content, str):
+        return len(content.strip())
+    return sum(len(word[4]) for word in content)
+
+
+def _extract_range(pdf_path, start, end, words):
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        return [_page_content(doc.load_page(i), words) for i in range(start, end)]
+
+
+class PageStream:
+    """
+    Text of a PDF produced one page at a time, in page order
+
+    Small files are read page by page in this process. Large files are cut
+    into ranges of _RANGE_PAGES pages that are extracted on the process pool,
+    with at most two ranges per worker in flight, so the first pages are
+    available while later ones are still being parsed and memory stays
+    bounded however long the file is. The workers read the ranges from a
+    temporary copy of the file written once, not from bytes pickled into
+    every task. Scanned pages with no text layer are rasterized and OCRed,
+    see _with_ocr.
+
+    With words=True, pages that have a text layer are produced as lists of
+    (x0, y0, x1, y1, word) tuples in PDF points instead of plain text, for
+    parsers that need the layout. OCRed pages are always plain text.
+    """
+
+    def __init__(self, pdf_bytes, max_pages=PDF_MAX_PAGES, max_bytes=PDF_MAX_BYTES, ocr=True, words=False):
+        """
+        Args:
+            pdf_bytes (bytes): The PDF file
+            max_pages (int): Pages beyond this are not extracted
+            max_bytes (int): Larger files are rejected
+            ocr (bool): OCR scanned pages that have no text layer
+            words (bool): Produce positioned words instead of text for text-layer pages
+
+        Raises:
+            PDFTooLargeError: If the file is larger than max_bytes
+        """
+        if len(pdf_bytes) > max_bytes:
+            raise PDFTooLargeError(f"PDF is {len(pdf_bytes) // 1024} KB, the limit is {max_bytes // 1024} KB")
+        self.pdf_bytes = pdf_bytes
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            self.total_pages = doc.page_count
+        self.page_count = min(self.total_pages, max_pages)
+        self.ocr = ocr
+        self.words = words
+
+    @property
+    def truncated(self):
+        """True if pages are skipped because of max_pages"""
+        return self.page_count < self.total_pages
+
+    def __iter__(self):
+        pages = self._iter_text_layer()
+        return self._with_ocr(pages) if self.ocr else pages
+
+    def _iter_text_layer(self):
+        if self.page_count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+            with fitz.open(stream=self.pdf_bytes, filetype="pdf") as doc:
+                for i in range(self.page_count):
+                    yield _page_content(doc.load_page(i), self.words)
+            return
+
+        ranges = iter([(start, min(start + _RANGE_PAGES, self.page_count))
+                       for start in range(0, self.page_count, _RANGE_PAGES)])
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as file:
+            file.write(self.pdf_bytes)
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < 2 * PDF_WORKERS:
+                    page_range = next(ranges, None)
+                    if page_range is None:
+                        break
+                    pending.append(_get_pool().submit(_extract_range, file.name, *page_range, self.words))
+                if not pending:
+                    break
+                yield from pending.popleft().result()
+        finally:
+            # The consumer stopped early; don't parse pages nobody will read
+            for future in pending:
+                future.cancel()
+            # Ranges still running when the consumer stopped may fail to open it, but nobody reads their results
+            os.remove(file.name)
+
+    def _with_ocr(self, pages):
+        """
+        Replace pages without a text layer by their OCR text, keeping page order
+
+        OCR runs on the OCR worker pool with up to two pages per worker in
+        flight, so scanned pages are recognised in parallel while text pages
+        pass straight through.
+        """
+        pending = deque()  # (text layer, OCR future or None) in page order
+        doc = None
+        try:
+            for number, text in enumerate(pages):
+                future = None
+                if _content_length(text) < OCR_MIN_TEXT_CHARS:
+                    if doc is None:
+                        doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+                    future = _submit_page_ocr(doc, doc.load_page(number))
+                pending.append((text, future))
+                while pending and (pending[0][1] is None or len(pending) > 2 * OCR_WORKERS):
+                    yield _resolve_page(number - len(pending) + 1, *pending.popleft())
+            while pending:
+                yield _resolve_page(self.page_count - len(pending), *pending.popleft())
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+            if doc is not None:
+                doc.close()
+
+
+def _submit_page_ocr(doc, page):
+    images = page.get_images(full=True)
+    if not images:
+        # Nothing to recognise on a page without text or images
+        return None
+    content = page.read_contents() + b"".join(doc.xref_stream_raw(image[0]) or b"" for image in images)
+
+    def rasterize():
+        return page.get_pixmap(dpi=OCR_DPI, colorspace=fitz.csGRAY).tobytes("png")
+
+    return submit_ocr(image_key(content, OCR_DPI, OCR_LANG), rasterize)
+
+
+def _resolve_page(number, text, future):
+    if future is None:
+        return text
+    try:
+        return future.result()
+    except Exception as e:
+        logger.error(f"OCR failed for page {number + 1}: {str(e)}")
+        return text
+
+
+def iter_pages(pdf_bytes, max_pages=PDF_MAX_PAGES, max_bytes=PDF_MAX_BYTES, words=False):
+    """
+    Return the pages of a PDF as a stream of text, see PageStream
+
+    The size limit is checked here, before the first page is read.
+
+    Raises:
+        PDFTooLargeError: If the file is larger than max_bytes
+    """
+    return PageStream(pdf_bytes, max_pages, max_bytes, words=words)
+
+
+def extract_pdf(pdf_bytes, max_pages=PDF_MAX_PAGES, max_bytes=PDF_MAX_BYTES):
+    """
+    Extract the text of a PDF page by page with PyMuPDF
+
+    Files with at least PDF_PARALLEL_MIN_PAGES pages are split into page
+    ranges that are extracted in parallel on a process pool.
+
+    Args:
+        pdf_bytes (bytes): The PDF file
+        max_pages (int): Pages beyond this are not extracted
+        max_bytes (int): Larger files are rejected
+
+    Returns:
+        ExtractedPDF: Page-indexed text
+
+    Raises:
+        PDFTooLargeError: If the file is larger than max_bytes
+    """
+    pages = iter_pages(pdf_bytes, max_pages, max_bytes)
+    return ExtractedPDF(list(pages), pages.total_pages)
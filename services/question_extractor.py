@@ -0,0 +1,251 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Cells of a question paper row: "<number> <question> <marks> CO<n> L<n>[,L<n>...]"
+NUMBER_TOKEN = re.compile(r'^(?:Q\.?)?(\d{1,3})[.):]?$', re.IGNORECASE)
+MARKS_TOKEN = re.compile(r'^[(\[]?(\d{1,3})[)\]]?$')
+CO_TOKEN = re.compile(r'^CO-?\d+$', re.IGNORECASE)
+LO_TOKEN = re.compile(r'^,?(?:L\d+,?)+$', re.IGNORECASE)
+
+# Question text kept while waiting for its marks/CO cells; longer runs are not a single question
+_MAX_PENDING_TOKENS = 2000
+# Rows whose centres are closer than this fraction of the average word height are one row
+_ROW_TOLERANCE = 0.4
+# How far right of the question number column a row may start and still begin a new question
+_NUMBER_COLUMN_SLACK = 6.0
+
+
+def _question(words, marks, co, lo):
+    return {
+        "question": " ".join(words),
+        "marks": marks,
+        "co": co.upper().replace("-", ""),
+        "lo": "".join(lo).strip(",").upper() or "N/A"
+    }
+
+
+def _rows(words):
+    """
+    Group positioned words into rows from top to bottom, each sorted left to right
+
+    Words are bucketed by the height of their centre line, so grouping is
+    linear in the number of words; only the (far fewer) rows are sorted.
+    """
+    if not words:
+        return []
+    height = sum(word[3] - word[1] for word in words) / len(words) or 1.0
+    tolerance = height * _ROW_TOLERANCE
+    buckets = {}
+    for word in words:
+        center = (word[1] + word[3]) / 2
+        buckets.setdefault(int(center // tolerance), []).append((center, word))
+
+    rows = []
+    row_center = None
+    for key in sorted(buckets):
+        bucket = buckets[key]
+        center = min(center for center, _ in bucket)
+        if row_center is not None and center - row_center < tolerance:
+            # A line whose words straddle a bucket boundary
+            rows[-1].extend(word for _, word in bucket)
+        else:
+            rows.append([word for _, word in bucket])
+            row_center = center
+    for row in rows:
+        row.sort(key=lambda word: word[0])
+    return rows
+
+
+def _find_anchor(row):
+    """
+    Find the marks, CO and LO cells in a row
+
+    Returns:
+        tuple: (index where the cells start, marks, co, lo tokens), or None
+    """
+    for i, word in enumerate(row):
+        if not CO_TOKEN.match(word[4]):
+            continue
+        marks_match = MARKS_TOKEN.match(row[i - 1][4]) if i else None
+        lo = []
+        for following in row[i + 1:]:
+            if not LO_TOKEN.match(following[4]):
+                break
+            lo.append(following[4])
+        start = i - 1 if marks_match else i
+        return start, marks_match.group(1) if marks_match else "N/A", word[4], lo
+    return None
+
+
+class QuestionParser:
+    """
+    Single-pass parser for question papers laid out as a table
+
+    Pages with a text layer are fed as positioned words (see
+    pdf_extractor.PageStream with words=True). Rows are rebuilt from word
+    positions, a row whose first cell is a number in the question number
+    column starts a question, and the marks, CO and LO cells are taken from
+    the right of the row wherever they sit in the question's rows. Text left
+    of the marks column is the question, so continuation lines and questions
+    that span a page break are joined.
+
+    Pages without positions (OCR output, photos) are fed as text and parsed
+    token by token: a number token before "CO<n>" gives the marks, the L<n>
+    tokens after it the levels, and the text since the question number the
+    question. Both modes do a constant amount of work per word.
+    """
+
+    def __init__(self):
+        self._current = None  # {"words": [...], "anchor": [marks, co, lo] or None, "x": number column}
+        self._number_x = None
+        self._tokens = []
+        self._pending_text = None  # (words, marks, co, lo) waiting for more LO tokens
+
+    def feed_words(self, words):
+        """
+        Parse one page of (x0, y0, x1, y1, word) tuples
+
+        Returns:
+            list: Questions completed by this page
+        """
+        done = self._flush_text()
+        previous_bottom = None
+        for row in _rows(words):
+            anchor = _find_anchor(row)
+            first = row[0]
+            top = min(word[1] for word in row)
+            bottom = max(word[3] for word in row)
+            # Word boxes include ascent and descent, so half a row of space is already a blank line
+            gap = previous_bottom is not None and top - previous_bottom > (bottom - top) / 2
+            previous_bottom = bottom
+
+            if self._current and self._current["anchor"] and not self._current["anchor"][2]:
+                # Levels wrapped onto the next line of flowing text
+                while row and LO_TOKEN.match(row[0][4]):
+                    self._current["anchor"][2].append(row.pop(0)[4])
+                if not row:
+                    continue
+                anchor = _find_anchor(row)
+                first = row[0]
+
+            # A number cell that is not just the marks of the row (a wrapped "... 5 CO1 L2")
+            numbered = (NUMBER_TOKEN.match(first[4]) is not None and len(row) > 1
+                        and (anchor is None or anchor[0] > 1)
+                        and (self._number_x is None or first[0] <= self._number_x + _NUMBER_COLUMN_SLACK))
+            finished = self._current is not None and self._current["anchor"] is not None
+            if numbered or finished and (gap or anchor):
+                # A numbered row, or a new block or set of marks after a complete question (a sub-question)
+                if finished:
+                    done.append(self._finish_current())
+                self._current = {"words": [], "anchor": None, "x": first[0] if numbered else None}
+                cells = row[1:] if numbered else row
+            elif self._current is None:
+                continue
+            else:
+                cells = row
+
+            if anchor:
+                # Text stops where the marks column starts
+                cells = [word for word in cells if word[0] < row[anchor[0]][0]]
+                if self._current["anchor"] is None:
+                    marks, co, lo = anchor[1:]
+                    words = self._current["words"]
+                    if marks == "N/A" and not cells and words and MARKS_TOKEN.match(words[-1]):
+                        # Marks that ended the previous line of flowing text
+                        marks = MARKS_TOKEN.match(words.pop()).group(1)
+                    self._current["anchor"] = [marks, co, lo]
+                    if self._current["x"] is not None:
+                        self._number_x = self._current["x"]
+            self._current["words"].extend(word[4] for word in cells)
+        return done
+
+    def _finish_current(self):
+        marks, co, lo = self._current["anchor"]
+        question = _question(self._current["words"], marks, co, lo)
+        self._current = None
+        return question
+
+    def feed_text(self, text):
+        """
+        Parse one page of plain text
+
+        Returns:
+            list: Questions completed by this page
+        """
+        done = self._flush_words()
+        for token in text.split():
+            if self._pending_text is not None:
+                if LO_TOKEN.match(token):
+                    self._pending_text[3].append(token)
+                    continue
+                done.append(_question(*self._pending_text))
+                self._pending_text = None
+
+            marks_match = MARKS_TOKEN.match(self._tokens[-1]) if self._tokens else None
+            if marks_match and CO_TOKEN.match(token):
+                self._tokens.pop()
+                marks = marks_match.group(1)
+                body = self._tokens
+                start = next((i for i, word in enumerate(body) if NUMBER_TOKEN.match(word)), None)
+                words = body[start + 1:] if start is not None else body
+                self._pending_text = (words, marks, token, [])
+                self._tokens = []
+            else:
+                self._tokens.append(token)
+                if len(self._tokens) > 2 * _MAX_PENDING_TOKENS:
+                    del self._tokens[:-_MAX_PENDING_TOKENS]
+        return done
+
+    def finish(self):
+        """
+        Return the questions still open at the end of the document
+        """
+        return self._flush_text() + self._flush_words()
+
+    def _flush_words(self):
+        if self._current and self._current["anchor"]:
+            return [self._finish_current()]
+        self._current = None
+        return []
+
+    def _flush_text(self):
+        done = []
+        if self._pending_text is not None:
+            done.append(_question(*self._pending_text))
+            self._pending_text = None
+        self._tokens = []
+        return done
+
+
+def iter_questions(pages):
+    """
+    Yield questions as soon as the pages that contain them have been read
+
+    Args:
+        pages (Iterable): Page texts, or lists of positioned words as
+            produced by pdf_extractor.iter_pages(..., words=True)
+
+    Yields:
+        dict: question, marks, co and lo of each question
+    """
+    parser = QuestionParser()
+    for page in pages:
+        if isinstance(page, str):
+            yield from parser.feed_text(page)
+        else:
+            yield from parser.feed_words(page)
+    yield from parser.finish()
+
+
+def extract_questions(text):
+    """
+    Find all questions in the text of a question paper
+
+    Returns:
+        list: Dicts with question, marks, co and lo
+    """
+    questions = list(iter_questions([text]))
+    logger.debug(f"Extracted questions: {questions}")
+    return questions
@@ -0,0 +1,197 @@
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from services.document_generator import render_document
+
+logger = logging.getLogger(__name__)
+
+# Extra time the caller waits beyond the worker's own timeout before giving up on it
+_RESULT_GRACE = 5.0
+
+# Cancellation flags shared with the worker processes, one per queue slot
+_cancel_flags = None
+
+
+class RenderError(Exception):
+    """Base class for render pool errors"""
+
+
+class RenderQueueFull(RenderError):
+    """Too many renders are already queued or running"""
+
+
+class RenderCancelled(RenderError):
+    """The render was cancelled before it finished"""
+
+
+class RenderTimeout(RenderError):
+    """The render took longer than the pool's timeout"""
+
+
+def _init_worker(flags):
+    global _cancel_flags
+    _cancel_flags = flags
+
+
+def _on_alarm(signum, frame):
+    raise RenderTimeout("Rendering took too long")
+
+
+def _render_job(content, slot, timeout):
+    def check_cancelled(canvas, doc):
+        if _cancel_flags[slot]:
+            raise RenderCancelled("Rendering was cancelled")
+
+    # Tasks run on the worker's main thread, so an alarm can interrupt a render that hangs
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return render_document(content, on_page=check_cancelled)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class RenderPool:
+    """
+    Renders assignment PDFs on a pool of worker processes
+
+    At most max_pending renders may be queued or running; further submits
+    fail fast with RenderQueueFull instead of piling up. Each render has a
+    slot with a cancellation flag that the worker checks after every page,
+    so cancel() stops renders that are already running, not only queued ones.
+    Workers are started from a clean server process on first use.
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        """
+        Args:
+            workers (int): Worker processes
+            max_pending (int): Renders allowed to be queued or running at once
+            timeout (float): Seconds a single render may take
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._context = multiprocessing.get_context("forkserver")
+        self._flags = self._context.Array('b', max_pending, lock=False)
+        self._free_slots = list(range(max_pending))
+        self._jobs = {}  # key -> {future: slot}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {"rendered": 0, "rejected": 0, "cancelled": 0, "timeouts": 0, "failed": 0}
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context,
+                                                 initializer=_init_worker, initargs=(self._flags,))
+        return self._executor
+
+    def submit(self, key, content):
+        """
+        Queue a render
+
+        Args:
+            key (Hashable): Owner of the render, e.g. a chat id, used by cancel()
+            content (str): Solution text for render_document
+
+        Returns:
+            Future: Resolves to the PDF bytes
+
+        Raises:
+            RenderQueueFull: If max_pending renders are already queued or running
+        """
+        with self._lock:
+            if not self._free_slots:
+                self._stats["rejected"] += 1
+                raise RenderQueueFull(f"{self.max_pending} renders already pending")
+            slot = self._free_slots.pop()
+            self._flags[slot] = 0
+            future = self._get_executor().submit(_render_job, content, slot, self.timeout)
+            self._jobs.setdefault(key, {})[future] = slot
+        future.add_done_callback(lambda done: self._release(key, done))
+        return future
+
+    def render(self, key, content):
+        """
+        Render content and wait for the result
+
+        Returns:
+            bytes: The PDF file
+
+        Raises:
+            RenderQueueFull: If the pool is saturated
+            RenderCancelled: If cancel(key) was called before the render finished
+            RenderTimeout: If the render took longer than the pool's timeout
+        """
+        future = self.submit(key, content)
+        try:
+            return future.result(timeout=self.timeout + _RESULT_GRACE)
+        except CancelledError:
+            raise RenderCancelled("Rendering was cancelled")
+        except FutureTimeoutError:
+            self._cancel_future(key, future)
+            raise RenderTimeout("Rendering took too long")
+
+    def cancel(self, key):
+        """
+        Cancel all queued and running renders for key
+
+        Returns:
+            bool: True if there was anything to cancel
+        """
+        with self._lock:
+            futures = list(self._jobs.get(key, {}))
+        for future in futures:
+            self._cancel_future(key, future)
+        return bool(futures)
+
+    def stats(self):
+        """
+        Return counters and the number of pending renders
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = self.max_pending - len(self._free_slots)
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cancel_future(self, key, future):
+        # Queued renders are dropped; running ones stop at their next page
+        if not future.cancel():
+            with self._lock:
+                slot = self._jobs.get(key, {}).get(future)
+                if slot is not None:
+                    self._flags[slot] = 1
+
+    def _release(self, key, future):
+        with self._lock:
+            jobs = self._jobs.get(key, {})
+            slot = jobs.pop(future, None)
+            if not jobs:
+                self._jobs.pop(key, None)
+            if slot is not None:
+                self._free_slots.append(slot)
+
+            if future.cancelled():
+                self._stats["cancelled"] += 1
+                return
+            error = future.exception()
+            if error is None:
+                self._stats["rendered"] += 1
+            elif isinstance(error, RenderCancelled):
+                self._stats["cancelled"] += 1
+            elif isinstance(error, RenderTimeout):
+                self._stats["timeouts"] += 1
+            else:
+                self._stats["failed"] += 1
+                logger.error(f"Render failed: {str(error)}")
@@ -0,0 +1,227 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+
+from together import error as together_error
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """Base class for errors raised by model calls"""
+
+
+class LLMRequestError(LLMError):
+    """The request was rejected and retrying it will not help"""
+
+
+class LLMTimeoutError(LLMError):
+    """The upstream call timed out"""
+
+
+class LLMRateLimitError(LLMError):
+    """The provider is throttling us"""
+
+
+class LLMUnavailableError(LLMError):
+    """The provider could not be reached or returned a server error"""
+
+
+class LLMCircuitOpenError(LLMUnavailableError):
+    """Calls are failing fast because the provider has been failing"""
+
+
+# Errors worth retrying: they are likely to succeed a little later
+TRANSIENT_ERRORS = (LLMTimeoutError, LLMRateLimitError, LLMUnavailableError)
+
+
+def classify_error(exc):
+    """
+    Map an exception raised by the Together SDK to an LLMError
+
+    Args:
+        exc (Exception): The exception raised by the upstream call
+
+    Returns:
+        LLMError: Typed error with the original exception as its cause
+    """
+    if isinstance(exc, LLMError):
+        return exc
+    if isinstance(exc, together_error.Timeout):
+        error = LLMTimeoutError(str(exc))
+    elif isinstance(exc, together_error.RateLimitError):
+        error = LLMRateLimitError(str(exc))
+    elif isinstance(exc, (together_error.APIConnectionError, together_error.ServiceUnavailableError,
+                          together_error.APIError, OSError)):
+        error = LLMUnavailableError(str(exc))
+    else:
+        error = LLMRequestError(str(exc))
+    error.__cause__ = exc
+    return error
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the upstream is down
+
+    After failure_threshold consecutive transient failures the breaker opens and
+    rejects calls for reset_timeout seconds. It then lets a single trial call
+    through; success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def before_call(self):
+        """
+        Raise LLMCircuitOpenError if the call should not be attempted
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                raise LLMCircuitOpenError("The AI service is temporarily unavailable. Please try again in a moment.")
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Circuit breaker closed, upstream calls are succeeding again")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_neutral(self):
+        """
+        Record a call that says nothing about the upstream's health, e.g. a rejected request
+
+        The failure count and open state are kept; a trial call in progress is released.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit breaker opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_timeout else "open"
+
+
+class LatencyTracker:
+    """
+    Rolling window of call latencies used to decide when to hedge
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """
+        Return the pct-th percentile latency, or None until enough samples exist
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """
+    Exponential backoff with full jitter for the given (0-based) retry attempt
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_retries(fn, breaker, retries, base_delay, max_delay):
+    """
+    Call fn, retrying transient failures with jittered exponential backoff
+
+    Args:
+        fn (Callable[[], Any]): The call to make
+        breaker (CircuitBreaker): Breaker guarding the upstream
+        retries (int): Number of retries after the first attempt
+        base_delay (float): Backoff before the first retry, in seconds
+        max_delay (float): Upper bound for a single backoff
+
+    Returns:
+        Any: The result of fn
+
+    Raises:
+        LLMError: The typed error of the last attempt
+    """
+    for attempt in range(retries + 1):
+        breaker.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            error = classify_error(e)
+            if not isinstance(error, TRANSIENT_ERRORS):
+                # A request the provider rejected says nothing about whether it is up
+                breaker.record_neutral()
+                raise error
+            breaker.record_failure()
+            if attempt == retries:
+                raise error
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"Transient LLM error ({type(error).__name__}: {error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+def hedged_call(executor, fn, hedge_after):
+    """
+    Call fn and, if it has not finished after hedge_after seconds, race a second call
+
+    Args:
+        executor (Executor): Pool to run the calls on
+        fn (Callable[[], Any]): The call to make
+        hedge_after (float): Seconds to wait before hedging; None disables hedging
+
+    Returns:
+        Any: The result of whichever call succeeds first
+    """
+    if hedge_after is None:
+        return fn()
+    first = executor.submit(fn)
+    try:
+        return first.result(timeout=hedge_after)
+    except FutureTimeoutError:
+        pass
+
+    logger.debug(f"LLM call slower than {hedge_after:.1f}s, sending a hedged request")
+    second = executor.submit(fn)
+    done, pending = wait([first, second], return_when=FIRST_COMPLETED)
+    for future in done:
+        if future.exception() is None:
+            return future.result()
+    # The call that finished first failed, so the answer depends on the other one
+    for future in pending:
+        return future.result()
+    return first.result()
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache for model responses with per-entry TTL
+
+    Entries are evicted when they expire, when there are more than max_entries
+    of them, or when keys and values together take more than max_bytes. If a
+    path is given the cache is loaded from and saved to that JSON file, so it
+    survives restarts. The file is rewritten on every set(), or, with
+    autosave=False, only when flush() is called.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=4 * 1024 * 1024, default_ttl=3600, path=None, autosave=True):
+        """
+        Args:
+            max_entries (int): Maximum number of cached responses
+            max_bytes (int): Maximum size of all keys and values in bytes
+            default_ttl (float): Seconds an entry lives when set() gets no ttl
+            path (str): Optional JSON file used to persist the cache
+            autosave (bool): Save after every set(); if False, callers batch saves with flush()
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.path = path
+        self.autosave = autosave
+        self._dirty = False
+
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+        if path:
+            self._load()
+
+    @staticmethod
+    def _entry_size(key, value):
+        return len(key.encode('utf-8')) + len(value.encode('utf-8'))
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None if it is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Cache value under key for ttl seconds (default_ttl if not given)
+        """
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            logger.debug(f"Not caching response of {size} bytes, larger than the cache")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + (self.default_ttl if ttl is None else ttl))
+            self._size += size
+            self._evict()
+            self._dirty = True
+
+        if self.path and self.autosave:
+            self._save()
+
+    def flush(self):
+        """
+        Save the cache to its file if it changed since the last save
+        """
+        if self.path and self._dirty:
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.path:
+            self._save()
+
+    def stats(self):
+        """
+        Return hit/miss/eviction counters and the current size of the cache
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._size -= self._entry_size(key, value)
+
+    def _evict(self):
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]:
+            self._remove(key)
+            self._stats["expirations"] += 1
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable response cache {self.path}: {str(e)}")
+            return
+
+        now = time.time()
+        with self._lock:
+            # Entries are stored least recently used first
+            for key, value, expires_at in data.get("entries", []):
+                if expires_at > now:
+                    self._entries[key] = (value, expires_at)
+                    self._size += self._entry_size(key, value)
+            self._evict()
+        logger.debug(f"Loaded {len(self._entries)} cached responses from {self.path}")
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        # The snapshot is taken under _save_lock, so saves reach the file in the order their snapshots were taken
+        with self._save_lock:
+            with self._lock:
+                entries = [[key, value, expires_at] for key, (value, expires_at) in self._entries.items()]
+                self._dirty = False
+            try:
+                with open(tmp_path, 'w') as file:
+                    json.dump({"entries": entries}, file)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Could not persist response cache to {self.path}: {str(e)}")
+                with self._lock:
+                    self._dirty = True
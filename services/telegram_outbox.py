@@ -0,0 +1,330 @@
+import functools
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+
+from telebot.apihelper import ApiTelegramException
+
+from config import (TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_GROUP_RATE, TELEGRAM_CHAT_BURST,
+                    TELEGRAM_SEND_WORKERS, TELEGRAM_SEND_RETRIES, TELEGRAM_SEND_TIMEOUT)
+from services.llm_scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+# Bot methods paced by the outbox, with the position of their chat_id argument
+PACED_METHODS = {
+    "send_message": 0,
+    "send_photo": 0,
+    "send_document": 0,
+    "edit_message_text": 1,
+}
+
+# Idle chats whose rate limit state is remembered
+_MAX_TRACKED_CHATS = 1024
+
+# Boundaries tried in order when a long text has to be split; a cut is only
+# used if it keeps at least half of the allowed length in the first part
+_SPLIT_BOUNDARIES = (
+    re.compile(r'\n\s*\n'),
+    re.compile(r'\n'),
+    re.compile(r'(?<=[.!?])\s+'),
+    re.compile(r'\s+'),
+)
+
+
+def split_point(text, limit=MAX_MESSAGE_LENGTH):
+    """
+    Return where to cut text so that the first part has at most limit characters
+
+    Prefers the last paragraph break that fits, then line break, sentence
+    end and word boundary, and only cuts inside a word as a last resort.
+    """
+    if len(text) <= limit:
+        return len(text)
+    window = text[:limit + 1]
+    for boundary in _SPLIT_BOUNDARIES:
+        matches = [m for m in boundary.finditer(window) if m.start() >= limit // 2]
+        if matches:
+            return matches[-1].start()
+    return limit
+
+
+def split_text(text, limit=MAX_MESSAGE_LENGTH):
+    """
+    Split text into parts of at most limit characters, see split_point
+
+    Args:
+        text (str): Text to split
+        limit (int): Maximum length of each part
+
+    Returns:
+        list: Parts in order, without leading or trailing whitespace at the cuts
+    """
+    parts = []
+    while len(text) > limit:
+        cut = split_point(text, limit)
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text.strip():
+        parts.append(text.rstrip())
+    return parts
+
+
+def retry_after(error):
+    """
+    Return the seconds Telegram asked us to wait, or None if error is not a 429
+    """
+    if not isinstance(error, ApiTelegramException) or error.error_code != 429:
+        return None
+    return float((error.result_json.get("parameters") or {}).get("retry_after", 1))
+
+
+class _Job:
+    def __init__(self, fn, args, kwargs, text=None, parse_mode=None):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # Set for fire-and-forget text, which may be merged with its neighbours
+        self.text = text
+        self.parse_mode = parse_mode
+        self.future = Future()
+        self.attempts = 0
+
+
+class _Chat:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.jobs = []
+        self.scheduled = False
+        self.busy = False
+
+
+class TelegramOutbox:
+    """
+    Central queue for messages going out to Telegram
+
+    Calls are queued per chat and sent by a few worker threads. Each chat has
+    its own token bucket (Telegram allows about one message per second in a
+    private chat and 20 per minute in a group) and all chats share a global
+    bucket. Messages to one chat keep their order. A 429 pauses the chat for
+    the retry_after Telegram returns and the call is retried.
+
+    Once attached, the bot's send and edit methods go through the outbox and
+    still return their result to the caller; a call not made within
+    send_timeout is dropped and raises TimeoutError. send_text() is
+    fire-and-forget, for callers that do not need the sent Message: long
+    text is split and consecutive small texts to the same chat are merged
+    into one message while they wait.
+    """
+
+    def __init__(self, global_rate, chat_rate, group_rate, chat_burst=3, workers=4, max_retries=3,
+                 send_timeout=60):
+        """
+        Args:
+            global_rate (float): Messages per second across all chats
+            chat_rate (float): Messages per second in a private chat
+            group_rate (float): Messages per second in a group chat
+            chat_burst (int): Messages a chat may receive back to back
+            workers (int): Threads making Telegram calls
+            max_retries (int): Retries of a call after 429s before giving up
+            send_timeout (float): Seconds a paced call waits for its result
+        """
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self.max_retries = max_retries
+        self.send_timeout = send_timeout
+
+        self._global = TokenBucket(global_rate, max(1.0, global_rate))
+        self._chats = OrderedDict()  # chat_id -> _Chat, least recently used first
+        self._ready = []  # (ready_at, seq, chat_id) for chats with jobs that no worker holds
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._send_message = None
+        self._started = False
+        self._stats = {"sent": 0, "coalesced": 0, "rate_limited": 0, "failed": 0}
+
+    def attach(self, bot):
+        """
+        Route the bot's PACED_METHODS through the outbox and start the workers
+        """
+        for name, chat_arg in PACED_METHODS.items():
+            original = getattr(bot, name)
+            setattr(bot, name, self._paced(original, chat_arg))
+            if name == "send_message":
+                self._send_message = original
+        with self._cond:
+            if not self._started:
+                self._started = True
+                for i in range(self.workers):
+                    threading.Thread(target=self._work, name=f"telegram-outbox-{i}", daemon=True).start()
+
+    def send_text(self, chat_id, text, parse_mode=None):
+        """
+        Queue text for chat_id without waiting for it to be sent
+
+        Args:
+            chat_id (int): Chat to send to
+            text (str): Text of any length; it is split on paragraph and sentence boundaries
+            parse_mode (str): Telegram parse mode, e.g. "Markdown"
+
+        Returns:
+            list: One Future per part, resolving to the sent Message (or the
+            Message of the merged message it became part of)
+        """
+        jobs = [_Job(None, (), {}, text=part, parse_mode=parse_mode) for part in split_text(text)]
+        for job in jobs:
+            self._enqueue(chat_id, job)
+        return [job.future for job in jobs]
+
+    def stats(self):
+        """
+        Return send counters and the number of queued calls
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued"] = sum(len(chat.jobs) for chat in self._chats.values())
+            stats["active_chats"] = sum(1 for chat in self._chats.values() if chat.jobs or chat.busy)
+        return stats
+
+    def _paced(self, fn, chat_arg):
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            chat_id = args[chat_arg] if len(args) > chat_arg else kwargs.get("chat_id")
+            if chat_id is None:
+                # Inline message edits have no chat to pace against
+                return fn(*args, **kwargs)
+            job = _Job(fn, args, kwargs)
+            self._enqueue(chat_id, job)
+            try:
+                return job.future.result(timeout=self.send_timeout)
+            except TimeoutError:
+                # Drop it unless a worker is already sending it
+                job.future.cancel()
+                logger.error(f"Gave up waiting for {fn.__name__} to chat {chat_id} after {self.send_timeout}s")
+                raise
+        return call
+
+    def _enqueue(self, chat_id, job):
+        with self._cond:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+                chat = self._chats[chat_id] = _Chat(TokenBucket(rate, self.chat_burst))
+                self._prune()
+            self._chats.move_to_end(chat_id)
+            chat.jobs.append(job)
+            if not chat.scheduled and not chat.busy:
+                self._schedule(chat_id, chat, time.monotonic())
+
+    def _prune(self):
+        while len(self._chats) > _MAX_TRACKED_CHATS:
+            chat_id, chat = next(iter(self._chats.items()))
+            if chat.jobs or chat.busy:
+                break
+            del self._chats[chat_id]
+
+    def _schedule(self, chat_id, chat, ready_at):
+        chat.scheduled = True
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+        self._cond.notify()
+
+    def _take(self):
+        """
+        Wait for a chat that may be sent to now and take its next message
+        """
+        with self._cond:
+            while True:
+                if not self._ready:
+                    self._cond.wait()
+                    continue
+                ready_at, _, chat_id = self._ready[0]
+                now = time.monotonic()
+                if ready_at > now:
+                    self._cond.wait(ready_at - now)
+                    continue
+                heapq.heappop(self._ready)
+                chat = self._chats[chat_id]
+                chat.scheduled = False
+                self._drop_cancelled(chat)
+                if not chat.jobs:
+                    continue
+                # Peek at the global bucket first so a chat token is not spent on a message that cannot go out
+                wait = self._global.wait_time() or chat.bucket.try_take()
+                if wait:
+                    self._schedule(chat_id, chat, now + wait)
+                    continue
+                self._global.try_take()
+                chat.busy = True
+                return chat_id, chat, self._pop_jobs(chat)
+
+    def _drop_cancelled(self, chat):
+        # Paced calls whose caller timed out; retried jobs are already running and stay
+        chat.jobs = [job for job in chat.jobs if job.future.running() or job.future.set_running_or_notify_cancel()]
+
+    def _pop_jobs(self, chat):
+        first = chat.jobs.pop(0)
+        jobs = [first]
+        if first.text is None:
+            return jobs
+        length = len(first.text)
+        while chat.jobs:
+            job = chat.jobs[0]
+            if job.text is None or job.parse_mode != first.parse_mode or length + 2 + len(job.text) > MAX_MESSAGE_LENGTH:
+                break
+            length += 2 + len(job.text)
+            jobs.append(chat.jobs.pop(0))
+        self._stats["coalesced"] += len(jobs) - 1
+        return jobs
+
+    def _work(self):
+        while True:
+            chat_id, chat, jobs = self._take()
+            delay = 0
+            try:
+                if jobs[0].text is None:
+                    result = jobs[0].fn(*jobs[0].args, **jobs[0].kwargs)
+                else:
+                    text = "\n\n".join(job.text for job in jobs)
+                    result = self._send_message(chat_id, text, parse_mode=jobs[0].parse_mode)
+            except Exception as e:
+                delay = retry_after(e)
+                jobs[0].attempts += 1
+                if delay is not None and jobs[0].attempts <= self.max_retries:
+                    logger.warning(f"Telegram rate limit for chat {chat_id}, retrying in {delay}s")
+                    with self._cond:
+                        self._stats["rate_limited"] += 1
+                        chat.jobs[:0] = jobs
+                else:
+                    if jobs[0].text is not None:
+                        # Nobody waits on queued text, so this is the only place the failure shows up
+                        logger.error(f"Could not send queued text to chat {chat_id}: {str(e)}")
+                    with self._cond:
+                        self._stats["failed"] += len(jobs)
+                    for job in jobs:
+                        job.future.set_exception(e)
+                    delay = 0
+            else:
+                with self._cond:
+                    self._stats["sent"] += 1
+                for job in jobs:
+                    job.future.set_result(result)
+
+            with self._cond:
+                chat.busy = False
+                if chat.jobs:
+                    self._schedule(chat_id, chat, time.monotonic() + delay)
+
+
+outbox = TelegramOutbox(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_GROUP_RATE, chat_burst=TELEGRAM_CHAT_BURST,
+                        workers=TELEGRAM_SEND_WORKERS, max_retries=TELEGRAM_SEND_RETRIES,
+                        send_timeout=TELEGRAM_SEND_TIMEOUT)
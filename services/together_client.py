@@ -0,0 +1,98 @@
+import logging
+import threading
+
+import requests
+import together
+from requests.adapters import HTTPAdapter
+from together import Together
+
+from config import TOGETHER_API_KEY, TOGETHER_BASE_URL, TOGETHER_POOL_SIZE, TOGETHER_TIMEOUT, TOGETHER_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+
+
+class _SharedSession(requests.Session):
+    """
+    requests.Session shared by every thread that talks to the Together API.
+
+    The Together SDK keeps one session per thread and periodically calls close()
+    on it. Because this session is shared, close() is a no-op and the pool is
+    only torn down through shutdown().
+    """
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        super().close()
+
+
+def _build_session(pool_size):
+    session = _SharedSession()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """
+    Return the process-wide keep-alive session used for Together API calls
+
+    Returns:
+        requests.Session: Session with a connection pool of TOGETHER_POOL_SIZE
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session(TOGETHER_POOL_SIZE)
+                # The SDK picks this up instead of creating a session per thread
+                together.requestssession = _session
+                logger.debug(f"Created shared Together session with pool size {TOGETHER_POOL_SIZE}")
+    return _session
+
+
+def get_client(timeout=None):
+    """
+    Return a Together client that reuses the shared connection pool
+
+    Clients are cached per timeout, so callers can ask for a shorter or longer
+    timeout without paying for new connections.
+
+    Args:
+        timeout (float): Request timeout in seconds, defaults to TOGETHER_TIMEOUT
+
+    Returns:
+        Together: Thread-safe Together client
+    """
+    if timeout is None:
+        timeout = TOGETHER_TIMEOUT
+
+    client = _clients.get(timeout)
+    if client is None:
+        get_session()
+        with _lock:
+            client = _clients.get(timeout)
+            if client is None:
+                client = Together(api_key=TOGETHER_API_KEY, base_url=TOGETHER_BASE_URL, timeout=timeout,
+                                  max_retries=TOGETHER_MAX_RETRIES)
+                _clients[timeout] = client
+    return client
+
+
+def close_session():
+    """
+    Close all pooled connections and drop cached clients
+    """
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.shutdown()
+            _session = None
+            together.requestssession = None
+        _clients.clear()
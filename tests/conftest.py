@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# config.py requires the tokens; keep every store in memory or in a scratch directory
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test")
+os.environ.setdefault("TOGETHER_API_KEY", "test")
+for name in ("RESPONSE_CACHE_PATH", "OCR_CACHE_PATH", "ANSWER_STORE_PATH", "JOB_QUEUE_PATH", "CONVERSATION_STORE_PATH"):
+    os.environ.setdefault(name, "")
+os.environ.setdefault("DOC_STORE_DIR", tempfile.mkdtemp(prefix="doc_sessions_"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stubs  # noqa: E402
+
+stubs.install()
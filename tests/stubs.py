@@ -0,0 +1,17 @@
+import sys
+import types
+
+
+class _SheetsLogger:
+    def __init__(self, *args):
+        pass
+
+    def log_interaction(self, *args, **kwargs):
+        pass
+
+
+def install():
+    """
+    Replace the Google Sheets logger, which needs service account credentials, with a no-op
+    """
+    sys.modules["utils.google_sheets_logger"] = types.SimpleNamespace(GoogleSheetsLogger=_SheetsLogger)
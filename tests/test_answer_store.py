@@ -0,0 +1,24 @@
+import pytest
+
+from services.answer_store import AnswerStore
+
+
+def table_totals(store):
+    return tuple(store._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone())
+
+
+def test_counters_follow_a_rolled_back_put(monkeypatch):
+    store = AnswerStore("", ttl=3600, max_entries=10, max_bytes=10000)
+    store.put("What is a stack?", "A LIFO collection.")
+
+    def fail(now):
+        raise RuntimeError("disk full")
+
+    # Replaces the stored answer, then fails before the transaction commits
+    monkeypatch.setattr(store, "_evict", fail)
+    with pytest.raises(RuntimeError):
+        store.put("What is a stack?", "A last-in, first-out collection of items.")
+
+    stats = store.stats()
+    assert (stats["entries"], stats["bytes"]) == table_totals(store)
+    assert store.get("What is a stack?") == "A LIFO collection."
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from handlers import assignment_solver
+from services.job_queue import JobCancelled
+
+
+def question(text, marks=10):
+    return {"question": text, "marks": str(marks), "co": "CO1", "lo": "LO1"}
+
+
+def test_answering_starts_before_extraction_finishes(monkeypatch):
+    first_answered = threading.Event()
+
+    def answer_batch(batch, user_id=None):
+        first_answered.set()
+        return [f"answer to {q['question']}" for q in batch]
+
+    monkeypatch.setattr(assignment_solver, "answer_batch", answer_batch)
+    seen_before_second = []
+
+    def extracted():
+        yield question("What does a streaming extractor buy us?")
+        seen_before_second.append(first_answered.wait(timeout=5))
+        yield question("Why not read the whole paper first?")
+
+    answers = assignment_solver.generate_answers(extracted())
+    assert seen_before_second == [True]
+    assert answers == ["answer to What does a streaming extractor buy us?",
+                       "answer to Why not read the whole paper first?"]
+
+
+class FakeJob:
+    owner = 1
+    cancelled = False
+
+
+def test_render_waits_for_a_free_slot(monkeypatch):
+    attempts = []
+
+    def render(key, content):
+        attempts.append(key)
+        if len(attempts) < 3:
+            raise assignment_solver.RenderQueueFull("full")
+        return b"%PDF"
+
+    monkeypatch.setattr(assignment_solver.render_pool, "render", render)
+    monkeypatch.setattr(assignment_solver, "_RENDER_SLOT_POLL", 0)
+    assert assignment_solver.render_when_free(FakeJob(), "solution") == b"%PDF"
+    assert len(attempts) == 3
+
+
+def test_cancelled_paper_stops_sending_batches(monkeypatch):
+    answered = []
+    first_answered = threading.Event()
+
+    def answer_batch(batch, user_id=None):
+        answered.extend(q["question"] for q in batch)
+        first_answered.set()
+        return ["answer"] * len(batch)
+
+    monkeypatch.setattr(assignment_solver, "answer_batch", answer_batch)
+
+    def extracted():
+        yield question("Long question number 0 about cancelled papers?")
+        # The user cancels while the rest of the paper is being read
+        first_answered.wait(timeout=5)
+        for i in range(1, 60):
+            yield question(f"Long question number {i} about cancelled papers?")
+
+    with pytest.raises(JobCancelled):
+        assignment_solver.generate_answers(extracted(), cancelled=lambda: bool(answered))
+    assert answered == ["Long question number 0 about cancelled papers?"]
@@ -0,0 +1,33 @@
+import io
+import zipfile
+
+from services import bulk_email
+
+HEADER = "Name,Year,College,Branch,Skills,Company,Recipient,Role\n"
+
+
+def csv_file(rows):
+    return io.BytesIO((HEADER + "".join(f"Student {i},3,IIT,CSE,Python,Acme,Dana,Intern\n" for i in range(rows))).encode())
+
+
+def test_rows_past_the_limit_are_not_turned_into_emails(monkeypatch):
+    generated = []
+
+    def generate_cold_email(**fields):
+        generated.append(fields["name"])
+        return f"Dear {fields['recipient_name']}"
+
+    monkeypatch.setattr(bulk_email, "generate_cold_email", generate_cold_email)
+    bundle, summary = bulk_email.build_cold_email_bundle(csv_file(5), bundle_format="csv", max_rows=3)
+    assert generated == ["Student 0", "Student 1", "Student 2"]
+    assert summary["generated"] == 3
+    assert summary["truncated"]
+    assert len(bundle.read().decode().splitlines()) == 4
+
+
+def test_a_csv_at_the_limit_is_not_truncated():
+    bundle, summary = bulk_email.build_cold_email_bundle(csv_file(3), max_rows=3)
+    assert summary["generated"] == 3
+    assert not summary["truncated"]
+    with zipfile.ZipFile(bundle) as archive:
+        assert archive.namelist() == [bulk_email.ZIP_BUNDLE_MEMBER]
@@ -0,0 +1,35 @@
+import os
+
+from services import document_store
+from services.document_store import DocumentSessionStore
+
+
+def spilled_store(spill_dir):
+    store = DocumentSessionStore(max_bytes=1 << 20, idle_ttl=0, spill_dir=str(spill_dir))
+    # With no idle time allowed the session goes straight to disk
+    store.put(7, {"chunks": ["some text"]})
+    assert store.stats()["spilled_sessions"] == 1
+    return store
+
+
+def test_membership_is_answered_without_touching_the_disk(tmp_path, monkeypatch):
+    store = spilled_store(tmp_path)
+
+    def no_disk(*args, **kwargs):
+        raise AssertionError("looked at the disk")
+
+    monkeypatch.setattr(document_store.os, "stat", no_disk)
+    monkeypatch.setattr(document_store.os.path, "getmtime", no_disk)
+    assert 7 in store
+    assert 8 not in store
+
+
+def test_sessions_spilled_before_a_restart_are_found(tmp_path):
+    spilled_store(tmp_path)
+    store = DocumentSessionStore(max_bytes=1 << 20, idle_ttl=3600, spill_dir=str(tmp_path))
+    assert 7 in store
+    assert store.get(7) == {"chunks": ["some text"]}
+    assert 7 in store
+    assert store.pop(7)
+    assert 7 not in store
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,33 @@
+import pytest
+
+from services.generation_profiles import GENERATION_PROFILES, get_profile
+
+# A short answer after which the model went on to invent the next question and its answer
+RUN_ON = ("A stack is a LIFO collection.\n### Answer 2:\nA queue is a FIFO collection.\n"
+          "### Question 3: What is a deque?")
+
+
+def generate(profile, completion):
+    # What the API returns: the completion up to the first stop sequence
+    cut = min((i for i in (completion.find(stop) for stop in get_profile(profile)["stop"]) if i >= 0),
+              default=len(completion))
+    return completion[:cut]
+
+
+def test_short_answers_stop_at_the_next_answer_header():
+    assert generate("assignment_2mark", RUN_ON) == "A stack is a LIFO collection."
+    # Long answers (and batches, which are split on these headers) keep going
+    assert generate("assignment_10mark", RUN_ON) == RUN_ON
+
+
+def test_document_answers_stop_at_an_invented_follow_up():
+    completion = "The report covers 2023.\nUser question: and 2024?"
+    assert generate("doc_qa", completion) == "The report covers 2023."
+
+
+@pytest.mark.parametrize("name", GENERATION_PROFILES)
+def test_profiles_do_not_share_stop_lists(name):
+    profile = get_profile(name)
+    profile["stop"].append("extra")
+    assert "extra" not in get_profile(name)["stop"]
+    assert "<|eot_id|>" in profile["stop"]
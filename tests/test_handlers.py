@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from telebot import TeleBot, types
+
+from handlers import career, register_handlers, study
+
+
+def photo_message(caption):
+    return types.Message.de_json({
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private", "username": "student"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Student", "username": "student"},
+        "photo": [{"file_id": "resume-photo", "file_unique_id": "r1", "width": 800, "height": 1100}],
+        "caption": caption,
+    })
+
+
+def routed_bot(monkeypatch):
+    bot = TeleBot("42:test", threaded=False)
+    register_handlers(bot)
+    calls = []
+    monkeypatch.setattr(bot, "get_file", lambda file_id: SimpleNamespace(file_path="photos/resume.jpg"))
+    monkeypatch.setattr(bot, "download_file", lambda path: b"image bytes")
+    monkeypatch.setattr(bot, "send_chat_action", lambda *args, **kwargs: None)
+    monkeypatch.setattr(bot, "reply_to", lambda message, text, **kwargs: calls.append(("reply", text)))
+    monkeypatch.setattr(career, "ocr_image", lambda image: calls.append(("ocr", image)) or "Jane Doe, Python")
+    monkeypatch.setattr(career, "process_image_and_text", lambda *args, **kwargs: "Looks good")
+    monkeypatch.setattr(study, "process_image", lambda image: calls.append(("flux", image)) or "An image")
+    return bot, calls
+
+
+def test_captioned_resume_photo_is_read_with_ocr(monkeypatch):
+    bot, calls = routed_bot(monkeypatch)
+    bot.process_new_messages([photo_message("Analyze resume: data scientist")])
+    assert ("ocr", b"image bytes") in calls
+    assert not any(kind == "flux" for kind, _ in calls)
+
+
+def test_other_photos_still_go_to_the_study_assistant(monkeypatch):
+    bot, calls = routed_bot(monkeypatch)
+    bot.process_new_messages([photo_message("what is this diagram?")])
+    assert ("flux", b"image bytes") in calls
+    assert not any(kind == "ocr" for kind, _ in calls)
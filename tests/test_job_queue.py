@@ -0,0 +1,27 @@
+from services.job_queue import JobQueue
+
+
+def test_advance_shows_the_new_state_and_resumes_there():
+    jobs = JobQueue("", workers=1, max_attempts=3, retention=3600)
+    seen = []
+    runs = {"reading": 0, "answering": 0}
+
+    def read(job):
+        runs["reading"] += 1
+        seen.append(jobs.status(job.owner)[0]["state"])
+        job.advance("answering")
+        seen.append(jobs.status(job.owner)[0]["state"])
+        # Fails after the paper was read: the retry must not read it again
+        raise RuntimeError("model unavailable")
+
+    def answer(job):
+        runs["answering"] += 1
+
+    jobs.register("paper", [("reading", read), ("answering", answer)])
+    job_id = jobs.submit("paper", 1, {})
+    jobs._run(job_id)
+    jobs._run(job_id)
+
+    assert seen == ["reading", "answering"]
+    assert runs == {"reading": 1, "answering": 1}
+    assert jobs.status(1)[0]["state"] == "delivered"
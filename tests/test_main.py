@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports main.py the way a forkserver or spawn worker process does, and reports the threads that appeared
+_IMPORT_AS_WORKER = """
+import json, sys, threading
+from multiprocessing import spawn
+sys.path.insert(0, "tests")
+import stubs
+stubs.install()
+before = {thread.ident for thread in threading.enumerate()}
+# What spawn and forkserver children run before unpickling their work
+spawn._fixup_main_from_path("main.py")
+assert sys.modules["__mp_main__"].__name__ == "__mp_main__"
+from handlers.assignment_solver import assignment_jobs
+print(json.dumps({
+    "threads": [thread.name for thread in threading.enumerate() if thread.ident not in before],
+    "job_workers": len(assignment_jobs._threads),
+}))
+"""
+
+
+def test_importing_main_in_a_worker_starts_nothing():
+    result = subprocess.run([sys.executable, "-c", _IMPORT_AS_WORKER], cwd=ROOT, env=dict(os.environ),
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report == {"threads": [], "job_workers": 0}
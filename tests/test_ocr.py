@@ -0,0 +1,43 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from services import ocr
+from services.response_cache import ResponseCache
+
+
+def test_scanned_document_writes_the_cache_file_once(tmp_path, monkeypatch):
+    path = tmp_path / "ocr_cache.json"
+    cache = ResponseCache(path=str(path), autosave=False)
+    saves = []
+    save = cache._save
+    monkeypatch.setattr(cache, "_save", lambda: saves.append(1) or save())
+    monkeypatch.setattr(ocr, "ocr_cache", cache)
+
+    # Stands in for the Tesseract process pool; pages finish only once all of them are submitted
+    release = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(ocr, "_get_pool", lambda: pool)
+    monkeypatch.setattr(ocr, "ocr_image_bytes", lambda image: release.wait() and f"text of {image.decode()}")
+
+    futures = [ocr.submit_ocr(f"ocr:page{i}", lambda i=i: f"page {i}".encode()) for i in range(20)]
+    release.set()
+    wait(futures)
+    pool.shutdown(wait=True)
+
+    assert [future.result() for future in futures] == [f"text of page {i}" for i in range(20)]
+    assert len(saves) == 1
+    assert len(json.loads(path.read_text())["entries"]) == 20
+
+    # Cached pages are served without touching the pool or the file
+    assert ocr.submit_ocr("ocr:page3", lambda: b"unused").result() == "text of page 3"
+    assert len(saves) == 1
+
+
+def test_response_cache_still_saves_on_every_set_by_default(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = ResponseCache(path=str(path))
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert len(json.loads(path.read_text())["entries"]) == 2
+    assert ResponseCache(path=str(path)).get("b") == "2"
@@ -0,0 +1,42 @@
+import os
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from services import pdf_extractor
+
+
+def make_pdf(pages):
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    for number in range(pages):
+        pdf.drawString(40, 800, f"This is page number {number + 1} of the sample paper")
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def test_large_files_are_sent_to_workers_once(monkeypatch):
+    monkeypatch.setattr(pdf_extractor, "PDF_PARALLEL_MIN_PAGES", 8)
+    monkeypatch.setattr(pdf_extractor, "PDF_WORKERS", 2)
+    monkeypatch.setattr(pdf_extractor, "_RANGE_PAGES", 4)
+    pdf_bytes = make_pdf(20)
+
+    pool = pdf_extractor._get_pool()
+    tasks = []
+
+    class RecordingPool:
+        def submit(self, fn, *args):
+            tasks.append(args)
+            return pool.submit(fn, *args)
+
+    monkeypatch.setattr(pdf_extractor, "_get_pool", lambda: RecordingPool())
+    pages = list(pdf_extractor.iter_pages(pdf_bytes))
+
+    assert [page.strip() for page in pages] == [f"This is page number {n} of the sample paper" for n in range(1, 21)]
+    assert len(tasks) == 5
+    # Every range names the same temporary copy, which is gone once the pages are read
+    assert not any(isinstance(arg, bytes) for args in tasks for arg in args)
+    assert len({args[0] for args in tasks}) == 1
+    assert not os.path.exists(tasks[0][0])
@@ -0,0 +1,141 @@
+"""
+Parsing of question papers in the layouts seen in uploads
+
+Each paper is rendered to PDF in one layout (a table with columns,
+questions wrapping over several lines and across page breaks, sub-questions
+with their own marks, plain inline text), extracted through
+services.pdf_extractor and must come back question for question.
+"""
+import random
+from io import BytesIO
+
+import pytest
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from services.pdf_extractor import extract_pdf, iter_pages
+from services.question_extractor import iter_questions
+
+WORDS = ("explain the working of a binary search tree and derive the time complexity of insertion "
+         "deletion and lookup with suitable examples compare it with hashing").split()
+
+
+def make_paper(questions, seed):
+    rng = random.Random(seed)
+    paper = []
+    for number in range(1, questions + 1):
+        parts = 2 if rng.random() < 0.15 else 1
+        for _ in range(parts):
+            paper.append({
+                "number": number,
+                "question": " ".join(rng.choices(WORDS, k=rng.randint(6, 45))),
+                "marks": str(rng.choice((2, 5, 10, 16))),
+                "co": f"CO{rng.randint(1, 5)}",
+                "lo": ",".join(f"L{level}" for level in sorted(rng.sample(range(1, 5), rng.randint(1, 2))))
+            })
+    return paper
+
+
+def wrap(text, width):
+    lines, line = [], []
+    for word in text.split():
+        if line and len(" ".join(line + [word])) > width:
+            lines.append(" ".join(line))
+            line = []
+        line.append(word)
+    return lines + [" ".join(line)]
+
+
+def render_table(paper, width=60, vertical_center=False, label="{}.", by_column=False):
+    """
+    One row per question: number, question wrapped in its column, then marks, CO and LO columns
+
+    With by_column, each page draws its columns one after another, as table
+    exports often do, so the text layer is not in reading order.
+    """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    cells = []
+
+    def new_page():
+        for _, x, y, text in sorted(cells, key=lambda cell: cell[0]) if by_column else cells:
+            pdf.drawString(x, y, text)
+        cells.clear()
+        pdf.showPage()
+
+    pdf.setFont("Helvetica", 9)
+    pdf.drawString(40, 800, "Part A  Answer all questions  Marks  CO  BL")
+    y = 780
+    previous = None
+    for item in paper:
+        lines = wrap(item["question"], width)
+        cells_y = y - (len(lines) - 1) * 6 if vertical_center else y
+        if item["number"] != previous:
+            cells.append((0, 40, y, label.format(item["number"])))
+        previous = item["number"]
+        for line in lines:
+            if y < 60:
+                new_page()
+                pdf.setFont("Helvetica", 9)
+                y = 800
+                cells_y = y
+            cells.append((1, 70, y, line))
+            y -= 12
+        cells.append((2, 400, cells_y, item["marks"]))
+        cells.append((3, 440, cells_y, item["co"]))
+        cells.append((4, 480, cells_y, item["lo"]))
+        y -= 8
+    new_page()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def render_inline(paper):
+    """
+    Each question as one flowing paragraph: "1. question text 5 CO1 L2"
+    """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setFont("Helvetica", 9)
+    y = 800
+    for item in paper:
+        text = f"{item['number']}. {item['question']} {item['marks']} {item['co']} {item['lo']}"
+        for line in wrap(text, 100):
+            if y < 60:
+                pdf.showPage()
+                pdf.setFont("Helvetica", 9)
+                y = 800
+            pdf.drawString(40, y, line)
+            y -= 12
+        y -= 6
+    pdf.save()
+    return buffer.getvalue()
+
+
+PAPER = make_paper(30, seed=1)
+
+LAYOUTS = {
+    "table, bare numbers": lambda: render_table(PAPER, label="{}"),
+    "table, numbered 1.": lambda: render_table(PAPER),
+    "table, numbered Q1": lambda: render_table(PAPER, label="Q{}"),
+    "table, cells centred on rows": lambda: render_table(PAPER, vertical_center=True),
+    "table, drawn column by column": lambda: render_table(PAPER, by_column=True),
+    "inline paragraphs": lambda: render_inline(PAPER),
+}
+
+
+def fields(questions):
+    return [(q["question"], q["marks"], q["co"], q["lo"]) for q in questions]
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_layout_parser_recovers_every_question(layout):
+    pdf_bytes = LAYOUTS[layout]()
+    assert fields(iter_questions(iter_pages(pdf_bytes, words=True))) == fields(PAPER)
+
+
+# Without word positions the columns of a table drawn column by column cannot be put back in reading order
+@pytest.mark.parametrize("layout", [name for name in LAYOUTS if name != "table, drawn column by column"])
+def test_text_parser_recovers_every_question(layout):
+    pdf_bytes = LAYOUTS[layout]()
+    assert fields(iter_questions(extract_pdf(pdf_bytes).pages)) == fields(PAPER)
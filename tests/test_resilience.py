@@ -0,0 +1,85 @@
+import pytest
+
+from services import llama_vision
+from services.resilience import (CircuitBreaker, LLMCircuitOpenError, LLMRequestError, LLMUnavailableError,
+                                 call_with_retries)
+
+
+def open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return breaker
+
+
+def fail(error):
+    def fn():
+        raise error
+    return fn
+
+
+def test_rejected_request_does_not_close_an_open_breaker():
+    breaker = open_breaker()
+    with pytest.raises(LLMRequestError):
+        call_with_retries(fail(LLMRequestError("bad request")), breaker, retries=2, base_delay=0, max_delay=0)
+    assert breaker.state == "half_open"
+    # The trial slot was released, so the next call is let through
+    breaker.before_call()
+
+
+def test_rejected_request_is_not_retried():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise LLMRequestError("bad request")
+
+    with pytest.raises(LLMRequestError):
+        call_with_retries(fn, CircuitBreaker(5, 30), retries=3, base_delay=0, max_delay=0)
+    assert len(calls) == 1
+
+
+def test_success_closes_the_breaker():
+    breaker = open_breaker()
+    assert call_with_retries(lambda: "ok", breaker, retries=0, base_delay=0, max_delay=0) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_abandoned_stream_releases_the_half_open_trial(monkeypatch):
+    breaker = open_breaker()
+    monkeypatch.setattr(llama_vision, "circuit_breaker", breaker)
+    monkeypatch.setattr(llama_vision, "_stream_completion", lambda *args: iter(["Hello", " world"]))
+
+    stream = llama_vision._resilient_stream("prompt", "default", 0, None)
+    assert next(stream) == "Hello"
+    stream.close()
+
+    assert breaker.state == "half_open"
+    breaker.before_call()
+
+
+def test_trial_blocks_other_calls_while_it_runs(monkeypatch):
+    breaker = open_breaker()
+    monkeypatch.setattr(llama_vision, "circuit_breaker", breaker)
+    monkeypatch.setattr(llama_vision, "_stream_completion", lambda *args: iter(["Hello", " world"]))
+
+    stream = llama_vision._resilient_stream("prompt", "default", 0, None)
+    next(stream)
+    with pytest.raises(LLMCircuitOpenError):
+        breaker.before_call()
+    assert "".join(stream) == " world"
+    assert breaker.state == "closed"
+
+
+def test_assignment_answers_are_not_retried_on_top_of_the_client(monkeypatch):
+    from handlers import assignment_solver
+
+    calls = []
+
+    def complete_text(*args, **kwargs):
+        calls.append(1)
+        raise LLMUnavailableError("down")
+
+    monkeypatch.setattr(assignment_solver, "complete_text", complete_text)
+    answer = assignment_solver.answer_question({"question": "What is a stack?", "marks": "2", "co": "CO1", "lo": "L1"})
+    assert answer == assignment_solver.FAILED_ANSWER
+    assert len(calls) == 1
@@ -0,0 +1,41 @@
+import threading
+
+from services.response_cache import ResponseCache
+
+
+class StallingLock:
+    """
+    Lock whose first acquirer waits until released, letting another thread overtake it
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = threading.Event()
+        self.release = threading.Event()
+
+    def __enter__(self):
+        if not self.waiting.is_set():
+            self.waiting.set()
+            self.release.wait(timeout=5)
+        self._lock.acquire()
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+def test_concurrent_saves_keep_the_newest_entries(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path)
+    cache._save_lock = lock = StallingLock()
+
+    first = threading.Thread(target=cache.set, args=("a", "older"))
+    first.start()
+    assert lock.waiting.wait(timeout=5)
+    # A newer set() saves while the first save is held up
+    cache.set("b", "newer")
+    lock.release.set()
+    first.join()
+
+    reloaded = ResponseCache(path=path)
+    assert reloaded.get("a") == "older"
+    assert reloaded.get("b") == "newer"
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from handlers import study
+from services.llama_vision import LLMError
+from services.telegram_outbox import MAX_MESSAGE_LENGTH
+
+
+class FakeBot:
+    def __init__(self, fail_edits=False, fail_deletes=False):
+        self.fail_edits = fail_edits
+        self.fail_deletes = fail_deletes
+        self.messages = {}
+        self.deleted = []
+        self._next_id = 1
+
+    def send_message(self, chat_id, text, **kwargs):
+        message = SimpleNamespace(chat=SimpleNamespace(id=chat_id), message_id=self._next_id)
+        self.messages[self._next_id] = text
+        self._next_id += 1
+        return message
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        if self.fail_edits:
+            raise ApiTelegramException("editMessageText", None,
+                                       {"error_code": 400, "description": "Bad Request: message can't be edited"})
+        self.messages[message_id] = text
+
+    def delete_message(self, chat_id, message_id):
+        if self.fail_deletes:
+            raise ApiTelegramException("deleteMessage", None,
+                                       {"error_code": 400, "description": "Bad Request: message can't be deleted"})
+        self.deleted.append(message_id)
+        del self.messages[message_id]
+
+    def visible(self):
+        return [text for _, text in sorted(self.messages.items())]
+
+
+def test_overflow_with_nothing_left_sends_no_bare_placeholder():
+    bot = FakeBot()
+    full = "x" * MAX_MESSAGE_LENGTH
+    sent = study.send_streaming_message(bot, 1, [full, " "])
+    assert sent == full
+    assert bot.visible() == [full]
+
+
+def test_failed_edit_replaces_the_stale_message():
+    bot = FakeBot(fail_edits=True)
+    first = "a " * (MAX_MESSAGE_LENGTH // 2 - 3)
+    chunks = [first, "\n\nthe rest"]
+    sent = study.send_streaming_message(bot, 1, chunks)
+    assert len(first + chunks[1]) > MAX_MESSAGE_LENGTH
+    assert sent == first.rstrip() + "the rest"
+    # The placeholder could not be edited, so it was deleted rather than left next to its replacement
+    assert bot.deleted == [1]
+    assert bot.visible() == [first.rstrip(), "the rest"]
+
+
+def test_failed_cleanup_does_not_hide_the_model_error():
+    bot = FakeBot(fail_deletes=True)
+
+    def chunks():
+        raise LLMError("model unavailable")
+        yield
+
+    with pytest.raises(LLMError):
+        study.send_streaming_message(bot, 1, chunks())
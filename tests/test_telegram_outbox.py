@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import TimeoutError
+
+import pytest
+
+from services.telegram_outbox import TelegramOutbox
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+        return len(self.sent)
+
+    def send_photo(self, chat_id, photo, **kwargs):
+        pass
+
+    def send_document(self, chat_id, document, **kwargs):
+        pass
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        pass
+
+
+def test_paced_call_times_out_and_is_dropped():
+    outbox = TelegramOutbox(global_rate=100, chat_rate=100, group_rate=100, workers=0, send_timeout=0.05)
+    bot = FakeBot()
+    outbox.attach(bot)
+    with pytest.raises(TimeoutError):
+        bot.send_message(1, "late")
+
+    # A worker that comes along afterwards does not send what the caller gave up on
+    outbox.send_text(1, "next")
+    chat_id, _, jobs = outbox._take()
+    assert chat_id == 1
+    assert [job.text for job in jobs] == ["next"]
+
+
+def test_empty_global_bucket_does_not_spend_chat_tokens():
+    outbox = TelegramOutbox(global_rate=1, chat_rate=0.001, group_rate=0.001, chat_burst=1, workers=0)
+    outbox.attach(FakeBot())
+    outbox._global._tokens = 0
+    outbox.send_text(1, "hello")
+
+    taken = []
+    taker = threading.Thread(target=lambda: taken.append(outbox._take()), daemon=True)
+    taker.start()
+    # Waits a second for the global bucket only; the chat's single token still buys this message
+    taker.join(timeout=5)
+    assert taken, "the chat token was spent while the global bucket was empty"
+    _, chat, jobs = taken[0]
+    assert [job.text for job in jobs] == ["hello"]